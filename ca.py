@@ -16,6 +16,8 @@ import os
 import sys
 import warnings
 
+from metrics import FrameClock, NullClock, create_metrics
+
 # 完全禁用可能冲突的库
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # 禁用所有TF日志
 warnings.filterwarnings('ignore')
@@ -51,6 +53,8 @@ class Config:
     OUTPUT_VIDEO = False  # Windows下默认关闭视频输出
     OUTPUT_CSV = True
     SKIP_FRAMES = 5  # 默认跳帧，减少资源占用
+    METRICS_PATH = None  # 运行指标导出路径(.prom=Prometheus文本格式, 其他=JSON Lines)，默认关闭
+    METRICS_INTERVAL = 10.0  # 运行指标导出间隔(秒)
 
 
 # ==================== 资源管理器 ====================
@@ -222,11 +226,16 @@ class ClassroomAttentionMonitor:
         print("\n步骤2: 开始视频处理...")
         print(f"提示: 按 Ctrl+C 可安全中断\n")
         
+        # 运行指标（关闭时 clock 为空操作）
+        metrics = create_metrics(self.config.METRICS_PATH, self.config.METRICS_INTERVAL, source='ca')
+        clock = FrameClock() if metrics is not None else NullClock()
+        
         # 步骤2: 逐帧处理
         frame_idx = 0
         try:
             while True:
                 ret, frame = cap.read()
+                clock.lap('decode')
                 if not ret or frame is None:
                     break
                 
@@ -238,6 +247,7 @@ class ClassroomAttentionMonitor:
                 # YOLO检测
                 results = yolo(frame, classes=[self.config.PERSON_CLASS_ID], 
                               conf=self.config.CONFIDENCE_THRESHOLD, verbose=False)
+                clock.lap('inference')
                 
                 # 准备检测框
                 detections = []
@@ -248,6 +258,7 @@ class ClassroomAttentionMonitor:
                 
                 # DeepSORT跟踪
                 tracks = tracker.update_tracks(detections, frame=frame)
+                clock.lap('tracking')
                 
                 # 姿态分析
                 for track in tracks:
@@ -272,6 +283,7 @@ class ClassroomAttentionMonitor:
                         
                         rgb_crop = cv2.cvtColor(student_crop, cv2.COLOR_BGR2RGB)
                         results = pose_estimator.process(rgb_crop)
+                        clock.lap('pose')
                         
                         if results and results.pose_landmarks:
                             landmarks = results.pose_landmarks.landmark
@@ -289,6 +301,7 @@ class ClassroomAttentionMonitor:
                                     'score': attention_score,
                                     'bbox': (x1, y1, x2, y2)
                                 })
+                            clock.lap('scoring')
                             
                             # 可视化
                             if self.config.OUTPUT_VIDEO:
@@ -298,6 +311,11 @@ class ClassroomAttentionMonitor:
                                 cv2.putText(frame, f"ID:{track_id} {status}", 
                                            (x1, max(20, y1-10)), 
                                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                                clock.lap('drawing')
+                
+                if metrics is not None:
+                    metrics.frame(frame_idx, clock.pop(), len(detections),
+                                  sum(1 for t in tracks if t.is_confirmed()))
                 
                 # 显示进度
                 if frame_idx % 100 == 0:
@@ -318,6 +336,9 @@ class ClassroomAttentionMonitor:
             print("\n步骤3: 释放资源...")
             if 'cap' in locals():
                 cap.release()
+            if metrics is not None:
+                metrics.close()
+                print(f"✓ 运行指标已导出: {os.path.abspath(self.config.METRICS_PATH)}")
             print("✓ 资源已释放\n")
         
         # 生成报告
@@ -410,6 +431,10 @@ def main():
                        help='专注度阈值(0-100), 默认50')
     parser.add_argument('--skip-frames', type=int, default=5,
                        help='跳帧数(建议5), 每N+1帧处理1帧')
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                       help='周期导出运行指标(.prom=Prometheus文本格式, 其他=JSON Lines)')
+    parser.add_argument('--metrics-interval', type=float, default=Config.METRICS_INTERVAL,
+                       help=f'运行指标导出间隔秒数(默认{Config.METRICS_INTERVAL})')
     
     args = parser.parse_args()
     
@@ -420,6 +445,8 @@ def main():
     config = Config()
     config.ATTENTION_SCORE_THRESHOLD = args.threshold
     config.SKIP_FRAMES = args.skip_frames
+    config.METRICS_PATH = args.metrics
+    config.METRICS_INTERVAL = args.metrics_interval
     
     print("\n" + "="*60)
     print("课堂专注度检测系统".center(60))
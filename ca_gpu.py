@@ -6,15 +6,40 @@
 
 import cv2
 import numpy as np
-import pandas as pd
-from ultralytics import YOLO
 from datetime import timedelta
 import argparse
+import json
 import os
 import sys
+import time
 import warnings
-import torch
-from collections import defaultdict, deque
+from collections import Counter, defaultdict, deque
+from itertools import islice
+
+from pose_backend import CropRefinePoseBackend, create_backend, is_onnx_backend
+from event_index import EventIndex
+from video_capture import FfmpegCapture, open_ffmpeg_capture, upscale_frame
+from live_source import LatestFrameCapture, RollingReports, is_live_source
+from metrics import StageTimings, create_metrics
+from profiler import create_profiler
+from scheduler import create_scheduler
+from event_stream import AttentionEvents, create_event_sink
+from detection_store import DetectionStore, absolute_keypoints
+
+# torch仅用于GPU检测，ONNX后端无需安装；导入较慢，按需加载
+_torch = False
+
+
+def load_torch():
+    """按需导入torch，未安装时返回None"""
+    global _torch
+    if _torch is False:
+        try:
+            import torch
+        except ImportError:
+            torch = None
+        _torch = torch
+    return _torch
 
 # ==================== 警告过滤 ====================
 warnings.filterwarnings('ignore')
@@ -28,6 +53,19 @@ class Config:
     POSE_MODEL = "yolov8m-pose.pt"
     DEVICE = 0
     
+    # 推理后端: "ultralytics"(PyTorch) 或 "onnx"(ONNX Runtime CPU)
+    # POSE_MODEL 指向 .onnx 文件时自动使用ONNX后端
+    BACKEND = "ultralytics"
+    IMG_SIZE = 640                      # 模型输入尺寸
+    IOU_THRESHOLD = 0.7                 # NMS阈值
+    ONNX_CACHE_DIR = "model_cache"      # ONNX导出缓存目录（按模型哈希）
+    ONNX_THREADS = 0                    # ONNX Runtime线程数(0=自动)
+    
+    # 解码: 高分辨率视频由ffmpeg直接解码到模型输入尺寸附近（结果仍按原始分辨率记录）
+    DECODER = "auto"                    # "auto"(需要缩小且有ffmpeg时) / "ffmpeg" / "opencv"
+    DECODE_SIZE = 0                     # 解码后长边像素(0=按模型输入尺寸, -1=原始分辨率)
+    DECODE_THREADS = 0                  # ffmpeg解码线程数(0=自动)
+    
     # **行为判断阈值**
     HEAD_DOWN_THRESHOLD = 0.03          # 低头检测阈值
     HEAD_DOWN_DURATION = 3.0            # **长时间低头：持续3秒以上**
@@ -38,6 +76,7 @@ class Config:
     STILLNESS_THRESHOLD = 5.0           # **发呆：头部移动小于5像素**
     STILLNESS_DURATION = 4.0            # **持续4秒以上**
     GAZE_FIXED_THRESHOLD = 0.02         # 视线变化阈值
+    TIMER_MAX_GAP = 2.0                 # 计时器两次更新的最大间隔(秒)，超过视为跟踪中断，不累加
     
     SHOULDER_TILT_THRESHOLD = 25
     HAND_BELOW_HIP_THRESHOLD = 0.02
@@ -48,9 +87,113 @@ class Config:
     OUTPUT_VIDEO_PATH = "output_annotated.mp4"
     SHOW_LABELS = True
     
+    # 逐帧检测结果（GUI实时叠加标注 / 事后导出标注视频）
+    KEEP_DETECTIONS = False             # 在内存中保留 frame_detections（紧凑打包，见 DetectionStore）
+    DETECTIONS_PATH = None              # 同时保存为JSON Lines文件
+    
+    # 不专注事件片段导出
+    CLIP_PADDING = 2.0                  # 片段前后各保留的秒数
+    CLIP_WORKERS = 0                    # 并行导出数(0=自动)
+    
     # 性能
     SKIP_FRAMES = 2
     CONFIDENCE_THRESHOLD = 0.5
+    BATCH_SIZE = 1                      # 每次推理的帧数(>1时批量推理后按顺序跟踪)
+    
+    # CPU吞吐量模式（仅DEVICE='cpu'时生效）: 多进程模型副本
+    CPU_REPLICAS = 0                    # 副本数(0=关闭, -1=按本机核心数自动选择)
+    CPU_THREADS_PER_REPLICA = 0         # 每个副本的算子内线程数(0=自动)
+    
+    # 两级级联: 小模型处理全帧，仅对不确定的学生用 POSE_MODEL 在裁剪区域上重新估计
+    CASCADE = False
+    CASCADE_SMALL_MODEL = "yolov8n-pose.pt"
+    CASCADE_KPT_CONF = 0.5              # 规则关键点置信度低于此值视为不确定
+    CASCADE_KPT_LOW = 0.1               # 低于此值视为确实不可见（如桌下的手），不触发
+    CASCADE_SCORE_MARGIN = 15           # 姿态分数距阈值在此范围内视为不确定
+    CROP_PAD_RATIO = 0.15               # 裁剪区域外扩比例
+    
+    # 双分辨率: 低输入尺寸检测全帧，仅对远处的小目标在原图高分辨率裁剪上估计姿态
+    CROP_REFINE = False
+    CROP_DETECT_IMG_SIZE = 480          # 全帧检测的输入尺寸
+    CROP_POSE_IMG_SIZE = 320            # 裁剪区域姿态估计的输入尺寸
+    CROP_SMALL_BOX_RATIO = 0.15         # 检测框高度 < 帧高 x 此比例 视为小目标
+    
+    # 实时调度: 按每帧延迟预算决定处理 / 跳过哪些帧及是否降低画质，处理进度不落后于视频时间线
+    REALTIME = False                    # 启用截止时间调度（在 SKIP_FRAMES 采样的基础上再跳帧）
+    FRAME_BUDGET_MS = 0                 # 每帧延迟预算(毫秒): 视频时刻到处理完成的最大时间, 0=采样间隔
+    REALTIME_MIN_IMG_SIZE = 320         # 降级时推理输入尺寸的下限
+    REALTIME_COOLDOWN = 5.0             # 两次降级 / 恢复之间的最短间隔(秒)
+    REALTIME_LOG_PATH = None            # 调度决策日志(JSON Lines)，None=只打印
+    
+    # 实时事件流（JSON Lines）: 事件发生时输出给仪表盘 / 告警工具
+    EVENT_STREAM = None                 # "-"=标准输出, 文件路径, tcp://主机:端口, unix:///路径; None=关闭
+    EVENT_FLUSH_INTERVAL = 0.5          # 事件最长缓冲时间(秒)
+    EVENT_AGGREGATE_INTERVAL = 10.0     # 全班汇总事件间隔(视频时间, 秒)
+    EVENT_LOST_AFTER = 2.0              # 学生消失超过该时长(秒)视为离开画面
+    
+    # 实时视频源（摄像头 / 网络流 / 管道）: 只处理最新帧，不专注事件边处理边写出
+    LIVE = False                        # 按实时源处理（设备号、/dev/videoN、流地址、命名管道自动识别）
+    LIVE_REPLAY = False                 # 把视频文件按真实时间回放为实时源（测试用）
+    LIVE_MAX_SECONDS = 0                # 最长运行时间(秒, 0=直到视频源结束或中断)
+    LIVE_EVENTS_PATH = "live_events.jsonl"  # 不专注记录追加写入的文件
+    LIVE_FLUSH_INTERVAL = 2.0           # 事件写入间隔(秒)
+    LIVE_REPORT_INTERVAL = 60.0         # 滚动报告窗口(秒)
+    LIVE_REPORT_DIR = "live_reports"    # 窗口报告CSV目录
+    
+    # 进度回调（GUI实时进度 / 阶段性结果）
+    PROGRESS_INTERVAL = 0.5             # 进度回调最小间隔(秒)
+    PROGRESS_WINDOW = 30                # 滚动帧率 / 剩余时间按最近N个处理帧计算
+    PARTIAL_REPORT_INTERVAL = 5.0       # 阶段性报告最小间隔(秒)
+    
+    # 运行指标（逐帧耗时直方图 / 帧数计数 / 队列深度），默认关闭
+    METRICS_PATH = None                 # .prom/.txt=Prometheus文本格式, 其他=JSON Lines
+    METRICS_INTERVAL = 10.0             # 导出间隔(秒)
+    
+    # 性能剖析: 在一段帧窗口内剖析Python函数耗时，默认关闭
+    PROFILE_PATH = None                 # 折叠调用栈输出路径（另写 *_top.txt 热点汇总）
+    PROFILE_FRAMES = 200                # 剖析的帧数
+    PROFILE_WARMUP = 10                 # 开始剖析前跳过的帧数（模型首帧初始化等）
+
+# ==================== 配置文件 ====================
+# 配置文件中可作为命令行参数默认值的项（显式指定的命令行参数仍然优先）
+CONFIG_FILE_ARGS = {
+    'SKIP_FRAMES': 'skip_frames',
+    'POSE_MODEL': 'model',
+    'BACKEND': 'backend',
+    'BATCH_SIZE': 'batch_size',
+    'ATTENTION_SCORE_THRESHOLD': 'threshold',
+}
+
+
+def load_config_file(path):
+    """读取配置文件（如 tools/autotune.py 生成的调参结果），返回 {Config属性名: 值}
+    
+    文件为JSON: {"config": {"SKIP_FRAMES": 3, ...}, ...}，未知的参数名给出提示并忽略
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    values = {}
+    for name, value in data.get('config', {}).items():
+        if name.isupper() and hasattr(Config, name):
+            values[name] = value
+        else:
+            print(f"⚠ 配置文件中的未知参数已忽略: {name}")
+    return values
+
+
+def save_config_file(path, values, **extra):
+    """保存配置文件: values 为 {Config属性名: 值}，extra 为附加说明（如调参过程）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'config': values, **extra}, f, ensure_ascii=False, indent=2)
+
+
+def apply_config_file(config, values):
+    for name, value in values.items():
+        setattr(config, name, value)
+    return config
+
 
 # ==================== 状态追踪器 ====================
 class StudentStateTracker:
@@ -67,9 +210,23 @@ class StudentStateTracker:
         self.eye_closed_timer = defaultdict(float)  # 闭眼计时
         self.stillness_timer = defaultdict(float)   # 静止计时
         
-        # 上一帧时间戳
+        # 上一次更新的时间戳(秒)
         self.last_update = defaultdict(float)
     
+    def elapsed(self, student_id, fps, timestamp, max_gap):
+        """距该学生上一次更新的实际时间(秒)
+        
+        跳帧、实时调度跳过或实时源丢帧时两次更新间隔大于1/fps，计时器按实际间隔累加；
+        没有时间戳、首次出现或间隔超过 max_gap（离开画面 / 跟踪中断）时按一帧计
+        """
+        if timestamp is None:
+            return 1 / fps
+        last = self.last_update.get(student_id)
+        self.last_update[student_id] = timestamp
+        if last is None or not 0 < timestamp - last <= max_gap:
+            return 1 / fps
+        return timestamp - last
+    
     def update(self, student_id, keypoints, fps):
         """更新学生状态"""
         current_time = len(self.head_position[student_id]) / fps
@@ -109,9 +266,10 @@ class StudentStateTracker:
         except:
             return 1.0
     
-    def check_long_term_behaviors(self, student_id, keypoints, fps, config):
-        """检测长期行为"""
+    def check_long_term_behaviors(self, student_id, keypoints, fps, config, timestamp=None):
+        """检测长期行为（timestamp 为该帧的视频时刻，秒）"""
         behaviors = []
+        dt = self.elapsed(student_id, fps, timestamp, config.TIMER_MAX_GAP)
         
         # 1. 检查长时间低头
         if keypoints is not None and len(keypoints) > 0:
@@ -122,7 +280,7 @@ class StudentStateTracker:
             if (nose[2] > 0.5 and left_shoulder[2] > 0.5 and right_shoulder[2] > 0.5):
                 shoulder_center_y = (left_shoulder[1] + right_shoulder[1]) / 2
                 if nose[1] - shoulder_center_y > config.HEAD_DOWN_THRESHOLD:
-                    self.head_down_timer[student_id] += 1 / fps
+                    self.head_down_timer[student_id] += dt
                     if self.head_down_timer[student_id] >= config.HEAD_DOWN_DURATION:
                         behaviors.append(f"长时间低头({self.head_down_timer[student_id]:.1f}s)")
                 else:
@@ -134,7 +292,7 @@ class StudentStateTracker:
         if len(self.eye_openness[student_id]) > 0:
             ear = self.eye_openness[student_id][-1]
             if ear < config.EYE_CLOSED_THRESHOLD:  # 眼睛闭合
-                self.eye_closed_timer[student_id] += 1 / fps
+                self.eye_closed_timer[student_id] += dt
                 if self.eye_closed_timer[student_id] >= config.EYE_CLOSED_DURATION:
                     behaviors.append(f"闭眼({self.eye_closed_timer[student_id]:.1f}s)")
             else:
@@ -153,7 +311,7 @@ class StudentStateTracker:
                 head_movement += np.sqrt(dx*dx + dy*dy)
             
             if head_movement < config.STILLNESS_THRESHOLD:
-                self.stillness_timer[student_id] += 1 / fps
+                self.stillness_timer[student_id] += dt
                 if self.stillness_timer[student_id] >= config.STILLNESS_DURATION:
                     behaviors.append(f"发呆({self.stillness_timer[student_id]:.1f}s)")
             else:
@@ -165,9 +323,141 @@ class StudentStateTracker:
 
 
 # ==================== 姿态分析 ====================
-def calculate_attention_score(keypoints, bbox_height, config, state_tracker, student_id, fps):
+# 规则使用的关键点: 鼻子、双眼、双肩、双腕、以及用于"手部异常"的13/14号点
+RULE_KEYPOINTS = [0, 1, 2, 5, 6, 9, 10, 13, 14]
+
+
+def evaluate_posture_rules(keypoints, bbox_height, config, long_head_down=False):
+    """短期姿态规则（无状态）
+    返回: (扣分, 原因列表)
+    """
+    penalty = 0
+    reasons = []
+    
+    nose = keypoints[0]
+    left_shoulder = keypoints[5]
+    right_shoulder = keypoints[6]
+    left_hand = keypoints[9]
+    right_hand = keypoints[10]
+    left_hip = keypoints[13]
+    right_hip = keypoints[14]
+    
+    # 短期低头（不持续）
+    if (not long_head_down and 
+        nose[2] > 0.5 and left_shoulder[2] > 0.5 and right_shoulder[2] > 0.5):
+        shoulder_center_y = (left_shoulder[1] + right_shoulder[1]) / 2
+        head_drop = (nose[1] - shoulder_center_y) * bbox_height
+        
+        if head_drop > config.HEAD_DOWN_THRESHOLD * bbox_height:
+            penalty += 30  # 短期低头扣分较轻
+            reasons.append("短暂低头")
+    
+    # 肩膀倾斜
+    if left_shoulder[2] > 0.5 and right_shoulder[2] > 0.5:
+        shoulder_vec = np.array([right_shoulder[0] - left_shoulder[0], 
+                               right_shoulder[1] - left_shoulder[1]])
+        angle = np.degrees(np.arctan2(abs(shoulder_vec[1]), abs(shoulder_vec[0])))
+        
+        if angle > config.SHOULDER_TILT_THRESHOLD:
+            penalty += 20
+            reasons.append(f"侧身({int(angle)}°)")
+    
+    # 手部位置
+    hand_low = False
+    if left_hand[2] > 0.5 and left_hip[2] > 0.5:
+        if left_hand[1] > left_hip[1] + config.HAND_BELOW_HIP_THRESHOLD:
+            hand_low = True
+    
+    if right_hand[2] > 0.5 and right_hip[2] > 0.5:
+        if right_hand[1] > right_hip[1] + config.HAND_BELOW_HIP_THRESHOLD:
+            hand_low = True
+    
+    if hand_low:
+        penalty += 15
+        reasons.append("手部异常")
+    
+    return penalty, reasons
+
+
+def needs_refinement(keypoints, bbox_height, config):
+    """级联模式: 判断小模型的结果是否不确定，需要精细模型重新估计
+    
+    1. 规则关键点置信度落在 [CASCADE_KPT_LOW, CASCADE_KPT_CONF) 之间
+    2. 仅按短期姿态规则估计的分数接近专注度阈值
+    """
+    conf = keypoints[RULE_KEYPOINTS, 2]
+    if np.any((conf >= config.CASCADE_KPT_LOW) & (conf < config.CASCADE_KPT_CONF)):
+        return True
+    
+    penalty, _ = evaluate_posture_rules(keypoints, bbox_height, config)
+    return abs((100 - penalty) - config.ATTENTION_SCORE_THRESHOLD) <= config.CASCADE_SCORE_MARGIN
+
+
+def is_small_box(box, frame_height, config):
+    """双分辨率模式: 判断检测框是否为需要高分辨率重估的远处小目标"""
+    return (box[3] - box[1]) < frame_height * config.CROP_SMALL_BOX_RATIO
+
+
+def build_pose_backend(config):
+    """按配置创建推理后端（普通 / 级联 / 双分辨率，后两者可叠加）"""
+    if not (config.CASCADE or config.CROP_REFINE):
+        return create_backend(config)
+    
+    primary_model = config.CASCADE_SMALL_MODEL if config.CASCADE else config.POSE_MODEL
+    primary_imgsz = config.CROP_DETECT_IMG_SIZE if config.CROP_REFINE else None
+    refiner_imgsz = config.CROP_POSE_IMG_SIZE if config.CROP_REFINE else None
+    
+    def select(result, i):
+        box = result.boxes[i]
+        if config.CROP_REFINE and is_small_box(box, result.orig_img.shape[0], config):
+            return True
+        return config.CASCADE and needs_refinement(result.keypoints[i], box[3] - box[1], config)
+    
+    return CropRefinePoseBackend(
+        create_backend(config, primary_model, primary_imgsz),
+        create_backend(config, config.POSE_MODEL, refiner_imgsz),
+        select,
+        config.CROP_PAD_RATIO
+    )
+
+
+def select_device(config):
+    """确定推理设备（ONNX后端或无可用GPU时改为CPU），结果写回 config.DEVICE"""
+    if is_onnx_backend(config):
+        print("✓ 推理后端: ONNX Runtime (CPU)")
+        config.DEVICE = 'cpu'
+        return config.DEVICE
+    
+    torch = load_torch() if config.DEVICE == 0 else None
+    if torch is not None and torch.cuda.is_available():
+        gpu_name = torch.cuda.get_device_name(0)
+        gpu_memory = torch.cuda.get_device_properties(0).total_memory / 1024**3
+        print(f"✓ GPU加速启用: {gpu_name} ({gpu_memory:.1f} GB)")
+    else:
+        print("⚠ 使用CPU模式")
+        config.DEVICE = 'cpu'  # 强制使用CPU
+    return config.DEVICE
+
+
+def pose_backend_key(config):
+    """影响推理后端构建的配置项；相同时可复用已加载的后端"""
+    return (config.POSE_MODEL, config.BACKEND, config.DEVICE, config.IMG_SIZE,
+            config.CONFIDENCE_THRESHOLD, config.IOU_THRESHOLD, config.ONNX_THREADS,
+            config.CASCADE, config.CASCADE_SMALL_MODEL, config.CROP_REFINE,
+            config.CROP_DETECT_IMG_SIZE, config.CROP_POSE_IMG_SIZE)
+
+
+def warm_up_backend(backend, size=(640, 480)):
+    """用空白帧跑一次推理，完成首帧的延迟初始化（CUDA上下文、算子选择等）"""
+    width, height = size
+    backend.predict([np.zeros((height, width, 3), dtype=np.uint8)])
+
+
+def calculate_attention_score(keypoints, bbox_height, config, state_tracker, student_id, fps,
+                              timestamp=None):
     """
     计算专注度分数
+    timestamp: 该帧的视频时刻(秒)，长期行为计时器按实际时间间隔累加
     返回: (分数, 不专注原因列表)
     """
     if keypoints is None or len(keypoints) < 17:
@@ -182,7 +472,7 @@ def calculate_attention_score(keypoints, bbox_height, config, state_tracker, stu
         
         # 检查长期行为（低头、闭眼、发呆）
         long_term_behaviors = state_tracker.check_long_term_behaviors(
-            student_id, keypoints, fps, config
+            student_id, keypoints, fps, config, timestamp
         )
         
         # 长期行为扣分更严重
@@ -196,47 +486,12 @@ def calculate_attention_score(keypoints, bbox_height, config, state_tracker, stu
             reasons.append(behavior)
         
         # 短期行为检测（原有规则）
-        nose = keypoints[0]
-        left_shoulder = keypoints[5]
-        right_shoulder = keypoints[6]
-        left_hand = keypoints[9]
-        right_hand = keypoints[10]
-        left_hip = keypoints[13]
-        right_hip = keypoints[14]
-        
-        # 短期低头（不持续）
-        if (not any("长时间低头" in r for r in reasons) and 
-            nose[2] > 0.5 and left_shoulder[2] > 0.5 and right_shoulder[2] > 0.5):
-            shoulder_center_y = (left_shoulder[1] + right_shoulder[1]) / 2
-            head_drop = (nose[1] - shoulder_center_y) * bbox_height
-            
-            if head_drop > config.HEAD_DOWN_THRESHOLD * bbox_height:
-                score -= 30  # 短期低头扣分较轻
-                reasons.append("短暂低头")
-        
-        # 肩膀倾斜
-        if left_shoulder[2] > 0.5 and right_shoulder[2] > 0.5:
-            shoulder_vec = np.array([right_shoulder[0] - left_shoulder[0], 
-                                   right_shoulder[1] - left_shoulder[1]])
-            angle = np.degrees(np.arctan2(abs(shoulder_vec[1]), abs(shoulder_vec[0])))
-            
-            if angle > config.SHOULDER_TILT_THRESHOLD:
-                score -= 20
-                reasons.append(f"侧身({int(angle)}°)")
-        
-        # 手部位置
-        hand_low = False
-        if left_hand[2] > 0.5 and left_hip[2] > 0.5:
-            if left_hand[1] > left_hip[1] + config.HAND_BELOW_HIP_THRESHOLD:
-                hand_low = True
-        
-        if right_hand[2] > 0.5 and right_hip[2] > 0.5:
-            if right_hand[1] > right_hip[1] + config.HAND_BELOW_HIP_THRESHOLD:
-                hand_low = True
-        
-        if hand_low:
-            score -= 15
-            reasons.append("手部异常")
+        long_head_down = any("长时间低头" in r for r in reasons)
+        penalty, posture_reasons = evaluate_posture_rules(
+            keypoints, bbox_height, config, long_head_down
+        )
+        score -= penalty
+        reasons.extend(posture_reasons)
     
     except Exception as e:
         print(f"姿态计算异常: {e}")
@@ -245,24 +500,590 @@ def calculate_attention_score(keypoints, bbox_height, config, state_tracker, stu
     return max(0, min(100, score)), reasons
 
 
+# ==================== 标注绘制 / 视频输出 ====================
+def draw_annotations(frame, detections, config):
+    """在帧上绘制检测框、ID、分数和不专注原因"""
+    for det in detections:
+        x1, y1, x2, y2 = det['bbox']
+        score = det['score']
+        reasons = det['reasons']
+        is_not_focused = score < config.ATTENTION_SCORE_THRESHOLD
+        
+        color = (0, 0, 255) if is_not_focused else (0, 255, 0)
+        
+        # 加粗边框（长时间行为用更粗的框）
+        if any("长时间" in r for r in reasons):
+            border_thickness = 4
+        else:
+            border_thickness = 2
+        
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, border_thickness)
+        
+        # 绘制文字标签
+        if config.SHOW_LABELS:
+            status = "NOT FOCUS" if is_not_focused else "FOCUS"
+            
+            # 原因标签（最多显示2个，避免过长）
+            main_reasons = reasons[:2]
+            reason_text = f"({'; '.join(main_reasons)})" if main_reasons else ""
+            
+            label = f"ID:{det['student_id']} {status}({score}) {reason_text}"
+            label_y = max(20, y1 - 10)
+            
+            # 文字背景
+            (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+            cv2.rectangle(frame, (x1, label_y - text_h - 5), 
+                        (x1 + text_w, label_y + 5), (0, 0, 0), -1)
+            
+            cv2.putText(frame, label, (x1, label_y), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    return frame
+
+
+def open_video_writer(output_path, fps, size, quiet=False):
+    """依次尝试多种编码器创建视频写入器
+    返回: (写入器, 实际输出路径)
+    """
+    # 优先使用H.264编码器（兼容性最好）
+    codecs_to_try = [
+        ('avc1', '.mp4'),  # H.264 (最佳兼容性)
+        ('mp4v', '.mp4'),  # MPEG-4 (备选)
+        ('XVID', '.avi'),  # Xvid (备选)
+    ]
+
+    for codec, ext in codecs_to_try:
+        try:
+            # 根据编码器调整输出文件扩展名
+            path = output_path
+            if not path.endswith(ext):
+                path = os.path.splitext(path)[0] + ext
+
+            fourcc = cv2.VideoWriter_fourcc(*codec)
+            writer = cv2.VideoWriter(path, fourcc, fps, size)
+
+            if writer.isOpened():
+                if not quiet:
+                    print(f"✓ 视频编码器: {codec}")
+                    print(f"✓ 输出帧率: {fps:.2f} fps")
+                    print(f"✓ 视频输出: {os.path.abspath(path)}\n")
+                return writer, path
+            writer.release()
+        except Exception as e:
+            print(f"  尝试编码器 {codec} 失败: {e}")
+            continue
+
+    raise ValueError(f"无法创建视频文件，所有编码器均失败")
+
+
+def verify_output_video(output_path):
+    """检查输出视频是否可读"""
+    print(f"\n✓ 标注视频已保存: {os.path.abspath(output_path)}")
+    if not os.path.exists(output_path):
+        return
+
+    file_size = os.path.getsize(output_path) / (1024 * 1024)
+    print(f"✓ 文件大小: {file_size:.2f} MB")
+
+    # 尝试打开视频验证
+    test_cap = cv2.VideoCapture(output_path)
+    if test_cap.isOpened():
+        test_fps = test_cap.get(cv2.CAP_PROP_FPS)
+        test_frames = int(test_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        test_cap.release()
+        print(f"✓ 视频验证成功: {test_frames}帧, {test_fps:.2f}fps")
+        print(f"✓ 可以使用VLC、QuickTime等播放器打开")
+    else:
+        test_cap.release()
+        print(f"⚠ 警告: 视频文件可能损坏，请尝试使用VLC播放器打开")
+
+
+def export_annotated_video(video_path, frame_detections, output_path, config):
+    """根据已保存的逐帧检测结果导出标注视频（无需重新推理）
+    
+    与检测时直接输出一致: 只写入处理过的帧
+    返回: 实际输出路径
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"无法打开视频: {video_path}")
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    last_frame = max(frame_detections) if frame_detections else -1
+    
+    writer, output_path = open_video_writer(
+        output_path, fps / (config.SKIP_FRAMES + 1), (width, height)
+    )
+    try:
+        frame_idx = 0
+        while frame_idx <= last_frame:
+            # 未处理的帧只grab不解码
+            if frame_idx not in frame_detections:
+                if not cap.grab():
+                    break
+                frame_idx += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(draw_annotations(frame, frame_detections[frame_idx], config))
+            frame_idx += 1
+    finally:
+        cap.release()
+        writer.release()
+    
+    verify_output_video(output_path)
+    return output_path
+
+
+# ==================== 报告生成 ====================
+def merge_time_ranges(student_ids, times, reason_codes, reason_table):
+    """按学生合并不专注时间段: 同一学生相邻记录间隔超过3秒时断开，时长不足1秒的时间段丢弃
+    
+    student_ids / times / reason_codes: 每条不专注记录的学生ID、视频时刻(秒)、原因编号数组
+    reason_table: 原因编号 -> 该记录的各项原因（原因字符串按';'拆分）
+    返回: summary
+    """
+    summary = {}
+    if not len(times):
+        return summary
+    
+    # 按学生、时间排序后，学生切换或时间间隔超过3秒处即为时间段边界
+    order = np.lexsort((times, student_ids))
+    student_ids, times, reason_codes = student_ids[order], times[order], reason_codes[order]
+    breaks = np.flatnonzero((np.diff(student_ids) != 0) | (np.diff(times) > 3)) + 1
+    firsts = np.concatenate(([0], breaks))
+    lasts = np.concatenate((breaks, [len(times)])) - 1
+    keep = times[lasts] - times[firsts] >= 1
+    
+    for student_id, first, last in zip(student_ids[firsts[keep]], firsts[keep], lasts[keep]):
+        start, end = times[first], times[last]
+        duration = end - start
+        
+        # 该时间段内最常见的不专注行为（按原因编号计数；编号按首次出现的顺序展开，
+        # 与逐条记录展开计数的结果和并列时的取舍一致）
+        codes, positions, counts = np.unique(reason_codes[first:last + 1],
+                                             return_index=True, return_counts=True)
+        reason_counts = Counter()
+        for i in np.argsort(positions, kind='stable').tolist():
+            for reason in reason_table[codes[i]]:
+                reason_counts[reason] += int(counts[i])
+        main_reason = reason_counts.most_common(1)[0][0] if reason_counts else "未知"
+        
+        data = summary.setdefault(student_id, {'time_ranges': [], 'total_duration_sec': 0,
+                                               'event_count': 0})
+        data['time_ranges'].append({
+            'start': str(timedelta(seconds=int(start))),
+            'end': str(timedelta(seconds=int(end))),
+            'start_sec': round(float(start), 2),   # 数值起止时间（秒），用于区间索引
+            'end_sec': round(float(end), 2),
+            'duration_sec': round(duration, 1),
+            'reason': main_reason
+        })
+        data['total_duration_sec'] += duration
+    
+    for data in summary.values():
+        data['total_duration_sec'] = round(data['total_duration_sec'], 1)
+        data['event_count'] = len(data['time_ranges'])
+    return summary
+
+
+def build_report(attention_records):
+    """按学生合并不专注时间段，生成汇总报告
+    返回: (DataFrame, summary)
+    """
+    if not attention_records:
+        return None, {}
+    
+    import pandas as pd
+    df = pd.DataFrame(attention_records)
+    reason_codes, reasons = pd.factorize(df['reason'])
+    summary = merge_time_ranges(df['student_id'].to_numpy(), df['time_sec'].to_numpy(),
+                                reason_codes, [reason.split(';') for reason in reasons])
+    return df, summary
+
+
+def make_attention_record(student_id, frame_idx, fps, score, reasons, bbox):
+    """构造一条不专注记录"""
+    return {
+        'student_id': student_id,
+        'time_sec': round(frame_idx / fps, 2),
+        'time_str': str(timedelta(seconds=int(frame_idx / fps))),
+        'frame': frame_idx,
+        'score': score,
+        'reason': ';'.join(reasons),
+        'bbox': tuple(bbox)
+    }
+
+
+# ==================== 离线重新评分 ====================
+def _unfocused_rows(store, config, fps):
+    """按当前阈值筛选不专注的检测
+
+    返回: (行掩码, 各行视频时刻(秒), 各行帧号, 去重后的帧号列表, 各行在其中的下标)；
+    时刻按去重后的帧号逐个计算，与 make_attention_record 的舍入一致
+    """
+    columns = store.columns()
+    mask = columns['scores'] < config.ATTENTION_SCORE_THRESHOLD
+    frames = columns['frame'][mask]
+    unique_frames, inverse = np.unique(frames, return_inverse=True)
+    unique_frames = unique_frames.tolist()
+    times = np.array([round(f / fps, 2) for f in unique_frames], dtype=np.float64)[inverse]
+    return mask, times, frames, unique_frames, inverse
+
+
+def summary_from_detections(frame_detections, config, fps):
+    """按当前阈值由逐帧检测结果直接合并不专注时间段，与 build_report(records_from_detections(...)) 的 summary 一致
+
+    分数与原因不依赖专注度阈值，只修改阈值时无需重新评分；按列筛选，不逐条构造记录
+    """
+    store = DetectionStore.from_detections(frame_detections)
+    mask, times, *_ = _unfocused_rows(store, config, fps)
+    columns = store.columns()
+    reason_table = [';'.join(reasons).split(';') for reasons in store.reason_table]
+    return merge_time_ranges(columns['ids'][mask].astype(np.int64), times, columns['reasons'][mask],
+                             reason_table)
+
+
+def records_from_detections(frame_detections, config, fps):
+    """按当前阈值筛选不专注记录，返回与 build_report 相同的记录表（DataFrame，无记录时为None）
+
+    只在导出CSV时需要，按列构造
+    """
+    store = DetectionStore.from_detections(frame_detections)
+    mask, times, frames, unique_frames, inverse = _unfocused_rows(store, config, fps)
+    if not mask.any():
+        return None
+    
+    import pandas as pd
+    columns = store.columns()
+    reason_text = np.array([';'.join(reasons) for reasons in store.reason_table], dtype=object)
+    return pd.DataFrame({
+        'student_id': columns['ids'][mask].astype(np.int64),
+        'time_sec': times,
+        'time_str': np.array([str(timedelta(seconds=int(f / fps))) for f in unique_frames],
+                             dtype=object)[inverse],
+        'frame': frames.astype(np.int64),
+        'score': columns['scores'][mask].astype(np.int64),
+        'reason': reason_text[columns['reasons'][mask]],
+        'bbox': list(zip(*columns['boxes'][mask].T.tolist()))
+    })
+
+
+def behavior_timer(active, dt, duration):
+    """逐帧行为计时器: active 的帧累加间隔 dt，否则归零
+
+    可能达到 duration 的连续段按顺序累加（与 StudentStateTracker 逐帧 += 的舍入一致）；
+    其余各段的读数不会达到 duration，不逐帧累加
+    """
+    timer = np.where(active, dt, 0.0)
+    rows = np.flatnonzero(active)
+    if not len(rows):
+        return timer
+    firsts = np.concatenate(([0], np.flatnonzero(np.diff(rows) != 1) + 1))
+    totals = np.add.reduceat(dt[rows], firsts)
+    lasts = np.concatenate((firsts[1:], [len(rows)]))
+    reaching = totals >= duration - 1e-6
+    for first, last in zip(firsts[reaching].tolist(), lasts[reaching].tolist()):
+        run = rows[first:last]
+        timer[run] = np.cumsum(dt[run])
+    return timer
+
+
+def score_student_track(keypoints, bbox_heights, times, config, fps):
+    """按时间顺序对一个学生的全部检测整列评分，等价于逐帧调用 calculate_attention_score
+    
+    keypoints: (N, len(RULE_KEYPOINTS), 3) float32，只含规则使用的关键点（按 RULE_KEYPOINTS 的顺序）；
+    bbox_heights: (N,)，times: (N,) 视频时刻(秒)
+    返回: (分数数组, 原因元组表, 每行原因在表中的下标)
+    """
+    kp = dict(zip(RULE_KEYPOINTS, np.moveaxis(keypoints, 1, 0)))  # COCO关键点序号 -> (N, 3)
+    visible = {i: point[:, 2] > 0.5 for i, point in kp.items()}
+    nose, left_shoulder, right_shoulder = kp[0], kp[5], kp[6]
+    
+    # 计时间隔（StudentStateTracker.elapsed）
+    dt = np.full(len(times), 1 / fps)
+    gaps = np.diff(times)
+    valid = (gaps > 0) & (gaps <= config.TIMER_MAX_GAP)
+    dt[1:][valid] = gaps[valid]
+    
+    # 长时间低头
+    shoulders = visible[0] & visible[5] & visible[6]
+    head_drop = nose[:, 1] - (left_shoulder[:, 1] + right_shoulder[:, 1]) / 2
+    head_down = shoulders & (head_drop > config.HEAD_DOWN_THRESHOLD)
+    head_down_timer = behavior_timer(head_down, dt, config.HEAD_DOWN_DURATION)
+    long_head_down = head_down & (head_down_timer >= config.HEAD_DOWN_DURATION)
+    
+    # 长时间闭眼（眼睛不可见时按睁开计）
+    eyes = visible[1] & visible[2]
+    ear = np.where(eyes, (kp[1][:, 2] + kp[2][:, 2]) / 2, np.float32(1.0))
+    eye_closed = ear < config.EYE_CLOSED_THRESHOLD
+    eye_closed_timer = behavior_timer(eye_closed, dt, config.EYE_CLOSED_DURATION)
+    eye_closed &= eye_closed_timer >= config.EYE_CLOSED_DURATION
+    
+    # 发呆: 最近5个可见的鼻子位置之间的移动距离
+    positions = nose[visible[0], :2]
+    step = positions[1:] - positions[:-1]
+    steps = np.sqrt(step[:, 0] * step[:, 0] + step[:, 1] * step[:, 1])
+    seen = np.cumsum(visible[0])
+    enough = seen >= 5
+    still = np.zeros(len(times), bool)
+    if enough.any():
+        c = seen[enough]
+        movement = steps[c - 5] + steps[c - 4] + steps[c - 3] + steps[c - 2]
+        still[enough] = movement < config.STILLNESS_THRESHOLD
+    stillness_timer = behavior_timer(still, dt, config.STILLNESS_DURATION)
+    stillness = still & (stillness_timer >= config.STILLNESS_DURATION)
+    
+    # 短期姿态规则（evaluate_posture_rules）
+    bbox_heights = np.asarray(bbox_heights).astype(np.float32)
+    short_head_down = (~long_head_down & shoulders &
+                       (head_drop * bbox_heights >
+                        (config.HEAD_DOWN_THRESHOLD * bbox_heights.astype(np.float64)).astype(np.float32)))
+    shoulder_dx = right_shoulder[:, 0] - left_shoulder[:, 0]
+    shoulder_dy = right_shoulder[:, 1] - left_shoulder[:, 1]
+    angle = np.degrees(np.arctan2(np.abs(shoulder_dy), np.abs(shoulder_dx)))
+    tilted = visible[5] & visible[6] & (angle > config.SHOULDER_TILT_THRESHOLD)
+    hand_low = ((visible[9] & visible[13] &
+                 (kp[9][:, 1] > kp[13][:, 1] + config.HAND_BELOW_HIP_THRESHOLD)) |
+                (visible[10] & visible[14] &
+                 (kp[10][:, 1] > kp[14][:, 1] + config.HAND_BELOW_HIP_THRESHOLD)))
+    
+    scores = (100 - 80 * long_head_down - 70 * eye_closed - 50 * stillness
+              - 30 * short_head_down - 20 * tilted - 15 * hand_low).clip(0, 100)
+    
+    # 原因: 每行按 (各计时器读数, 各规则, 侧身角度) 编号，不同组合只格式化一次
+    combos = np.full((len(times), 6), -1, np.int64)
+    timer_labels = []
+    for column, (flag, timer, name) in enumerate(((long_head_down, head_down_timer, "长时间低头"),
+                                                  (eye_closed, eye_closed_timer, "闭眼"),
+                                                  (stillness, stillness_timer, "发呆"))):
+        values, combos[flag, column] = np.unique(timer[flag], return_inverse=True)
+        timer_labels.append([f"{name}({value:.1f}s)" for value in values.tolist()])
+    combos[:, 3] = short_head_down
+    combos[tilted, 4] = angle[tilted].astype(np.int64)
+    combos[:, 5] = hand_low
+    # 各列按混合进制合成一个整数后去重（比按行去重快得多）
+    key = np.zeros(len(times), np.int64)
+    for column, size in enumerate([len(labels) + 1 for labels in timer_labels] + [2, 92, 2]):
+        key = key * size + combos[:, column] + (column in (0, 1, 2, 4))
+    _, first, index = np.unique(key, return_index=True, return_inverse=True)
+    combos = combos[first]
+    
+    reason_table = []
+    for long_head, eye, stare, short_head, tilt, hand in combos.tolist():
+        reason = [labels[code] for labels, code in zip(timer_labels, (long_head, eye, stare))
+                  if code >= 0]
+        if short_head:
+            reason.append("短暂低头")
+        if tilt >= 0:
+            reason.append(f"侧身({tilt}°)")
+        if hand:
+            reason.append("手部异常")
+        reason_table.append(tuple(reason))
+    return scores, reason_table, index.reshape(-1)
+
+
+def rescore_detections(frame_detections, config, fps, stride=1, cancel_event=None):
+    """用保存的关键点按新的规则参数重新评分（不重新推理）
+
+    按学生整列计算（score_student_track）；stride > 1 时只保留帧号为stride倍数的帧，用于模拟更大的跳帧数。
+    cancel_event 置位时（参数已再次修改）在学生之间停止，返回None
+    返回: 新的逐帧检测结果（DetectionStore，与原结果共用学生ID / 检测框 / 关键点列）
+    """
+    columns = DetectionStore.from_detections(frame_detections).columns()
+    if stride > 1:
+        keep = columns['frame'] % stride == 0
+        columns = {name: column[keep] for name, column in columns.items()}
+    frames, ids, boxes = columns['frame'], columns['ids'], columns['boxes']
+    keypoints = columns['keypoints']
+    
+    scores = np.zeros(len(ids), np.int16)
+    reason_codes = np.zeros(len(ids), np.int32)
+    reason_table = {}           # 原因元组 -> 编号
+    order = np.lexsort((frames, ids))
+    for rows in np.split(order, np.flatnonzero(np.diff(ids[order])) + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        if not len(rows):
+            continue
+        track_scores, track_reasons, reason_index = score_student_track(
+            absolute_keypoints(keypoints[rows[:, None], RULE_KEYPOINTS], boxes[rows]),
+            boxes[rows, 3] - boxes[rows, 1], frames[rows] / fps, config, fps
+        )
+        scores[rows] = track_scores
+        codes = np.array([reason_table.setdefault(reason, len(reason_table))
+                          for reason in track_reasons], np.int32)
+        reason_codes[rows] = codes[reason_index]
+    
+    return DetectionStore.from_columns(dict(columns, scores=scores, reasons=reason_codes),
+                                       list(reason_table))
+
+
+# ==================== 逐帧检测结果存取 ====================
+def save_detections(frame_detections, path):
+    """保存逐帧检测结果（JSON Lines，每行一帧）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for frame_idx in sorted(frame_detections):
+            f.write(json.dumps({'frame': frame_idx, 'detections': frame_detections[frame_idx]},
+                               ensure_ascii=False,
+                               default=lambda o: np.round(o, 2).tolist()) + '\n')
+
+
+def load_detections(path):
+    """读取 save_detections 保存的逐帧检测结果（DetectionStore）"""
+    frame_detections = DetectionStore()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                frame_detections.add(item['frame'], item['detections'])
+    return frame_detections
+
+
 # ==================== 核心检测类 ====================
+class ProgressStats:
+    """逐帧进度统计，每帧 O(1) 更新，同时供控制台进度行和GUI进度回调使用
+    
+    detected / not_focused 为当前帧的人数，avg_detected / total_not_focused 为累计值；
+    fps / speed / eta 按最近 window 个处理帧滚动计算（不足两帧时按全程平均）
+    """
+    
+    def __init__(self, total_frames, fps, window=30):
+        self.total_frames = total_frames
+        self.video_fps = fps
+        self.processed = 0
+        self.frame = 0
+        self.detected = 0
+        self.not_focused = 0
+        self.total_detected = 0
+        self.total_not_focused = 0
+        self.start = self.now = time.perf_counter()
+        self.recent = deque(maxlen=max(2, window))  # (时间, 帧号)
+    
+    def update(self, frame_idx, detected, not_focused, now=None):
+        """记录一个处理帧: 检测到的人数、该帧新增的不专注记录数"""
+        self.now = time.perf_counter() if now is None else now
+        self.processed += 1
+        self.frame = frame_idx
+        self.detected = detected
+        self.not_focused = not_focused
+        self.total_detected += detected
+        self.total_not_focused += not_focused
+        self.recent.append((self.now, frame_idx))
+    
+    @property
+    def done(self):
+        """已覆盖的视频帧数（含跳过的帧）"""
+        done = self.frame + 1 if self.processed else 0
+        return min(done, self.total_frames) if self.total_frames > 0 else done
+    
+    def rates(self):
+        """(处理帧/秒, 视频帧/秒)"""
+        if len(self.recent) >= 2:
+            (first_time, first_frame), (last_time, last_frame) = self.recent[0], self.recent[-1]
+            window = last_time - first_time
+            if window > 0:
+                return (len(self.recent) - 1) / window, (last_frame - first_frame) / window
+        elapsed = self.now - self.start
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return self.processed / elapsed, self.done / elapsed
+    
+    def snapshot(self):
+        """进度字典（字段见 ClassroomMonitor.process 的 progress_callback 说明）"""
+        fps, rate = self.rates()
+        total = self.total_frames
+        return {
+            'frame': self.frame,
+            'total_frames': total,
+            'percent': self.done / total * 100 if total > 0 else 0.0,
+            'processed': self.processed,
+            'fps': fps,
+            'speed': rate / self.video_fps if self.video_fps > 0 else 0.0,
+            'elapsed': self.now - self.start,
+            'eta': (total - self.done) / rate if rate > 0 and total > 0 else None,
+            'detected': self.detected,
+            'not_focused': self.not_focused,
+            'avg_detected': self.total_detected / self.processed if self.processed else 0.0,
+            'total_not_focused': self.total_not_focused,
+        }
+    
+    def format(self):
+        """控制台进度行"""
+        info = self.snapshot()
+        eta = info['eta']
+        eta_text = f"{int(eta // 60)}:{int(eta % 60):02d}" if eta is not None else "--:--"
+        return (f"  → 进度: {info['percent']:.1f}% [{info['frame']}/{info['total_frames']}] | "
+                f"{info['fps']:.1f} fps ({info['speed']:.2f}x) | 剩余 {eta_text} | "
+                f"检测到: {info['detected']}人 | 不专注: {info['not_focused']}人")
+
+
+class ProgressReporter:
+    """处理进度回调：逐帧更新 ProgressStats，按时间间隔节流回调并附带阶段性报告"""
+    
+    def __init__(self, monitor, total_frames, fps, callback=None):
+        self.monitor = monitor
+        self.callback = callback
+        self.stats = ProgressStats(total_frames, fps, monitor.config.PROGRESS_WINDOW)
+        self.record_count = 0
+        self.last_progress = self.last_partial = self.stats.start
+        self.partial_cost = 0.0
+    
+    def update(self, frame_idx, detected):
+        """每处理完一帧调用一次"""
+        records = self.monitor.attention_records
+        self.stats.update(frame_idx, detected, len(records) - self.record_count)
+        self.record_count = len(records)
+        
+        if self.callback is None:
+            return
+        now = self.stats.now
+        config = self.monitor.config
+        if now - self.last_progress < config.PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        info = self.stats.snapshot()
+        
+        # 阶段性报告的耗时随记录数增长，间隔至少为上次耗时的10倍，避免拖慢处理
+        if now - self.last_partial >= max(config.PARTIAL_REPORT_INTERVAL, 10 * self.partial_cost):
+            _, info['summary'] = build_report(records)
+            self.last_partial = time.perf_counter()
+            self.partial_cost = self.last_partial - now
+        
+        self.callback(info)
+
+
 class ClassroomMonitor:
-    def __init__(self, video_path, config=Config()):
+    def __init__(self, video_path, config=Config(), backend=None):
         self.video_path = video_path
         self.config = config
         self.attention_records = []
+        self.frame_detections = DetectionStore()  # 帧号 -> 该帧检测结果列表（打包保存）
+        self.fps = 0
         self.state_tracker = StudentStateTracker()  # **新增状态追踪器**
+        self.cancelled = False
+        self.backend = backend  # 预先加载（已预热）的推理后端，None则在process中加载
+        self.timings = StageTimings()  # 最近一次运行的各阶段耗时
+        self.schedule = None           # 最近一次运行的实时调度统计（REALTIME 时）
+        self.events = None             # 实时事件流（EVENT_STREAM 时由 process 创建）
         
-        if config.DEVICE == 0 and torch.cuda.is_available():
-            gpu_name = torch.cuda.get_device_name(0)
-            gpu_memory = torch.cuda.get_device_properties(0).total_memory / 1024**3
-            print(f"✓ GPU加速启用: {gpu_name} ({gpu_memory:.1f} GB)")
-        else:
-            print("⚠ 使用CPU模式")
-            config.DEVICE = 'cpu'  # 强制使用CPU
+        select_device(config)
     
-    def process(self, max_frames=0):
-        """处理视频"""
+    def process(self, max_frames=0, progress_callback=None, cancel_event=None):
+        """处理视频
+        
+        progress_callback: 可选，以进度字典为参数周期性调用，字段:
+            frame / total_frames / percent / processed / fps(处理帧/秒) /
+            speed(视频时长/处理耗时) / elapsed / eta(秒) / detected / not_focused(当前帧) /
+            avg_detected / total_not_focused(累计) /
+            summary(阶段性学生汇总，仅在生成阶段性报告时存在)
+            fps / speed / eta 按最近 PROGRESS_WINDOW 个处理帧滚动计算
+        cancel_event: 可选，threading.Event 等带 is_set() 的对象；在帧之间检查，
+            置位后停止处理并返回已处理部分的报告（self.cancelled 为 True）
+        """
+        self.cancelled = False
         print("\n" + "="*60)
         print("课堂专注度检测系统 v2.0 (增强版)".center(60))
         print("新增: 长时间低头、闭眼、发呆检测".center(60))
@@ -270,11 +1091,22 @@ class ClassroomMonitor:
         
         # 加载模型
         print("步骤1: 加载YOLOv8-pose模型...")
-        yolo = YOLO(self.config.POSE_MODEL)
-        if self.config.DEVICE == 0 and torch.cuda.is_available():
-            yolo.to("cuda")
+        replica_pool = None
+        backend = None
+        if self.config.REALTIME and (self.config.BATCH_SIZE > 1 or self.config.CPU_REPLICAS != 0):
+            print("⚠ 实时调度逐帧决定是否处理，不使用批量推理 / CPU多副本")
+        if self.config.DEVICE == 'cpu' and self.config.CPU_REPLICAS != 0 and not self.config.REALTIME:
+            from cpu_replicas import ReplicaPool
+            replica_pool = ReplicaPool(
+                self.config,
+                max(0, self.config.CPU_REPLICAS),
+                self.config.CPU_THREADS_PER_REPLICA
+            )
+            print(f"✓ CPU吞吐量模式: {replica_pool.num_replicas}个副本 x "
+                  f"{replica_pool.threads}线程")
+            print("⚠ 多副本模式使用IoU跟踪代替ByteTrack，学生ID与默认模式不可对比")
         else:
-            yolo.to("cpu")
+            backend = self._load_backend()
 
         print(f"✓ 模型加载成功\n")
         
@@ -290,174 +1122,125 @@ class ClassroomMonitor:
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = fps
         
         if max_frames > 0:
             total_frames = min(total_frames, max_frames)
-            print(f"✓ 视频: {total_frames}帧(测试模式), {fps:.2f}fps, {width}x{height}\n")
+            print(f"✓ 视频: {total_frames}帧(测试模式), {fps:.2f}fps, {width}x{height}")
         else:
-            print(f"✓ 视频: {total_frames}帧, {fps:.2f}fps, {width}x{height}\n")
+            print(f"✓ 视频: {total_frames}帧, {fps:.2f}fps, {width}x{height}")
+        
+        # 高分辨率视频改由ffmpeg解码到推理所需的尺寸，结果坐标再映射回原始分辨率
+        decoder = open_ffmpeg_capture(video_path, self.config, (width, height))
+        if decoder is not None:
+            cap.release()
+            cap = decoder
+            decode_width, decode_height = decoder.size
+            print(f"✓ ffmpeg解码: {width}x{height} -> {decode_width}x{decode_height} (BGR)")
+        print()
         
         # 初始化视频写入器
         video_writer = None
         if self.config.OUTPUT_VIDEO:
-            # 尝试多种编码器以提高兼容性
             output_fps = fps / (self.config.SKIP_FRAMES + 1)
-
-            # 优先使用H.264编码器（兼容性最好）
-            codecs_to_try = [
-                ('avc1', '.mp4'),  # H.264 (最佳兼容性)
-                ('mp4v', '.mp4'),  # MPEG-4 (备选)
-                ('XVID', '.avi'),  # Xvid (备选)
-            ]
-
-            video_writer = None
-            for codec, ext in codecs_to_try:
-                try:
-                    # 根据编码器调整输出文件扩展名
-                    output_path = self.config.OUTPUT_VIDEO_PATH
-                    if not output_path.endswith(ext):
-                        base_name = os.path.splitext(output_path)[0]
-                        output_path = base_name + ext
-
-                    fourcc = cv2.VideoWriter_fourcc(*codec)
-                    temp_writer = cv2.VideoWriter(
-                        output_path,
-                        fourcc,
-                        output_fps,
-                        (width, height)
-                    )
-
-                    if temp_writer.isOpened():
-                        video_writer = temp_writer
-                        self.config.OUTPUT_VIDEO_PATH = output_path
-                        print(f"✓ 视频编码器: {codec}")
-                        print(f"✓ 输出帧率: {output_fps:.2f} fps")
-                        print(f"✓ 视频输出: {os.path.abspath(output_path)}\n")
-                        break
-                    else:
-                        temp_writer.release()
-                except Exception as e:
-                    print(f"  尝试编码器 {codec} 失败: {e}")
-                    continue
-
-            if video_writer is None or not video_writer.isOpened():
-                raise ValueError(f"无法创建视频文件，所有编码器均失败")
+            video_writer, self.config.OUTPUT_VIDEO_PATH = open_video_writer(
+                self.config.OUTPUT_VIDEO_PATH, output_fps, (width, height)
+            )
         
         print("步骤3: 开始GPU加速检测...")
         print("行为: 低头(短暂/长期) | 闭眼 | 发呆 | 侧身 | 手部异常\n")
         
-        frame_idx = 0
         processed_count = 0
+        reporter = ProgressReporter(self, total_frames, fps, progress_callback)
+        metrics = create_metrics(self.config.METRICS_PATH, self.config.METRICS_INTERVAL)
+        timings = self.timings = StageTimings(metrics)
+        profiler = create_profiler(self.config.PROFILE_PATH, self.config.PROFILE_FRAMES,
+                                   self.config.PROFILE_WARMUP)
+        scheduler = create_scheduler(self.config, fps, backend)
+        if scheduler is not None:
+            print(f"✓ 实时调度: 每帧预算 {scheduler.budget * 1000:.0f} ms, "
+                  f"画质等级: {' -> '.join(level['name'] for level in scheduler.levels)}\n")
+        event_sink = create_event_sink(self.config)
+        if event_sink is not None:
+            self.events = AttentionEvents(event_sink, self.config, fps, self.video_path)
+            self.events.start(total_frames=total_frames)
+        tracking_source = replica_pool or backend
+        tracked = 0.0
+        drawn_detections = []
+        loop_start = time.perf_counter()
+        
+        # 采样帧 -> 推理 + 跟踪（单模型顺序执行 / 实时调度 / 批量推理，或多副本流水线）
+        frames = timings.timed('decode', self.read_frames(cap, max_frames))
+        if replica_pool is not None:
+            stream = replica_pool.track_stream(frames)
+        elif scheduler is not None:
+            stream = self._track_scheduled(backend, frames, scheduler)
+        elif self.config.BATCH_SIZE > 1:
+            stream = self._track_batches(backend, frames, self.config.BATCH_SIZE)
+        else:
+            stream = ((idx, frame, backend.track(frame)) for idx, frame in frames)
+        stream = timings.timed_excluding('inference', stream, 'decode')
+        if profiler is not None:
+            profiler.update(0)
         
         try:
-            while True:
-                if max_frames > 0 and frame_idx >= max_frames:
-                    break
-                
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # 跳帧
-                if frame_idx % (self.config.SKIP_FRAMES + 1) != 0:
-                    frame_idx += 1
+            for frame_idx, frame, result in stream:
+                start = time.perf_counter()
+                if result is None:
+                    # 实时调度跳过的帧: 输出视频中沿用上一处理帧的标注，保持时间线
+                    if video_writer:
+                        if decoder is not None:
+                            frame = upscale_frame(frame, (width, height))
+                        draw_annotations(frame, drawn_detections, self.config)
+                        drawn = time.perf_counter()
+                        video_writer.write(frame)
+                        timings.add('drawing', drawn - start)
+                        timings.add('encoding', time.perf_counter() - drawn)
                     continue
-                
-                # YOLO推理
-                results = yolo.track(
-                    frame,
-                    classes=[0],
-                    conf=self.config.CONFIDENCE_THRESHOLD,
-                    persist=True,
-                    tracker="bytetrack.yaml",
-                    device=self.config.DEVICE,
-                    verbose=False
-                )
+                # 推理耗时中包含后端的跟踪耗时，逐帧改记到tracking
+                tracking_time = getattr(tracking_source, 'tracking_time', 0.0)
+                timings.move('inference', 'tracking', tracking_time - tracked)
+                tracked = tracking_time
+                if decoder is not None:
+                    result = result.scaled(width / decode_width, height / decode_height)
                 
                 # 处理结果
-                if results[0].boxes and len(results[0].boxes) > 0:
-                    boxes = results[0].boxes
-                    keypoints = results[0].keypoints
-                    orig_frame = results[0].orig_img
-                    
-                    for i, box in enumerate(boxes):
-                        track_id = int(box.id[0]) if box.id is not None else 0
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        bbox_height = y2 - y1
-                        
-                        # 计算专注度（包含新行为检测）
-                        if keypoints and i < len(keypoints.data):
-                            kpts = keypoints.data[i].cpu().numpy()
-                            attention_score, reasons = calculate_attention_score(
-                                kpts, 
-                                bbox_height, 
-                                self.config,
-                                self.state_tracker,  # 传入状态追踪器
-                                track_id,
-                                fps
-                            )
-                            
-                            # 绘制增强标注
-                            is_not_focused = attention_score < self.config.ATTENTION_SCORE_THRESHOLD
-                            
-                            color = (0, 0, 255) if is_not_focused else (0, 255, 0)
-                            
-                            # 加粗边框（长时间行为用更粗的框）
-                            if any("长时间" in r for r in reasons):
-                                border_thickness = 4
-                            else:
-                                border_thickness = 2
-                            
-                            cv2.rectangle(orig_frame, (x1, y1), (x2, y2), color, border_thickness)
-                            
-                            # 绘制文字标签
-                            if self.config.SHOW_LABELS:
-                                status = "NOT FOCUS" if is_not_focused else "FOCUS"
-                                
-                                # 原因标签（最多显示2个，避免过长）
-                                main_reasons = reasons[:2]
-                                reason_text = f"({'; '.join(main_reasons)})" if main_reasons else ""
-                                
-                                label = f"ID:{track_id} {status}({attention_score}) {reason_text}"
-                                label_y = max(20, y1 - 10)
-                                
-                                # 文字背景
-                                (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                                cv2.rectangle(orig_frame, (x1, label_y - text_h - 5), 
-                                            (x1 + text_w, label_y + 5), (0, 0, 0), -1)
-                                
-                                cv2.putText(orig_frame, label, (x1, label_y), 
-                                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-                            
-                            # 记录不专注事件
-                            if is_not_focused:
-                                self.attention_records.append({
-                                    'student_id': track_id,
-                                    'time_sec': round(frame_idx / fps, 2),
-                                    'time_str': str(timedelta(seconds=int(frame_idx / fps))),
-                                    'frame': frame_idx,
-                                    'score': attention_score,
-                                    'reason': ';'.join(reasons),
-                                    'bbox': (x1, y1, x2, y2)
-                                })
-                    
-                    # 写入视频
-                    if video_writer:
-                        video_writer.write(orig_frame)
-                else:
-                    if video_writer:
-                        video_writer.write(frame)
+                detections = self._process_detections(result, frame_idx, fps)
+                scored = time.perf_counter()
+                timings.add('scoring', scored - start)
                 
-                # 进度显示（包含每帧检测到的人数）
-                if processed_count % 50 == 0:
-                    progress = (frame_idx / total_frames) * 100
-                    detected_people = len(results[0].boxes) if results[0].boxes else 0
-                    not_focus_count = sum(1 for r in self.attention_records if r['frame'] == frame_idx)
-                    print(f"  → 进度: {progress:.1f}% [{frame_idx}/{total_frames}] | "
-                          f"检测到: {detected_people}人 | 不专注: {not_focus_count}人")
+                # 只有输出视频时才绘制并写入
+                if video_writer:
+                    if decoder is not None:
+                        frame = upscale_frame(frame, (width, height))
+                    draw_annotations(frame, detections, self.config)
+                    drawn = time.perf_counter()
+                    video_writer.write(frame)
+                    timings.add('drawing', drawn - scored)
+                    timings.add('encoding', time.perf_counter() - drawn)
+                    drawn_detections = detections
+                if scheduler is not None:
+                    scheduler.finish()
                 
                 processed_count += 1
-                frame_idx += 1
+                timings.frames = processed_count
+                if metrics is not None:
+                    metrics.frame(frame_idx, timings.pop_frame(), len(result),
+                                  getattr(tracking_source, 'active_tracks', None),
+                                  self._queue_depths(decoder, replica_pool))
+                if profiler is not None:
+                    profiler.update(processed_count)
+                reporter.update(frame_idx, len(result))
+                
+                # 进度显示（每50个处理帧一行，统计来自 ProgressStats，每帧O(1)更新）
+                if processed_count % 50 == 1:
+                    print(reporter.stats.format())
+                
+                # 帧之间检查取消请求
+                if cancel_event is not None and cancel_event.is_set():
+                    self.cancelled = True
+                    print("\n\n已取消，正在保存已处理部分...")
+                    break
                 
         except KeyboardInterrupt:
             print("\n\n用户中断，正在保存...")
@@ -470,105 +1253,317 @@ class ClassroomMonitor:
         finally:
             # 资源释放
             try:
+                stream.close()
                 cap.release()
+                if profiler is not None:
+                    profiler.close(processed_count)
+                if scheduler is not None:
+                    self.schedule = scheduler.close()
+                if event_sink is not None:
+                    self.close_events(event_sink, processed_frames=processed_count)
+                if metrics is not None:
+                    metrics.close()
+                    print(f"✓ 运行指标已导出: {os.path.abspath(self.config.METRICS_PATH)}")
+                if replica_pool is not None:
+                    replica_pool.close()
+                if isinstance(backend, CropRefinePoseBackend) and backend.total_count:
+                    ratio = backend.refined_count / backend.total_count * 100
+                    print(f"\n✓ 裁剪精细化: 精细模型处理 {backend.refined_count}/{backend.total_count} "
+                          f"个检测 ({ratio:.1f}%)")
                 if video_writer:
+                    start = time.perf_counter()
                     video_writer.release()
-                    output_path = os.path.abspath(self.config.OUTPUT_VIDEO_PATH)
-                    print(f"\n✓ 标注视频已保存: {output_path}")
-
-                    # 验证视频文件是否可读
-                    if os.path.exists(self.config.OUTPUT_VIDEO_PATH):
-                        file_size = os.path.getsize(self.config.OUTPUT_VIDEO_PATH) / (1024 * 1024)
-                        print(f"✓ 文件大小: {file_size:.2f} MB")
-
-                        # 尝试打开视频验证
-                        test_cap = cv2.VideoCapture(self.config.OUTPUT_VIDEO_PATH)
-                        if test_cap.isOpened():
-                            test_fps = test_cap.get(cv2.CAP_PROP_FPS)
-                            test_frames = int(test_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                            test_cap.release()
-                            print(f"✓ 视频验证成功: {test_frames}帧, {test_fps:.2f}fps")
-                            print(f"✓ 可以使用VLC、QuickTime等播放器打开")
-                        else:
-                            test_cap.release()
-                            print(f"⚠ 警告: 视频文件可能损坏，请尝试使用VLC播放器打开")
-
-                if torch.cuda.is_available():
+                    timings.add('encoding', time.perf_counter() - start)
+                    verify_output_video(self.config.OUTPUT_VIDEO_PATH)
+                if self.config.DETECTIONS_PATH:
+                    self.save_detections(self.config.DETECTIONS_PATH)
+
+                torch = load_torch() if self.config.DEVICE != 'cpu' else None
+                if torch is not None and torch.cuda.is_available():
                     torch.cuda.empty_cache()
             except Exception as e:
                 print(f"清理资源时出错: {e}")
         
-        return self.generate_report()
+        start = time.perf_counter()
+        report = self.generate_report()
+        timings.add('report', time.perf_counter() - start)
+        timings.wall = time.perf_counter() - loop_start
+        return report
     
-    def generate_report(self):
-        """生成CSV报告"""
-        if not self.attention_records:
-            return None, {}
+    @staticmethod
+    def _track_scheduled(backend, frames, scheduler):
+        """实时调度: 来不及在截止时间前处理的帧不推理，结果为None"""
+        for frame_idx, frame in frames:
+            if scheduler.should_process(frame_idx):
+                yield frame_idx, frame, backend.track(frame)
+            else:
+                yield frame_idx, frame, None
+    
+    def close_events(self, event_sink, **info):
+        """结束事件流: 关闭进行中的不专注时间段，输出 session_end 并写出缓冲区"""
+        self.events.finish(**info)
+        self.events = None
+        event_sink.close()
+        if not event_sink.failed:
+            print(f"✓ 事件流: 共输出{event_sink.written}条事件 -> {event_sink.target}")
+    
+    def _load_backend(self):
+        """单模型推理后端: 复用预先加载的后端（清空跟踪状态）或按配置创建"""
+        if self.backend is not None:
+            backend = self.backend
+            backend.reset()  # 复用预热的模型，清空上一次运行的跟踪状态
+        else:
+            backend = build_pose_backend(self.config)
+        if self.config.CASCADE:
+            print(f"✓ 级联模式: {self.config.CASCADE_SMALL_MODEL} -> {self.config.POSE_MODEL}")
+        if self.config.CROP_REFINE:
+            print(f"✓ 双分辨率模式: 检测{self.config.CROP_DETECT_IMG_SIZE}px, "
+                  f"小目标裁剪{self.config.CROP_POSE_IMG_SIZE}px")
+        return backend
+    
+    def process_live(self, progress_callback=None, cancel_event=None):
+        """处理实时视频源（摄像头 / 网络流 / 管道 / LIVE_REPLAY 回放的文件）
         
-        df = pd.DataFrame(self.attention_records)
+        采集线程只保留最新一帧，处理跟不上时丢弃过时的帧而不排队，延迟不超过处理一帧的时间；
+        运行到视频源结束、LIVE_MAX_SECONDS、取消或 Ctrl+C 为止。
+        不专注记录每 LIVE_FLUSH_INTERVAL 秒追加写入 LIVE_EVENTS_PATH，
+        每 LIVE_REPORT_INTERVAL 秒生成一个窗口报告并从内存中移除该窗口的记录。
+        progress_callback / cancel_event 同 process()；返回最后一个窗口的 (DataFrame, summary)
+        """
+        self.cancelled = False
+        config = self.config
+        print("\n" + "="*60)
+        print("课堂专注度检测系统 v2.0 (实时模式)".center(60))
+        print("="*60 + "\n")
         
-        # 按学生汇总
-        summary = {}
-        for student_id in sorted(df['student_id'].unique()):
-            student_data = df[df['student_id'] == student_id].sort_values('time_sec')
-            
-            # 合并连续时间段
-            time_ranges = []
-            if not student_data.empty:
-                start_time = student_data.iloc[0]['time_sec']
-                end_time = student_data.iloc[0]['time_sec']
+        print("步骤1: 加载YOLOv8-pose模型...")
+        if config.DEVICE == 'cpu' and config.CPU_REPLICAS != 0:
+            print("⚠ 实时模式不使用CPU多副本（流水线会积压过时的帧），改用单模型")
+        backend = self._load_backend()
+        print(f"✓ 模型加载成功\n")
+        
+        print("步骤2: 打开实时视频源...")
+        capture = LatestFrameCapture(self.video_path, replay=config.LIVE_REPLAY)
+        fps = self.fps = capture.fps
+        width, height = capture.size
+        mode = "，按真实时间回放" if config.LIVE_REPLAY else ""
+        print(f"✓ 视频源: {self.video_path} ({width}x{height}, {fps:.2f}fps{mode})")
+        if config.OUTPUT_VIDEO:
+            print("⚠ 实时模式不输出标注视频")
+        
+        reports = RollingReports(config.LIVE_EVENTS_PATH, config.LIVE_REPORT_DIR,
+                                 config.LIVE_FLUSH_INTERVAL, config.LIVE_REPORT_INTERVAL)
+        if config.LIVE_EVENTS_PATH:
+            print(f"✓ 不专注记录每{config.LIVE_FLUSH_INTERVAL:g}秒写入: "
+                  f"{os.path.abspath(config.LIVE_EVENTS_PATH)}")
+        print(f"✓ 每{config.LIVE_REPORT_INTERVAL:g}秒生成窗口报告: {os.path.abspath(config.LIVE_REPORT_DIR)}")
+        
+        print("\n步骤3: 开始实时检测（Ctrl+C 停止）...\n")
+        processed_count = 0
+        reporter = ProgressReporter(self, 0, fps, progress_callback)
+        metrics = create_metrics(config.METRICS_PATH, config.METRICS_INTERVAL)
+        timings = self.timings = StageTimings(metrics)
+        # 实时源的过时帧已由采集端丢弃，调度器只按丢帧比例和实测耗时调整画质
+        scheduler = create_scheduler(config, fps, backend)
+        event_sink = create_event_sink(config)
+        if event_sink is not None:
+            self.events = AttentionEvents(event_sink, config, fps, self.video_path)
+            self.events.start(live=True)
+        dropped = 0
+        tracked = 0.0
+        latency = 0.0
+        start = time.monotonic()
+        loop_start = time.perf_counter()
+        
+        try:
+            while True:
+                waited = time.perf_counter()
+                item = capture.read()
+                timings.add('decode', time.perf_counter() - waited)
+                if cancel_event is not None and cancel_event.is_set():
+                    self.cancelled = True
+                    print("\n\n已取消，正在保存...")
+                    break
+                if item is None:
+                    if capture.ended:
+                        print("\n视频源已结束")
+                        break
+                    continue
+                frame_idx, captured_at, frame = item
                 
-                for _, row in student_data.iterrows():
-                    if row['time_sec'] - end_time > 3:
-                        if end_time - start_time >= 1:
-                            time_ranges.append((start_time, end_time))
-                        start_time = row['time_sec']
-                    end_time = row['time_sec']
+                inferred = time.perf_counter()
+                if scheduler is not None:
+                    scheduler.skip(capture.dropped - dropped)
+                    dropped = capture.dropped
+                    scheduler.begin(inferred)
+                result = backend.track(frame)
+                scored = time.perf_counter()
+                timings.add('inference', scored - inferred)
+                timings.move('inference', 'tracking', backend.tracking_time - tracked)
+                tracked = backend.tracking_time
                 
-                if end_time - start_time >= 1:
-                    time_ranges.append((start_time, end_time))
-            
-            formatted_ranges = []
-            total_duration = 0
-            for start, end in time_ranges:
-                duration = end - start
+                self._process_detections(result, frame_idx, fps)
+                timings.add('scoring', time.perf_counter() - scored)
+                latency = time.monotonic() - captured_at
+                if scheduler is not None:
+                    scheduler.finish()
                 
-                # 提取该时间段的主要不专注原因
-                time_range_data = student_data[
-                    (student_data['time_sec'] >= start) & 
-                    (student_data['time_sec'] <= end)
-                ]
+                processed_count += 1
+                timings.frames = processed_count
+                if metrics is not None:
+                    metrics.frame(frame_idx, timings.pop_frame(), len(result),
+                                  getattr(backend, 'active_tracks', None),
+                                  {'capture': capture.pending})
+                reporter.update(frame_idx, len(result))
                 
-                if not time_range_data.empty:
-                    # 统计该时间段内各种不专注行为的出现频率
-                    all_reasons = []
-                    for reason_str in time_range_data['reason']:
-                        all_reasons.extend(reason_str.split(';'))
-                    
-                    # 找出最常见的不专注行为
-                    from collections import Counter
-                    reason_counts = Counter(all_reasons)
-                    main_reason = reason_counts.most_common(1)[0][0] if reason_counts else "未知"
-                else:
-                    main_reason = "未知"
+                if processed_count % 50 == 1:
+                    info = reporter.stats.snapshot()
+                    elapsed = int(time.monotonic() - start)
+                    print(f"  → 实时 {elapsed // 60}:{elapsed % 60:02d} | {info['fps']:.1f} fps | "
+                          f"延迟 {latency * 1000:.0f} ms | 丢弃 {capture.dropped}帧 | "
+                          f"检测到: {info['detected']}人 | 不专注: {info['not_focused']}人")
                 
-                formatted_ranges.append({
-                    'start': str(timedelta(seconds=int(start))),
-                    'end': str(timedelta(seconds=int(end))),
-                    'duration_sec': round(duration, 1),
-                    'reason': main_reason
-                })
-                total_duration += duration
-            
-            if formatted_ranges:
-                summary[student_id] = {
-                    'time_ranges': formatted_ranges,
-                    'total_duration_sec': round(total_duration, 1),
-                    'event_count': len(formatted_ranges)
-                }
+                now = time.monotonic()
+                if reports.update(self.attention_records, now):
+                    self._close_live_window(reports, reporter)
+                if config.LIVE_MAX_SECONDS > 0 and now - start >= config.LIVE_MAX_SECONDS:
+                    print(f"\n已运行{config.LIVE_MAX_SECONDS:g}秒，停止")
+                    break
+        
+        except KeyboardInterrupt:
+            print("\n\n用户中断，正在保存...")
         
+        finally:
+            capture.release()
+            reports.flush(self.attention_records)
+            if scheduler is not None:
+                self.schedule = scheduler.close()
+            if event_sink is not None:
+                self.close_events(event_sink, processed_frames=processed_count,
+                                  dropped_frames=capture.dropped)
+            if metrics is not None:
+                metrics.close()
+                print(f"✓ 运行指标已导出: {os.path.abspath(config.METRICS_PATH)}")
+        
+        print(f"\n✓ 共处理{processed_count}帧, 丢弃{capture.dropped}帧 (处理跟不上采集时只处理最新帧), "
+              f"最后一帧延迟 {latency * 1000:.0f} ms")
+        report = self._close_live_window(reports, reporter, clear=False)
+        timings.wall = time.perf_counter() - loop_start
+        return report
+    
+    def _close_live_window(self, reports, reporter, clear=True):
+        """结束一个滚动窗口: 生成并保存窗口报告，clear 时清空内存中的记录"""
+        start = time.perf_counter()
+        df, summary = self.generate_report()
+        window_start, window_end, path = reports.close_window(self.attention_records, df)
+        self.timings.add('report', time.perf_counter() - start)
+        
+        events = sum(len(data['time_ranges']) for data in summary.values())
+        print(f"  ▶ 窗口 {window_start:%H:%M:%S}-{window_end:%H:%M:%S}: "
+              f"{len(summary)}名学生不专注, {events}个时间段"
+              + (f" | 报告: {path}" if path else ""))
+        for student_id in sorted(summary, key=lambda sid: -summary[sid]['total_duration_sec'])[:5]:
+            data = summary[student_id]
+            print(f"      学生{student_id:02d}: {data['total_duration_sec']}秒, "
+                  f"主因 {data['time_ranges'][-1]['reason']}")
+        
+        if clear:
+            # 窗口记录已写入事件文件和窗口报告；进度统计按记录数增量计算，一起归零
+            self.attention_records.clear()
+            self.frame_detections.clear()
+            reporter.record_count = 0
         return df, summary
     
+    @staticmethod
+    def _queue_depths(decoder, replica_pool):
+        """解码预读队列 / 多副本在途帧数"""
+        depths = {}
+        if decoder is not None:
+            depths['decode'] = decoder.queue.qsize()
+        if replica_pool is not None:
+            depths['replicas'] = replica_pool.in_flight
+        return depths
+    
+    @staticmethod
+    def _track_batches(backend, frames, batch_size):
+        """每次取 batch_size 帧批量推理，按原顺序生成 (帧号, 帧, 结果)"""
+        frames = iter(frames)
+        while True:
+            batch = list(islice(frames, batch_size))
+            if not batch:
+                return
+            results = backend.track_batch([frame for _, frame in batch])
+            for (frame_idx, frame), result in zip(batch, results):
+                yield frame_idx, frame, result
+    
+    def read_frames(self, cap, max_frames=0):
+        """按跳帧设置读取视频，生成 (帧号, 帧)"""
+        if isinstance(cap, FfmpegCapture):  # 跳帧已在ffmpeg内完成
+            yield from cap.frames(max_frames)
+            return
+        
+        frame_idx = 0
+        while True:
+            if max_frames > 0 and frame_idx >= max_frames:
+                break
+            
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
+            # 跳帧
+            if frame_idx % (self.config.SKIP_FRAMES + 1) == 0:
+                yield frame_idx, frame
+            frame_idx += 1
+    
+    def _process_detections(self, result, frame_idx, fps):
+        """对单帧检测结果计算专注度并记录不专注事件，返回该帧的检测结果列表"""
+        detections = []
+        for i in range(len(result)):
+            track_id = int(result.track_ids[i])
+            x1, y1, x2, y2 = map(int, result.boxes[i])
+            bbox_height = y2 - y1
+            
+            # 计算专注度（包含新行为检测）
+            attention_score, reasons = calculate_attention_score(
+                result.keypoints[i], 
+                bbox_height, 
+                self.config,
+                self.state_tracker,  # 传入状态追踪器
+                track_id,
+                fps,
+                frame_idx / fps      # 按帧的视频时刻计时（跳帧 / 丢帧时不少计）
+            )
+            detections.append({
+                'student_id': track_id,
+                'bbox': [x1, y1, x2, y2],
+                'score': attention_score,
+                'reasons': reasons,
+                'keypoints': result.keypoints[i]   # 保留关键点，用于离线重新评分
+            })
+            
+            # 记录不专注事件
+            if attention_score < self.config.ATTENTION_SCORE_THRESHOLD:
+                self.attention_records.append(make_attention_record(
+                    track_id, frame_idx, fps, attention_score, reasons, (x1, y1, x2, y2)
+                ))
+        
+        # 保留逐帧结果，供GUI实时叠加标注或之后导出视频
+        if self.config.KEEP_DETECTIONS or self.config.DETECTIONS_PATH:
+            self.frame_detections.add(frame_idx, detections)
+        if self.events is not None:
+            self.events.frame(frame_idx, detections)
+        return detections
+    
+    def save_detections(self, path):
+        """保存本次运行的逐帧检测结果"""
+        save_detections(self.frame_detections, path)
+        print(f"✓ 逐帧检测结果已保存: {os.path.abspath(path)}")
+    
+    def generate_report(self):
+        """生成CSV报告"""
+        return build_report(self.attention_records)
+    
     def print_report(self, summary):
         """打印控制台报告"""
         if not summary:
@@ -592,6 +1587,11 @@ class ClassroomMonitor:
                       f"(持续 {time_range['duration_sec']}秒)")
                 print(f"     主因: {time_range['reason']}")
         
+        print("\n持续时间最长的不专注事件:")
+        for i, event in enumerate(EventIndex(summary).longest(5), 1):
+            print(f"  {i}. 学生{event['student_id']:02d} {event['start']} ~ {event['end']} "
+                  f"(持续 {event['duration_sec']}秒, {event['reason']})")
+        
         print("\n" + "="*70)
         print(f"总计不专注学生数: {len(summary)}人")
         print("="*70 + "\n")
@@ -620,7 +1620,9 @@ def main():
         '''
     )
     
-    parser.add_argument('video_path', help='输入视频文件路径')
+    parser.add_argument('video_path', nargs='+',
+                       help='输入视频文件路径，或实时源(摄像头编号 / /dev/videoN / 流地址)；'
+                            '多个视频时按多机位共用一个模型合批处理')
     parser.add_argument('--threshold', type=int, default=85,
                        help='专注度阈值(0-100), 默认40')
     parser.add_argument('--skip-frames', type=int, default=2,
@@ -631,33 +1633,161 @@ def main():
                        help='不在视频上显示文字标签')
     parser.add_argument('-o', '--output', default='output_annotated.mp4',
                        help='输出视频路径(默认: output_annotated.mp4)')
+    parser.add_argument('--save-detections', default=None, metavar='PATH',
+                       help='保存逐帧检测结果(JSON Lines), 可用于GUI叠加显示或事后导出标注视频')
+    parser.add_argument('--export-clips', default=None, metavar='DIR',
+                       help='为每个不专注时间段导出带标注的短片段到该目录')
+    parser.add_argument('--clip-padding', type=float, default=Config.CLIP_PADDING,
+                       help=f'事件片段前后各保留的秒数(默认{Config.CLIP_PADDING})')
+    parser.add_argument('--batch-size', type=int, default=Config.BATCH_SIZE,
+                       help='每次推理的帧数(默认1; >1时批量推理后按顺序跟踪)')
     parser.add_argument('--max-frames', type=int, default=0,
                        help='最大处理帧数(0=全部), 用于测试')
+    parser.add_argument('--cpu-replicas', type=int, default=0,
+                       help='CPU吞吐量模式: 模型副本进程数(0=关闭, -1=自动), 使用IoU跟踪代替ByteTrack')
+    parser.add_argument('--threads-per-replica', type=int, default=0,
+                       help='CPU吞吐量模式: 每个副本的线程数(0=自动)')
+    parser.add_argument('--cascade', action='store_true',
+                       help='级联模式: 小模型处理全帧，仅对不确定的学生运行--model')
+    parser.add_argument('--small-model', default=Config.CASCADE_SMALL_MODEL,
+                       help=f'级联模式的小模型(默认{Config.CASCADE_SMALL_MODEL})')
+    parser.add_argument('--crop-refine', action='store_true',
+                       help='双分辨率模式: 低分辨率检测全帧，小目标在高分辨率裁剪上估计姿态')
+    parser.add_argument('--backend', choices=['ultralytics', 'onnx'], default='ultralytics',
+                       help='推理后端(默认ultralytics; onnx=ONNX Runtime CPU)')
+    parser.add_argument('--model', default=Config.POSE_MODEL,
+                       help=f'姿态模型路径(.pt或.onnx, 默认{Config.POSE_MODEL})')
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                       help='周期导出运行指标(.prom=Prometheus文本格式, 其他=JSON Lines)')
+    parser.add_argument('--metrics-interval', type=float, default=Config.METRICS_INTERVAL,
+                       help=f'运行指标导出间隔秒数(默认{Config.METRICS_INTERVAL})')
+    parser.add_argument('--profile', default=None, metavar='PATH',
+                       help='性能剖析: 写出折叠调用栈(可生成火焰图)和 *_top.txt 热点汇总')
+    parser.add_argument('--profile-frames', type=int, default=Config.PROFILE_FRAMES,
+                       help=f'性能剖析的帧数(默认{Config.PROFILE_FRAMES})')
+    parser.add_argument('--profile-warmup', type=int, default=Config.PROFILE_WARMUP,
+                       help=f'开始剖析前跳过的帧数(默认{Config.PROFILE_WARMUP})')
+    parser.add_argument('--decoder', choices=['auto', 'ffmpeg', 'opencv'], default=Config.DECODER,
+                       help='视频解码方式(默认auto: 高分辨率视频由ffmpeg直接解码到模型输入尺寸)')
+    parser.add_argument('--decode-size', type=int, default=Config.DECODE_SIZE,
+                       help='解码后长边像素(0=按模型输入尺寸, -1=原始分辨率)')
+    parser.add_argument('--realtime', action='store_true',
+                       help='实时调度: 按每帧延迟预算跳帧 / 降低画质，处理进度不落后于视频时间线')
+    parser.add_argument('--frame-budget', type=float, default=Config.FRAME_BUDGET_MS, metavar='MS',
+                       help='实时调度的每帧延迟预算(毫秒, 默认0=采样间隔)')
+    parser.add_argument('--schedule-log', default=None, metavar='PATH',
+                       help='实时调度的降级 / 恢复决策日志(JSON Lines)')
+    parser.add_argument('--event-stream', default=None, metavar='TARGET',
+                       help='边处理边输出JSON Lines事件: "-"(标准输出) / 文件路径 / tcp://主机:端口 / unix:///路径')
+    parser.add_argument('--event-flush', type=float, default=Config.EVENT_FLUSH_INTERVAL,
+                       help=f'事件最长缓冲时间(秒, 默认{Config.EVENT_FLUSH_INTERVAL:g})')
+    parser.add_argument('--event-aggregate', type=float, default=Config.EVENT_AGGREGATE_INTERVAL,
+                       help=f'全班汇总事件间隔(视频秒, 默认{Config.EVENT_AGGREGATE_INTERVAL:g})')
+    parser.add_argument('--live', action='store_true',
+                       help='按实时源处理(摄像头编号、/dev/videoN、流地址、命名管道会自动识别)')
+    parser.add_argument('--replay', action='store_true',
+                       help='把视频文件按真实时间回放为实时源(测试实时模式)')
+    parser.add_argument('--live-seconds', type=float, default=Config.LIVE_MAX_SECONDS,
+                       help='实时模式最长运行秒数(默认0=直到视频源结束或Ctrl+C)')
+    parser.add_argument('--report-interval', type=float, default=Config.LIVE_REPORT_INTERVAL,
+                       help=f'实时模式滚动报告窗口秒数(默认{Config.LIVE_REPORT_INTERVAL:g})')
+    parser.add_argument('--events', default=Config.LIVE_EVENTS_PATH, metavar='PATH',
+                       help=f'实时模式不专注记录的追加写入文件(默认{Config.LIVE_EVENTS_PATH})')
+    parser.add_argument('--config', default=None, metavar='PATH',
+                       help='加载配置文件(如 tools/autotune.py 的调参结果), 显式指定的参数优先')
     
+    # 配置文件中的值作为对应参数的默认值
+    file_values = {}
+    known, _ = parser.parse_known_args()
+    if known.config:
+        try:
+            file_values = load_config_file(known.config)
+        except (OSError, ValueError) as e:
+            print(f"✗ 错误: 无法读取配置文件 {known.config}: {e}")
+            sys.exit(1)
+        parser.set_defaults(**{dest: file_values[name] for name, dest in CONFIG_FILE_ARGS.items()
+                               if name in file_values})
+        print(f"✓ 已加载配置文件: {os.path.abspath(known.config)}")
     args = parser.parse_args()
     
-    if not os.path.exists(args.video_path):
-        print(f"✗ 错误: 文件不存在: {args.video_path}")
+    if args.event_stream == '-':
+        sys.stdout = sys.stderr  # 标准输出只留给事件流，控制台信息改到标准错误
+    
+    video_paths = args.video_path
+    args.video_path = video_paths[0]
+    live = args.live or args.replay or is_live_source(args.video_path)
+    if len(video_paths) > 1 and live:
+        print("✗ 错误: 多路处理只支持视频文件，不支持实时源模式")
         sys.exit(1)
+    for path in video_paths:
+        if not (live and not args.replay) and not os.path.exists(path):
+            print(f"✗ 错误: 文件不存在: {path}")
+            sys.exit(1)
     
-    config = Config()
+    config = apply_config_file(Config(), file_values)
     config.ATTENTION_SCORE_THRESHOLD = args.threshold
     config.SKIP_FRAMES = args.skip_frames
+    config.BATCH_SIZE = max(1, args.batch_size)
     config.OUTPUT_VIDEO = args.save_video
     config.OUTPUT_VIDEO_PATH = args.output
     config.SHOW_LABELS = not args.no_labels
+    config.DETECTIONS_PATH = args.save_detections
+    config.BACKEND = args.backend
+    config.CPU_REPLICAS = args.cpu_replicas
+    config.CASCADE = args.cascade
+    config.CASCADE_SMALL_MODEL = args.small_model
+    config.CROP_REFINE = args.crop_refine
+    config.CPU_THREADS_PER_REPLICA = args.threads_per_replica
+    config.POSE_MODEL = args.model
+    config.KEEP_DETECTIONS = bool(args.export_clips)
+    config.CLIP_PADDING = args.clip_padding
+    config.DECODER = args.decoder
+    config.METRICS_PATH = args.metrics
+    config.METRICS_INTERVAL = args.metrics_interval
+    config.PROFILE_PATH = args.profile
+    config.PROFILE_FRAMES = args.profile_frames
+    config.PROFILE_WARMUP = args.profile_warmup
+    config.DECODE_SIZE = args.decode_size
+    config.REALTIME = args.realtime
+    config.FRAME_BUDGET_MS = args.frame_budget
+    config.REALTIME_LOG_PATH = args.schedule_log
+    config.EVENT_STREAM = args.event_stream
+    config.EVENT_FLUSH_INTERVAL = args.event_flush
+    config.EVENT_AGGREGATE_INTERVAL = args.event_aggregate
+    config.LIVE = live
+    config.LIVE_REPLAY = args.replay
+    config.LIVE_MAX_SECONDS = args.live_seconds
+    config.LIVE_REPORT_INTERVAL = args.report_interval
+    config.LIVE_EVENTS_PATH = args.events
     
+    # ONNX后端 / CPU推理不需要torch，不为打印版本信息而导入
+    onnx_backend = is_onnx_backend(config)
+    torch = None if onnx_backend or config.DEVICE == 'cpu' else load_torch()
     print("\n" + "-"*60)
-    print(f"PyTorch版本: {torch.__version__}")
-    print(f"CUDA可用: {torch.cuda.is_available()}")
-    if torch.cuda.is_available():
+    if onnx_backend:
+        print("推理后端: ONNX Runtime (CPU)")
+    elif torch is not None:
+        print(f"PyTorch版本: {torch.__version__}")
+        print(f"CUDA可用: {torch.cuda.is_available()}")
+    elif config.DEVICE == 'cpu':
+        print("推理设备: CPU")
+    else:
+        print("PyTorch未安装，仅可使用ONNX后端")
+    if torch is not None and torch.cuda.is_available():
         print(f"GPU: {torch.cuda.get_device_name(0)}")
         print(f"显存: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
     print("-"*60 + "\n")
     
+    if len(video_paths) > 1:
+        run_multi_stream(video_paths, config, args)
+        return
+    
     try:
         monitor = ClassroomMonitor(args.video_path, config)
-        df, summary = monitor.process(args.max_frames)
+        if config.LIVE:
+            df, summary = monitor.process_live()
+        else:
+            df, summary = monitor.process(args.max_frames)
         
         monitor.print_report(summary)
         
@@ -669,6 +1799,48 @@ def main():
         if config.OUTPUT_VIDEO and os.path.exists(config.OUTPUT_VIDEO_PATH):
             print(f"✓ 标注视频已保存: {os.path.abspath(config.OUTPUT_VIDEO_PATH)}")
         
+        if args.export_clips and summary:
+            from clip_export import export_event_clips
+            export_event_clips(args.video_path, summary, args.export_clips, config,
+                               monitor.frame_detections)
+        
+        print("\n" + "="*60)
+        print("✓ 所有任务完成！")
+        print("="*60 + "\n")
+    
+    except Exception as e:
+        print(f"\n✗ 错误: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+def run_multi_stream(video_paths, config, args):
+    """多机位: 各路共用一个模型合批推理，输出各路及合并报告"""
+    from multi_stream import MultiStreamRunner
+    
+    try:
+        runner = MultiStreamRunner(video_paths, config)
+        reports, (combined_df, overview) = runner.process(args.max_frames)
+        runner.print_reports(reports, (combined_df, overview))
+        
+        for name, (df, _) in reports.items():
+            if df is not None:
+                csv_path = f"attention_report_{name}.csv"
+                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+                print(f"✓ [{name}] CSV报告已保存: {os.path.abspath(csv_path)}")
+        if combined_df is not None:
+            csv_path = "attention_report_combined.csv"
+            combined_df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+            print(f"✓ 合并CSV报告已保存: {os.path.abspath(csv_path)}")
+        
+        if args.export_clips:
+            from clip_export import export_event_clips
+            for name, monitor in zip(runner.names, runner.monitors):
+                if reports[name][1]:
+                    export_event_clips(monitor.video_path, reports[name][1],
+                                       os.path.join(args.export_clips, name), config,
+                                       monitor.frame_detections)
+        
         print("\n" + "="*60)
         print("✓ 所有任务完成！")
         print("="*60 + "\n")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+不专注事件片段导出
+按 build_report 合并后的时间段（前后各加 padding 秒）从原视频剪出每个事件的短片段:
+  - 有ffmpeg时: 片段中间完整的GOP直接流复制，只把首尾不足一个GOP的部分
+    按帧号定位解码、叠加标注后重新编码，再无损拼接
+  - 没有ffmpeg或源编码无对应编码器时: 用OpenCV定位到片段起点，只解码片段内的帧并重新编码
+多个事件并行导出，耗时和输出大小只与事件总时长有关，与视频长度无关（片段不含音频）
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from ca_gpu import draw_annotations, open_video_writer
+from event_index import reason_category
+from ffmpeg_utils import ENCODERS, find_ffmpeg, keyframe_times, probe_video, run_ffmpeg
+
+
+# ==================== 片段规划 ====================
+def plan_clips(summary, padding=2.0, duration=0.0):
+    """每个不专注时间段 -> 一个片段 {'student_id', 'start_sec', 'end_sec', 'event'}"""
+    clips = []
+    for student_id in sorted(summary):
+        for event in summary[student_id]['time_ranges']:
+            end = event['end_sec'] + padding
+            clips.append({
+                'student_id': int(student_id),
+                'start_sec': max(0.0, event['start_sec'] - padding),
+                'end_sec': min(end, duration) if duration > 0 else end,
+                'event': event,
+            })
+    return clips
+
+
+def clip_filename(clip):
+    event = clip['event']
+    name = (f"student{clip['student_id']:02d}_{event['start'].replace(':', '-')}_"
+            f"{reason_category(event['reason'])}.mp4")
+    return re.sub(r'[\\/*?"<>|]', '_', name)
+
+
+def split_at_keyframes(start, end, keyframes):
+    """把 [start, end] 分成 (头部, 中间完整GOP, 尾部)
+
+    中间部分从第一个 >= start 的关键帧到最后一个 <= end 的关键帧，可直接流复制；
+    没有完整GOP时返回 (None, None, None)
+    """
+    i = bisect_left(keyframes, start)
+    j = bisect_right(keyframes, end) - 1
+    if i >= len(keyframes) or j < 0 or keyframes[i] >= keyframes[j]:
+        return None, None, None
+    return (start, keyframes[i]), (keyframes[i], keyframes[j]), (keyframes[j], end)
+
+
+# ==================== 标注 ====================
+class ClipAnnotator:
+    """按逐帧检测结果为片段帧绘制标注（跳帧时沿用最近的处理帧），并标出事件信息"""
+
+    def __init__(self, frame_detections, config):
+        self.frame_detections = frame_detections or {}
+        self.frames = sorted(self.frame_detections)
+        self.config = config
+
+    def __call__(self, frame, frame_idx, clip):
+        i = bisect_right(self.frames, frame_idx) - 1
+        if i >= 0 and frame_idx - self.frames[i] <= self.config.SKIP_FRAMES:
+            draw_annotations(frame, self.frame_detections[self.frames[i]], self.config)
+        event = clip['event']
+        label = f"ID:{clip['student_id']}  {event['start']} - {event['end']}"
+        cv2.rectangle(frame, (0, 0), (16 + 13 * len(label), 34), (0, 0, 0), -1)
+        cv2.putText(frame, label, (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        return frame
+
+
+def read_frames(cap, first, last):
+    """按帧号定位后读取 [first, last) 帧"""
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    for frame_idx in range(first, last):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame_idx, frame
+
+
+# ==================== 导出 ====================
+class ClipExporter:
+    """把事件片段并行导出到 output_dir"""
+
+    def __init__(self, video_path, output_dir, config, frame_detections=None):
+        self.video_path = video_path
+        self.output_dir = output_dir
+        self.config = config
+        self.annotate = ClipAnnotator(frame_detections, config)
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise FileNotFoundError(f"无法打开视频: {video_path}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.fps if self.fps else 0.0
+        cap.release()
+
+        # 流复制需要ffmpeg、关键帧信息和与源编码一致的编码器
+        self.ffmpeg = find_ffmpeg()
+        self.info = probe_video(video_path) if self.ffmpeg else None
+        self.encoder = ENCODERS.get(self.info['codec']) if self.info else None
+        self.keyframes = (keyframe_times(video_path, self.info['start_time'])
+                          if self.encoder else [])
+
+    @property
+    def stream_copy(self):
+        return bool(self.keyframes)
+
+    def export(self, summary, padding=2.0, workers=0):
+        """导出全部事件片段，返回 [{'student_id', 'path', 'start_sec', 'end_sec', 'copied_sec'}]"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        clips = plan_clips(summary, padding, self.duration)
+        workers = workers or min(4, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.export_clip, clips))
+
+    def export_clip(self, clip):
+        path = os.path.join(self.output_dir, clip_filename(clip))
+        head, middle, tail = (split_at_keyframes(clip['start_sec'], clip['end_sec'], self.keyframes)
+                              if self.stream_copy else (None, None, None))
+
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if middle is None:
+                copied = 0.0
+                if self.encoder:
+                    self._encode(cap, clip, clip['start_sec'], clip['end_sec'], path)
+                else:
+                    path = self._encode_opencv(cap, clip, path)
+            else:
+                copied = middle[1] - middle[0]
+                self._smart_cut(cap, clip, head, middle, tail, path)
+        finally:
+            cap.release()
+
+        return {'student_id': clip['student_id'], 'path': path,
+                'start_sec': clip['start_sec'], 'end_sec': clip['end_sec'],
+                'copied_sec': round(copied, 2)}
+
+    def _frame_range(self, start, end):
+        return int(round(start * self.fps)), int(round(end * self.fps))
+
+    def _smart_cut(self, cap, clip, head, middle, tail, path):
+        """头尾重新编码 + 中间流复制，再用concat无损拼接"""
+        workdir = tempfile.mkdtemp(prefix='clip_', dir=self.output_dir)
+        try:
+            parts = []
+            for name, segment in (('head', head), ('tail', tail)):
+                first, last = self._frame_range(*segment)
+                if last > first:
+                    part = os.path.join(workdir, f'{name}.mp4')
+                    self._encode(cap, clip, *segment, part)
+                    parts.append((name, part))
+
+            # 按帧数截取（-t 会因B帧重排多带出边界处的包）；中间段止于关键帧之前，包数即帧数
+            first, last = self._frame_range(*middle)
+            middle_path = os.path.join(workdir, 'middle.mp4')
+            run_ffmpeg(['-ss', f'{middle[0]:.6f}', '-i', self.video_path,
+                        '-frames:v', str(last - first), '-map', '0:v:0', '-c', 'copy',
+                        '-avoid_negative_ts', 'make_zero', middle_path], self.ffmpeg)
+
+            order = {'head': 0, 'middle': 1, 'tail': 2}
+            parts.append(('middle', middle_path))
+            parts.sort(key=lambda item: order[item[0]])
+
+            list_path = os.path.join(workdir, 'parts.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for _, part in parts:
+                    f.write(f"file '{os.path.abspath(part)}'\n")
+            run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', path],
+                       self.ffmpeg)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _encode(self, cap, clip, start, end, path):
+        """解码 [start, end) 并叠加标注，通过管道交给ffmpeg按源编码重新编码"""
+        width, height = self.size
+        args = [self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+                '-r', f'{self.fps:.6f}', '-i', '-', '-an', '-c:v', self.encoder,
+                '-pix_fmt', self.info.get('pix_fmt') or 'yuv420p']
+        if self.encoder in ('libx264', 'libx265'):
+            args += ['-preset', 'veryfast']
+        proc = subprocess.Popen(args + [path], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for frame_idx, frame in read_frames(cap, *self._frame_range(start, end)):
+                proc.stdin.write(self.annotate(frame, frame_idx, clip).tobytes())
+        except BrokenPipeError:
+            pass  # ffmpeg已退出，错误信息见下方
+        finally:
+            proc.stdin.close()
+            error = proc.stderr.read()
+            proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"片段编码失败: {error.decode(errors='ignore')[-500:]}")
+
+    def _encode_opencv(self, cap, clip, path):
+        """无ffmpeg时: 只解码片段内的帧，用OpenCV重新编码"""
+        writer, path = open_video_writer(path, self.fps, self.size, quiet=True)
+        try:
+            for frame_idx, frame in read_frames(cap, *self._frame_range(clip['start_sec'],
+                                                                       clip['end_sec'])):
+                writer.write(self.annotate(frame, frame_idx, clip))
+        finally:
+            writer.release()
+        return path
+
+
+def export_event_clips(video_path, summary, output_dir, config, frame_detections=None,
+                       padding=None, workers=None):
+    """导出每个不专注事件的片段（带标注），返回片段信息列表"""
+    padding = config.CLIP_PADDING if padding is None else padding
+    workers = config.CLIP_WORKERS if workers is None else workers
+
+    exporter = ClipExporter(video_path, output_dir, config, frame_detections)
+    mode = "关键帧流复制 + 首尾重新编码" if exporter.stream_copy else "OpenCV定位解码"
+    print(f"\n导出事件片段: {sum(len(d['time_ranges']) for d in summary.values())}个 "
+          f"(前后各{padding}秒, {mode})")
+
+    clips = exporter.export(summary, padding, workers)
+    copied = sum(c['copied_sec'] for c in clips)
+    total = sum(c['end_sec'] - c['start_sec'] for c in clips)
+    print(f"✓ 事件片段已保存: {os.path.abspath(output_dir)} ({len(clips)}个, "
+          f"共{total:.1f}秒, 其中流复制{copied:.1f}秒)")
+    return clips
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+CPU吞吐量模式
+启动K个独立进程的模型副本，每个副本绑定各自的CPU核心并限制算子内线程数，
+主进程按轮询方式分发采样帧，并按帧序重排结果后再进行跟踪
+"""
+
+import os
+import queue
+import traceback
+import multiprocessing as mp
+
+from pose_backend import IouTracker
+
+
+POLL_INTERVAL = 1.0         # 等待副本结果时检查副本进程存活的间隔(秒)
+
+
+# ==================== 副本规划 ====================
+def available_cores():
+    """当前进程可用的CPU核心列表"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cpu_replicas(cores=None, num_replicas=0, threads_per_replica=0):
+    """为当前主机选择副本数K和每个副本的线程数
+
+    单个模型在8核以内扩展良好，超过后收益递减，因此默认:
+      - 8核及以下: 1个副本，使用全部核心
+      - 更多核心: 每副本4线程(16核以上)或2线程，副本数 = 核心数 // 线程数
+    返回: (K, 每副本线程数, 每个副本的核心列表)
+    """
+    cores = list(cores) if cores is not None else available_cores()
+    n = len(cores)
+
+    if threads_per_replica <= 0:
+        if num_replicas > 0:
+            threads_per_replica = n // num_replicas
+        elif n <= 8:
+            threads_per_replica = n
+        elif n >= 16:
+            threads_per_replica = 4
+        else:
+            threads_per_replica = 2
+    threads_per_replica = max(1, min(threads_per_replica, n))
+
+    k = num_replicas if num_replicas > 0 else max(1, n // threads_per_replica)
+    core_sets = [[cores[(i * threads_per_replica + j) % n] for j in range(threads_per_replica)]
+                 for i in range(k)]
+    return k, threads_per_replica, core_sets
+
+
+# ==================== 副本进程 ====================
+def _replica_worker(config, cores, threads, task_queue, result_queue):
+    """副本进程: 绑定核心 -> 加载模型 -> 循环推理
+
+    出错时（模型加载失败、推理异常）把 ('error', 异常堆栈) 放入结果队列后退出
+    """
+    try:
+        _replica_loop(config, cores, threads, task_queue, result_queue)
+    except BaseException:
+        result_queue.put(('error', traceback.format_exc()))
+
+
+def _replica_loop(config, cores, threads, task_queue, result_queue):
+    # 在导入推理库之前限制线程数
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    import cv2
+    cv2.setNumThreads(1)
+
+    from ca_gpu import build_pose_backend
+    from pose_backend import is_onnx_backend
+    config.DEVICE = 'cpu'
+    if is_onnx_backend(config):
+        config.ONNX_THREADS = threads
+    else:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+
+    backend = build_pose_backend(config)
+    result_queue.put(('ready', None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        seq, frame = task
+        result = backend.predict([frame])[0]
+        result.orig_img = None  # 不回传原图
+        result_queue.put((seq, result))
+
+
+class ReplicaPool:
+    """多副本推理池（轮询分发 + 按序重排）"""
+
+    def __init__(self, config, num_replicas=0, threads_per_replica=0):
+        k, threads, core_sets = plan_cpu_replicas(
+            num_replicas=num_replicas, threads_per_replica=threads_per_replica)
+
+        self.num_replicas = k
+        self.threads = threads
+        self.max_in_flight = 2 * k
+
+        ctx = mp.get_context('spawn')
+        self.result_queue = ctx.Queue()
+        self.task_queues = [ctx.Queue() for _ in range(k)]
+        self.workers = [
+            ctx.Process(target=_replica_worker,
+                        args=(config, core_sets[i], threads, self.task_queues[i],
+                              self.result_queue),
+                        daemon=True)
+            for i in range(k)
+        ]
+        for w in self.workers:
+            w.start()
+
+        # 等待全部副本加载完模型
+        for _ in range(k):
+            self._receive()
+
+        self.tracker = IouTracker()
+        self._next_replica = 0
+        self.in_flight = 0      # 已提交、尚未输出的帧数
+
+    def submit(self, seq, frame):
+        self.task_queues[self._next_replica].put((seq, frame))
+        self._next_replica = (self._next_replica + 1) % self.num_replicas
+
+    def track_stream(self, frames):
+        """流水线推理: 输入 (frame_idx, frame)，按原顺序输出 (frame_idx, frame, result)"""
+        pending = {}    # seq -> (frame_idx, frame)
+        finished = {}   # seq -> result
+        submitted = next_out = 0
+        frames = iter(frames)
+        exhausted = False
+
+        while not exhausted or next_out < submitted:
+            # 填满在途队列
+            while not exhausted and submitted - next_out < self.max_in_flight:
+                item = next(frames, None)
+                if item is None:
+                    exhausted = True
+                    break
+                pending[submitted] = item
+                self.submit(submitted, item[1])
+                submitted += 1
+
+            if next_out >= submitted:
+                continue
+
+            # 等待下一个按序结果
+            while next_out not in finished:
+                seq, result = self._receive()
+                finished[seq] = result
+
+            frame_idx, frame = pending.pop(next_out)
+            result = finished.pop(next_out)
+            result.orig_img = frame
+            self.in_flight = submitted - next_out - 1
+            yield frame_idx, frame, self.tracker.update(result)
+            next_out += 1
+
+    def _receive(self):
+        """从结果队列取一项；副本报错或进程退出时关闭副本池并抛出 RuntimeError"""
+        while True:
+            try:
+                item = self.result_queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                dead = [(i, w.exitcode) for i, w in enumerate(self.workers) if not w.is_alive()]
+                if dead:
+                    self.close()
+                    raise RuntimeError("CPU副本进程已退出: " + ", ".join(
+                        f"副本{i} (退出码 {code})" for i, code in dead))
+                continue
+            if item[0] == 'error':
+                self.close()
+                raise RuntimeError(f"CPU副本出错:\n{item[1]}")
+            return item
+
+    @property
+    def tracking_time(self):
+        return self.tracker.elapsed
+
+    @property
+    def active_tracks(self):
+        return len(self.tracker.tracks)
+
+    def close(self):
+        for q in self.task_queues:
+            q.put(None)
+        for w in self.workers:
+            w.join(timeout=5)
+            if w.is_alive():
+                w.terminate()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+逐帧检测结果的紧凑存储
+全部检测按列保存为定长数组（不再为每个检测保存一个字典和一个单独的关键点数组），每个检测约占 120 字节:
+  frame (N,) int32 / ids (N,) int32 / boxes (N, 4) int16 / scores (N,) int16 / reasons (N,) int32 /
+  keypoints (N, 17, 3) float16
+关键点的 x, y 保存为相对检测框左上角的偏移（框内坐标较小，float16 的精度约 0.1~0.25 像素），
+原因列表按内容去重后保存一次，检测中只记录编号。
+按帧号取值时还原为 [{'student_id', 'bbox', 'score', 'reasons', 'keypoints'}, ...]，
+叠加标注、导出视频和片段等按帧读取的代码无需修改；重新评分 / 报告 / 时间轴用 columns() 整列读取
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+
+NUM_KEYPOINTS = 17
+CHUNK_FRAMES = 1024         # 逐帧写入时每累积这么多帧合并为一块
+
+# 列名 -> (类型, 每行形状)
+COLUMNS = {
+    'frame': (np.int32, ()),
+    'ids': (np.int32, ()),
+    'boxes': (np.int16, (4,)),
+    'scores': (np.int16, ()),
+    'reasons': (np.int32, ()),
+    'keypoints': (np.float16, (NUM_KEYPOINTS, 3)),
+}
+
+
+def empty_columns():
+    return {name: np.zeros((0,) + shape, dtype) for name, (dtype, shape) in COLUMNS.items()}
+
+
+def absolute_keypoints(keypoints, boxes):
+    """打包的关键点 (float16, 相对检测框) -> 原图像素坐标 (float32)"""
+    keypoints = keypoints.astype(np.float32)
+    keypoints[..., :2] += boxes[:, None, :2]
+    return keypoints
+
+
+class DetectionStore(Mapping):
+    """帧号 -> 该帧检测结果列表（只读映射，用 add() 按帧追加）"""
+
+    def __init__(self, reason_table=None):
+        self.index = {}             # 帧号 -> (起始行, 检测数)
+        self.reason_table = list(reason_table or [])        # 原因编号 -> 原因元组
+        self.reason_codes = {reasons: code for code, reasons in enumerate(self.reason_table)}
+        self.num_detections = 0
+        self._chunks = []           # 已合并的列块，columns() 时再合并为一块
+        self._pending = []          # 尚未合并的各帧列
+
+    # ---------- 写入 ----------
+    def reason_code(self, reasons):
+        key = tuple(reasons)
+        code = self.reason_codes.get(key)
+        if code is None:
+            code = self.reason_codes[key] = len(self.reason_table)
+            self.reason_table.append(key)
+        return code
+
+    def add(self, frame_idx, detections):
+        """保存一帧的检测结果（_process_detections 返回的字典列表）"""
+        n = len(detections)
+        boxes = np.array([det['bbox'] for det in detections], np.int16).reshape(n, 4)
+        keypoints = np.zeros((n, NUM_KEYPOINTS, 3), np.float32)
+        for i, det in enumerate(detections):
+            if det.get('keypoints') is not None:
+                keypoints[i] = det['keypoints']
+        keypoints[..., :2] -= boxes[:, None, :2]
+        self._pending.append({
+            'frame': np.full(n, frame_idx, np.int32),
+            'ids': np.array([det['student_id'] for det in detections], np.int32),
+            'boxes': boxes,
+            'scores': np.array([det['score'] for det in detections], np.int16),
+            'reasons': np.array([self.reason_code(det['reasons']) for det in detections], np.int32),
+            'keypoints': keypoints.astype(np.float16),
+        })
+        self.index[frame_idx] = (self.num_detections, n)
+        self.num_detections += n
+        if len(self._pending) >= CHUNK_FRAMES:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if self._pending:
+            self._chunks.append({name: np.concatenate([frame[name] for frame in self._pending])
+                                 for name in COLUMNS})
+            self._pending = []
+
+    def clear(self):
+        self.index.clear()
+        self.num_detections = 0
+        self._chunks = []
+        self._pending = []
+
+    @classmethod
+    def from_detections(cls, frame_detections):
+        """由 {帧号: [检测字典, ...]} 构建；已经是 DetectionStore 时原样返回"""
+        if isinstance(frame_detections, cls):
+            return frame_detections
+        store = cls()
+        for frame_idx in sorted(frame_detections or {}):
+            store.add(frame_idx, frame_detections[frame_idx])
+        return store
+
+    @classmethod
+    def from_columns(cls, columns, reason_table):
+        """由整列数据构建（同一帧的检测需相邻），各列直接引用不复制"""
+        store = cls(reason_table)
+        store._chunks = [columns]
+        frames, starts, counts = np.unique(columns['frame'], return_index=True, return_counts=True)
+        store.index = dict(zip(frames.tolist(), zip(starts.tolist(), counts.tolist())))
+        store.num_detections = len(columns['frame'])
+        return store
+
+    # ---------- 按帧读取 ----------
+    def __getitem__(self, frame_idx):
+        start, n = self.index[frame_idx]
+        columns = self.columns()
+        rows = slice(start, start + n)
+        boxes = columns['boxes'][rows]
+        keypoints = absolute_keypoints(columns['keypoints'][rows], boxes)
+        return [{
+            'student_id': student_id,
+            'bbox': bbox,
+            'score': score,
+            'reasons': list(self.reason_table[code]),
+            'keypoints': keypoints[i]
+        } for i, (student_id, bbox, score, code) in enumerate(zip(
+            columns['ids'][rows].tolist(), boxes.tolist(), columns['scores'][rows].tolist(),
+            columns['reasons'][rows].tolist()))]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, frame_idx):
+        return frame_idx in self.index
+
+    # ---------- 整列读取 ----------
+    def columns(self):
+        """全部检测的各列 {'frame', 'ids', 'boxes', 'scores', 'reasons', 'keypoints'}，按写入顺序"""
+        self._flush_pending()
+        if len(self._chunks) != 1:
+            chunks = [empty_columns()] + self._chunks
+            self._chunks = [{name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS}]
+        return self._chunks[0]
+
+    @property
+    def nbytes(self):
+        """各列占用的字节数（不含原因表和帧索引）"""
+        return sum(column.nbytes for column in self.columns().values())
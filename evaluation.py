@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+检测结果对比评估
+用于量化、参数扫描等场景下，将一次运行结果与基准运行结果进行比较
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+from pose_backend import box_iou
+
+
+# ==================== 检测级对比 ====================
+def match_detections(ref_boxes, test_boxes, iou_threshold=0.5):
+    """按IoU贪心匹配两组检测框，返回 [(ref_idx, test_idx), ...]"""
+    if len(ref_boxes) == 0 or len(test_boxes) == 0:
+        return []
+
+    ious = box_iou(ref_boxes, test_boxes)
+    pairs = []
+    used_ref, used_test = set(), set()
+    for flat in np.argsort(ious, axis=None)[::-1]:
+        r, t = divmod(int(flat), ious.shape[1])
+        if ious[r, t] < iou_threshold:
+            break
+        if r in used_ref or t in used_test:
+            continue
+        pairs.append((r, t))
+        used_ref.add(r)
+        used_test.add(t)
+    return pairs
+
+
+def compare_keypoints(ref_results, test_results, conf_threshold=0.5):
+    """逐帧比较两组PoseResult的检测与关键点
+
+    关键点误差按检测框高度归一化，只统计基准结果中可见的关键点
+    """
+    matched = ref_total = test_total = 0
+    pixel_errors, norm_errors, conf_errors = [], [], []
+
+    for ref, test in zip(ref_results, test_results):
+        ref_total += len(ref)
+        test_total += len(test)
+        for r, t in match_detections(ref.boxes, test.boxes):
+            matched += 1
+            ref_kpts, test_kpts = ref.keypoints[r], test.keypoints[t]
+            visible = ref_kpts[:, 2] > conf_threshold
+            conf_errors.extend(np.abs(ref_kpts[:, 2] - test_kpts[:, 2]).tolist())
+            if not visible.any():
+                continue
+            dist = np.linalg.norm(ref_kpts[visible, :2] - test_kpts[visible, :2], axis=1)
+            box_h = max(ref.boxes[r, 3] - ref.boxes[r, 1], 1.0)
+            pixel_errors.extend(dist.tolist())
+            norm_errors.extend((dist / box_h).tolist())
+
+    return {
+        'ref_detections': ref_total,
+        'test_detections': test_total,
+        'matched_detections': matched,
+        'detection_recall': round(matched / ref_total, 4) if ref_total else 1.0,
+        'detection_precision': round(matched / test_total, 4) if test_total else 1.0,
+        'keypoint_error_px_mean': round(float(np.mean(pixel_errors)), 3) if pixel_errors else 0.0,
+        'keypoint_error_px_p95': round(float(np.percentile(pixel_errors, 95)), 3) if pixel_errors else 0.0,
+        'keypoint_error_norm_mean': round(float(np.mean(norm_errors)), 5) if norm_errors else 0.0,
+        'keypoint_conf_mae': round(float(np.mean(conf_errors)), 5) if conf_errors else 0.0,
+    }
+
+
+# ==================== 报告级对比 ====================
+def _mean_boxes(records):
+    boxes = defaultdict(list)
+    for r in records:
+        boxes[r['student_id']].append(r['bbox'])
+    return {sid: np.mean(b, axis=0) for sid, b in boxes.items()}
+
+
+def match_students(ref_records, test_records, iou_threshold=0.3):
+    """按学生平均位置匹配两次运行的跟踪ID（学生基本坐在固定位置）
+
+    返回: {test_id: ref_id}
+    """
+    ref_boxes = _mean_boxes(ref_records)
+    test_boxes = _mean_boxes(test_records)
+    if not ref_boxes or not test_boxes:
+        return {}
+
+    ref_ids, test_ids = list(ref_boxes), list(test_boxes)
+    pairs = match_detections(
+        np.array([ref_boxes[i] for i in ref_ids]),
+        np.array([test_boxes[i] for i in test_ids]),
+        iou_threshold
+    )
+    return {test_ids[t]: ref_ids[r] for r, t in pairs}
+
+
+def compare_attention_records(ref_records, test_records):
+    """比较两次运行的不专注记录（attention_records）
+
+    以 (学生, 帧) 为单位统计一致性，测试运行的学生ID先映射到基准运行
+    """
+    id_map = match_students(ref_records, test_records)
+
+    ref_events = {(r['student_id'], r['frame']): r['score'] for r in ref_records}
+    test_events = {}
+    for r in test_records:
+        if r['student_id'] in id_map:
+            test_events[(id_map[r['student_id']], r['frame'])] = r['score']
+        else:
+            test_events[(('unmatched', r['student_id']), r['frame'])] = r['score']
+
+    common = ref_events.keys() & test_events.keys()
+    precision = len(common) / len(test_events) if test_events else 1.0
+    recall = len(common) / len(ref_events) if ref_events else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    score_mae = (np.mean([abs(ref_events[k] - test_events[k]) for k in common])
+                 if common else 0.0)
+
+    return {
+        'ref_records': len(ref_records),
+        'test_records': len(test_records),
+        'matched_students': len(id_map),
+        'ref_students': len({r['student_id'] for r in ref_records}),
+        'test_students': len({r['student_id'] for r in test_records}),
+        'event_precision': round(precision, 4),
+        'event_recall': round(recall, 4),
+        'event_f1': round(f1, 4),
+        'score_mae': round(float(score_mae), 3),
+    }
+
+
+# ==================== 时间段对比 ====================
+def merge_intervals(intervals):
+    """合并重叠的 (start, end) 区间，返回按起点排序的列表"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def overlap_duration(a, b):
+    """两组已合并区间的重叠总时长"""
+    total = 0.0
+    i = j = 0
+    while i < len(a) and j < len(b):
+        total += max(0.0, min(a[i][1], b[j][1]) - max(a[i][0], b[j][0]))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return total
+
+
+def compare_time_ranges(ref_summary, test_summary, id_map):
+    """比较两次运行每个学生的不专注时间段（build_report 返回的 summary）
+
+    id_map: {test_id: ref_id}（match_students 的结果），未匹配的测试学生全部计为误报。
+    interval_iou 为所有学生重叠时长之和 / 并集时长之和；同时返回这两个时长，便于跨视频汇总
+    """
+    def intervals(data):
+        return [(r['start_sec'], r['end_sec']) for r in data['time_ranges']]
+
+    ref = {sid: merge_intervals(intervals(data)) for sid, data in ref_summary.items()}
+    test = defaultdict(list)
+    for sid, data in test_summary.items():
+        test[id_map.get(sid, ('unmatched', sid))].extend(intervals(data))
+    test = {sid: merge_intervals(items) for sid, items in test.items()}
+
+    overlap = union = ref_total = test_total = 0.0
+    student_ious, duration_errors = [], []
+    for sid in ref.keys() | test.keys():
+        a, b = ref.get(sid, []), test.get(sid, [])
+        a_len = sum(end - start for start, end in a)
+        b_len = sum(end - start for start, end in b)
+        common = overlap_duration(a, b)
+        overlap += common
+        union += a_len + b_len - common
+        ref_total += a_len
+        test_total += b_len
+        if a_len + b_len > 0:
+            student_ious.append(common / (a_len + b_len - common))
+        duration_errors.append(abs(a_len - b_len))
+
+    return {
+        'ref_students': len(ref_summary),
+        'test_students': len(test_summary),
+        'overlap_sec': round(overlap, 2),
+        'union_sec': round(union, 2),
+        'interval_iou': round(overlap / union, 4) if union else 1.0,
+        'student_iou_mean': round(float(np.mean(student_ious)), 4) if student_ious else 1.0,
+        'ref_duration_sec': round(ref_total, 2),
+        'test_duration_sec': round(test_total, 2),
+        'duration_mae_sec': round(float(np.mean(duration_errors)), 2) if duration_errors else 0.0,
+    }
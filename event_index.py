@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+不专注事件区间索引
+在 build_report 生成的 summary 上建立按数值起止时间的区间索引（整体 / 按学生 / 按原因），
+用于回答“t时刻谁在不专注”“与[a,b]重叠的事件”“最长的N个事件”等查询，
+避免逐个扫描 summary 中的时间段
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+
+def reason_category(reason):
+    """去掉原因中的数值部分，例如 "闭眼(2.3s)" -> "闭眼"、"侧身(31°)" -> "侧身" """
+    return reason.split('(')[0]
+
+
+# ==================== 区间索引 ====================
+class IntervalIndex:
+    """静态区间索引: 区间按起点排序，再在终点上建立最大值线段树
+
+    stab / overlapping 的复杂度为 O((k+1)·log n)，k为命中的区间数
+    """
+
+    def __init__(self, starts, ends):
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        self.order = np.argsort(starts, kind='stable')
+        self.starts = starts[self.order]
+        n = len(starts)
+
+        self.size = 1
+        while self.size < n:
+            self.size *= 2
+        # tree[i] = 节点i覆盖的区间中最大的终点；叶子从 size 开始
+        self.tree = np.full(2 * self.size, -np.inf)
+        self.tree[self.size:self.size + n] = ends[self.order]
+        level = self.size
+        while level > 1:
+            self.tree[level // 2:level] = np.maximum(self.tree[level:2 * level:2],
+                                                     self.tree[level + 1:2 * level:2])
+            level //= 2
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlapping(self, start, end):
+        """与闭区间 [start, end] 相交的区间，返回构造时的下标（按起点排序）"""
+        limit = int(np.searchsorted(self.starts, end, side='right'))  # 起点 <= end
+        found = []
+        stack = [(1, 0, self.size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or self.tree[node] < start:
+                continue
+            if node >= self.size:
+                found.append(int(self.order[lo]))
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return found
+
+    def stab(self, t):
+        """包含时刻t的区间"""
+        return self.overlapping(t, t)
+
+
+# ==================== 事件索引 ====================
+class EventIndex:
+    """不专注事件索引
+
+    每个事件: {'student_id', 'start', 'end', 'start_sec', 'end_sec', 'duration_sec',
+              'reason', 'category'}
+    查询可按 student_id 和/或 原因类别(category) 过滤
+    """
+
+    def __init__(self, summary):
+        self.events = [
+            {
+                'student_id': int(student_id),
+                'start': r['start'],
+                'end': r['end'],
+                'start_sec': float(r['start_sec']),
+                'end_sec': float(r['end_sec']),
+                'duration_sec': r['duration_sec'],
+                'reason': r['reason'],
+                'category': reason_category(r['reason']),
+            }
+            for student_id in sorted(summary)
+            for r in summary[student_id]['time_ranges']
+        ]
+        self.starts = np.array([e['start_sec'] for e in self.events], dtype=np.float64)
+        self.ends = np.array([e['end_sec'] for e in self.events], dtype=np.float64)
+        durations = self.ends - self.starts
+
+        self.all = self._build(np.arange(len(self.events)), durations)
+        self.by_student = self._group('student_id', durations)
+        self.by_category = self._group('category', durations)
+
+    def _build(self, ids, durations):
+        """(事件下标, 区间索引, 按时长降序的事件下标)"""
+        return (ids, IntervalIndex(self.starts[ids], self.ends[ids]),
+                ids[np.argsort(-durations[ids], kind='stable')])
+
+    def _group(self, key, durations):
+        groups = defaultdict(list)
+        for i, event in enumerate(self.events):
+            groups[event[key]].append(i)
+        return {value: self._build(np.array(ids), durations) for value, ids in groups.items()}
+
+    def _select(self, student_id=None, category=None):
+        """选择查询所用的分组；同时指定两者时按学生分组查询后再按类别过滤"""
+        empty = (np.zeros(0, dtype=np.int64), IntervalIndex([], []), np.zeros(0, dtype=np.int64))
+        if student_id is not None:
+            return self.by_student.get(student_id, empty), category
+        if category is not None:
+            return self.by_category.get(category, empty), None
+        return self.all, None
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def categories(self):
+        return sorted(self.by_category)
+
+    def overlapping(self, start, end, student_id=None, category=None):
+        """与 [start, end] 秒重叠的事件（按开始时间排序）"""
+        (ids, index, _), category = self._select(student_id, category)
+        events = [self.events[ids[i]] for i in index.overlapping(start, end)]
+        if category is not None:
+            events = [e for e in events if e['category'] == category]
+        return events
+
+    def active_at(self, t, student_id=None, category=None):
+        """t秒时正在进行的事件"""
+        return self.overlapping(t, t, student_id, category)
+
+    def students_at(self, t, category=None):
+        """t秒时处于不专注状态的学生ID"""
+        return sorted({e['student_id'] for e in self.active_at(t, category=category)})
+
+    def longest(self, n=10, student_id=None, category=None):
+        """时长最长的n个事件"""
+        (_, _, by_duration), category = self._select(student_id, category)
+        if category is None:
+            return [self.events[i] for i in by_duration[:n]]
+        events = (self.events[i] for i in by_duration)
+        return [e for e in events if e['category'] == category][:n]
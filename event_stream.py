@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+实时事件流（JSON Lines）
+处理过程中事件一发生就输出，仪表盘 / 告警工具可以直接读取，不必等待最后的 attention_report.csv:
+  session_start / session_end    开始 / 结束（结束时附带汇总）
+  track_appeared / track_lost    学生出现 / 离开画面超过 EVENT_LOST_AFTER 秒
+  unfocused_start / unfocused_end
+                                 不专注时间段开始 / 结束（两次不专注相隔超过 MERGE_GAP 秒才拆分，与报告的合并规则一致），
+                                 附带原因、最低分数；时长不足 MIN_DURATION 秒的时间段报告中不计入，
+                                 其 unfocused_end 的 reportable 为 false
+  class_summary                  每 EVENT_AGGREGATE_INTERVAL 秒（视频时间）的全班汇总
+
+输出目标: "-" 标准输出（命令行会把控制台信息改到标准错误）、文件路径（追加）、
+tcp://主机:端口 或 unix:///路径（作为客户端连接）。
+事件先进入缓冲区，由后台线程每 EVENT_FLUSH_INTERVAL 秒写出一次（缓冲区满时立即写出），
+因此事件从发生到写出的延迟不超过该间隔；下游断开时给出提示并停止输出，不影响检测
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+
+MAX_BUFFER = 256            # 缓冲区事件数上限，达到时立即写出
+MERGE_GAP = 3.0             # 不专注时间段内允许的专注间隙(秒)，与 build_report 的合并规则一致
+MIN_DURATION = 1.0          # 计入报告的最短不专注时长(秒)，与 build_report 一致
+
+
+def to_json(value):
+    """numpy 数值 / 数组转为Python类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+# ==================== 输出目标 ====================
+class StreamTarget:
+    """文件 / 标准输出 / socket 的统一写入接口"""
+
+    def __init__(self, target):
+        self.target = target
+        self.file = None
+        self.sock = None
+        if target == '-':
+            self.file = sys.__stdout__
+        elif target.startswith('tcp://'):
+            host, _, port = target[len('tcp://'):].rpartition(':')
+            self.sock = socket.create_connection((host or 'localhost', int(port)), timeout=5)
+        elif target.startswith('unix://'):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(5)
+            self.sock.connect(target[len('unix://'):])
+        else:
+            directory = os.path.dirname(os.path.abspath(target))
+            os.makedirs(directory, exist_ok=True)
+            self.file = open(target, 'a', encoding='utf-8')
+
+    def write(self, text):
+        if self.sock is not None:
+            self.sock.sendall(text.encode('utf-8'))
+        else:
+            self.file.write(text)
+            self.file.flush()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        elif self.target != '-':
+            self.file.close()
+
+
+class EventSink:
+    """带缓冲的事件写出: 后台线程每 flush_interval 秒写出一次，缓冲区满时立即写出（多路共用时线程安全）"""
+
+    def __init__(self, target, flush_interval=0.5, max_buffer=MAX_BUFFER):
+        self.output = StreamTarget(target)
+        self.target = target
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.failed = False
+        self.written = 0
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    def emit(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=to_json) + '\n'
+        with self.lock:
+            self.buffer.append(line)
+            full = len(self.buffer) >= self.max_buffer
+        if full:
+            self.flush()
+
+    def _flush_loop(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                lines, self.buffer = self.buffer, []
+            if not lines or self.failed:
+                return
+            try:
+                self.output.write(''.join(lines))
+                self.written += len(lines)
+            except (OSError, ValueError) as e:
+                # 下游断开（BrokenPipe / 连接重置）时停止输出，检测继续
+                self.failed = True
+                print(f"⚠ 事件流写出失败，已停止输出: {e}", file=sys.stderr)
+
+    def close(self):
+        self.closed.set()
+        self.flusher.join(timeout=2)
+        self.flush()
+        try:
+            self.output.close()
+        except OSError:
+            pass
+
+
+def create_event_sink(config):
+    """EVENT_STREAM 为空时返回None"""
+    if not config.EVENT_STREAM:
+        return None
+    return EventSink(config.EVENT_STREAM, config.EVENT_FLUSH_INTERVAL)
+
+
+# ==================== 事件生成 ====================
+class AttentionEvents:
+    """按逐帧检测结果生成事件（每个视频 / 机位一个实例，可共用一个 EventSink）"""
+
+    def __init__(self, sink, config, fps, source, camera=None):
+        self.sink = sink
+        self.config = config
+        self.fps = fps
+        self.source = str(source)
+        self.camera = camera
+        self.tracks = {}            # student_id -> {'first', 'last'}
+        self.intervals = {}         # student_id -> 进行中的不专注时间段
+        self.video_sec = 0.0
+        self.next_summary = config.EVENT_AGGREGATE_INTERVAL
+        self.current = (0, 0)       # 最近一帧的 (检测人数, 不专注人数)
+        self.window = {'frames': 0, 'detected': 0, 'not_focused': 0, 'score_sum': 0.0, 'scored': 0,
+                       'opened': 0}
+        self.totals = Counter()
+
+    def emit(self, event_type, **fields):
+        event = {'type': event_type, 'time': datetime.now().isoformat(timespec='milliseconds')}
+        if self.camera is not None:
+            event['camera'] = self.camera
+        event.update(fields)
+        self.sink.emit(event)
+        self.totals[event_type] += 1
+
+    def start(self, **info):
+        self.emit('session_start', source=self.source, fps=round(self.fps, 3), **info)
+
+    def frame(self, frame_idx, detections):
+        """每个处理帧调用一次（detections 为 _process_detections 的结果）"""
+        now = self.video_sec = round(frame_idx / self.fps, 2)
+        threshold = self.config.ATTENTION_SCORE_THRESHOLD
+        not_focused = 0
+        for det in detections:
+            student_id = det['student_id']
+            track = self.tracks.get(student_id)
+            if track is None:
+                self.tracks[student_id] = {'first': now, 'last': now}
+                self.emit('track_appeared', video_sec=now, frame=frame_idx,
+                          student_id=student_id, bbox=det['bbox'])
+            else:
+                track['last'] = now
+
+            interval = self.intervals.get(student_id)
+            if det['score'] < threshold:
+                not_focused += 1
+                if interval is not None and now - interval['end'] > MERGE_GAP:
+                    # 间隙内的专注帧都不足以结束时间段（或学生未被检测到），与报告一样在此拆分
+                    self._close_interval(student_id, 'gap')
+                    interval = None
+                if interval is None:
+                    self.intervals[student_id] = {'start': now, 'end': now, 'min_score': det['score'],
+                                                  'reasons': Counter(det['reasons'])}
+                    self.window['opened'] += 1
+                    self.emit('unfocused_start', video_sec=now, frame=frame_idx, student_id=student_id,
+                              score=det['score'], reason=';'.join(det['reasons']), bbox=det['bbox'])
+                else:
+                    interval['end'] = now
+                    interval['min_score'] = min(interval['min_score'], det['score'])
+                    interval['reasons'].update(det['reasons'])
+            elif interval is not None and now - interval['end'] > MERGE_GAP:
+                self._close_interval(student_id, 'focused')
+            self.window['score_sum'] += det['score']
+            self.window['scored'] += 1
+
+        self._expire_tracks(now)
+        self.current = (len(detections), not_focused)
+        self.window['frames'] += 1
+        self.window['detected'] += len(detections)
+        self.window['not_focused'] += not_focused
+        if now >= self.next_summary:
+            self._summary(now)
+
+    def _close_interval(self, student_id, cause):
+        interval = self.intervals.pop(student_id)
+        reason = interval['reasons'].most_common(1)[0][0] if interval['reasons'] else "未知"
+        duration = interval['end'] - interval['start']
+        reportable = duration >= MIN_DURATION
+        if reportable:
+            self.totals['reportable_intervals'] += 1
+        self.emit('unfocused_end', video_sec=self.video_sec, student_id=student_id,
+                  start_sec=interval['start'], end_sec=interval['end'],
+                  duration_sec=round(duration, 2), reportable=reportable,
+                  reason=reason, min_score=interval['min_score'], cause=cause)
+
+    def _expire_tracks(self, now):
+        lost_after = self.config.EVENT_LOST_AFTER
+        for student_id in [sid for sid, track in self.tracks.items() if now - track['last'] > lost_after]:
+            if student_id in self.intervals:
+                self._close_interval(student_id, 'track_lost')
+            track = self.tracks.pop(student_id)
+            self.emit('track_lost', video_sec=now, student_id=student_id, last_seen_sec=track['last'],
+                      tracked_sec=round(track['last'] - track['first'], 2))
+
+    def _summary(self, now):
+        window = self.window
+        detected, not_focused = self.current
+        frames = max(1, window['frames'])
+        self.emit('class_summary', video_sec=now,
+                  students=len(self.tracks), detected=detected, not_focused=not_focused,
+                  open_intervals=len(self.intervals),
+                  avg_detected=round(window['detected'] / frames, 2),
+                  avg_not_focused=round(window['not_focused'] / frames, 2),
+                  focus_rate=round(1 - window['not_focused'] / window['detected'], 4)
+                  if window['detected'] else None,
+                  mean_score=round(window['score_sum'] / window['scored'], 2) if window['scored'] else None,
+                  intervals_opened=window['opened'])
+        self.window = dict.fromkeys(window, 0)
+        interval = self.config.EVENT_AGGREGATE_INTERVAL
+        self.next_summary = (now // interval + 1) * interval
+
+    def finish(self, **info):
+        """处理结束: 关闭进行中的时间段，输出最后一次汇总和 session_end"""
+        for student_id in list(self.intervals):
+            self._close_interval(student_id, 'end')
+        if self.window['frames']:
+            self._summary(self.video_sec)
+        self.emit('session_end', video_sec=self.video_sec, source=self.source,
+                  unfocused_intervals=self.totals['unfocused_start'],
+                  reportable_intervals=self.totals['reportable_intervals'],
+                  students_seen=self.totals['track_appeared'], **info)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+ffmpeg / ffprobe 辅助函数
+优先使用PATH中的ffmpeg，其次使用 imageio-ffmpeg 自带的可执行文件；
+都找不到时返回None，由调用方回退到OpenCV。
+只有ffmpeg没有ffprobe时（例如 imageio-ffmpeg），改为解析 ffmpeg -i 的输出和 framecrc 包信息
+"""
+
+import os
+import re
+import json
+import shutil
+import subprocess
+
+
+# 与源视频编码一致的编码器（拼接时需要与流复制部分保持同一编码）
+ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'mpeg4': 'mpeg4',
+}
+
+
+def find_ffmpeg():
+    """本地ffmpeg可执行文件路径，找不到时返回None"""
+    path = shutil.which('ffmpeg')
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def find_ffprobe():
+    """本地ffprobe可执行文件路径（PATH中或与ffmpeg同目录），找不到时返回None"""
+    path = shutil.which('ffprobe')
+    if path:
+        return path
+    ffmpeg = find_ffmpeg()
+    if ffmpeg:
+        candidate = os.path.join(os.path.dirname(ffmpeg),
+                                 os.path.basename(ffmpeg).replace('ffmpeg', 'ffprobe', 1))
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def run_ffmpeg(args, ffmpeg=None):
+    """静默运行ffmpeg，失败时抛出RuntimeError（附带错误输出）"""
+    cmd = [ffmpeg or find_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-y', *args]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg执行失败: {result.stderr.decode(errors='ignore')[-500:]}")
+
+
+def parse_rate(text):
+    """"30000/1001" -> 29.97"""
+    if not text or text == '0/0':
+        return 0.0
+    num, _, den = text.partition('/')
+    return float(num) / float(den or 1)
+
+
+def probe_video(path):
+    """读取容器、第一个视频流和第一个音频流的信息；读取失败时返回None"""
+    ffprobe = find_ffprobe()
+    if ffprobe is None:
+        return _probe_with_ffmpeg(path)
+
+    result = subprocess.run(
+        [ffprobe, '-v', 'error',
+         '-show_entries',
+         'stream=codec_type,codec_name,profile,pix_fmt,width,height,avg_frame_rate,r_frame_rate'
+         ':format=format_name,duration,start_time',
+         '-of', 'json', path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    data = json.loads(result.stdout or '{}')
+    streams = data.get('streams', [])
+    video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+    if video is None:
+        return None
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), {})
+
+    fmt = data.get('format', {})
+    return {
+        'codec': video.get('codec_name'),
+        'profile': video.get('profile'),
+        'pix_fmt': video.get('pix_fmt'),
+        'width': int(video.get('width', 0)),
+        'height': int(video.get('height', 0)),
+        'fps': parse_rate(video.get('avg_frame_rate')) or parse_rate(video.get('r_frame_rate')),
+        'format': fmt.get('format_name', ''),
+        'duration': float(fmt.get('duration') or 0),
+        'start_time': float(fmt.get('start_time') or 0),
+        'audio_codec': audio.get('codec_name'),
+    }
+
+
+def _probe_with_ffmpeg(path):
+    """没有ffprobe时解析 ffmpeg -i 的输出（只取 probe_video 需要的字段）"""
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        return None
+    result = subprocess.run([ffmpeg, '-hide_banner', '-i', path], capture_output=True, text=True)
+    text = result.stderr
+
+    video = re.search(r'Stream #0:\d+.*?: Video: (\w+)(?: \(([^)]*)\))?.*?, (\w+)(?:\([^)]*\))?, '
+                      r'(\d+)x(\d+)', text)
+    if video is None:
+        return None
+    container = re.search(r'Input #0, ([\w,]+), from', text)
+    duration = re.search(r'Duration: (\d+):(\d+):([\d.]+)', text)
+    start = re.search(r'start: (-?[\d.]+)', text)
+    fps = re.search(r'Stream #0:\d+.*?: Video: .*?([\d.]+) fps', text)
+    audio = re.search(r'Stream #0:\d+.*?: Audio: (\w+)', text)
+
+    profile = video.group(2)
+    return {
+        'codec': video.group(1),
+        'profile': profile if profile and ' / ' not in profile else None,
+        'pix_fmt': video.group(3),
+        'width': int(video.group(4)),
+        'height': int(video.group(5)),
+        'fps': float(fps.group(1)) if fps else 0.0,
+        'format': container.group(1) if container else '',
+        'duration': (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60
+                     + float(duration.group(3))) if duration else 0.0,
+        'start_time': float(start.group(1)) if start else 0.0,
+        'audio_codec': audio.group(1) if audio else None,
+    }
+
+
+def keyframe_times(path, start_time=0.0):
+    """视频流所有关键帧的时间（秒，相对文件起始），只读取包信息，不解码"""
+    ffprobe = find_ffprobe()
+    if ffprobe is None:
+        return _keyframes_with_ffmpeg(path)
+
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path],
+        capture_output=True, text=True
+    )
+    times = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        if 'K' in flags and pts not in ('', 'N/A'):
+            times.append(float(pts) - start_time)
+    return sorted(times)
+
+
+def _keyframes_with_ffmpeg(path):
+    """没有ffprobe时用 framecrc 输出读取包信息（ffmpeg已把时间戳平移到从0开始）
+
+    framecrc 每行: 流序号, dts, pts, 时长, 大小, 校验和[, F=标志]；只有非关键帧才带 F=0x0
+    """
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        return []
+    result = subprocess.run(
+        [ffmpeg, '-hide_banner', '-loglevel', 'error', '-i', path,
+         '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-'],
+        capture_output=True, text=True
+    )
+    time_base = None
+    times = []
+    for line in result.stdout.splitlines():
+        if line.startswith('#tb 0:'):
+            num, _, den = line.split(':', 1)[1].strip().partition('/')
+            time_base = float(num) / float(den)
+            continue
+        if line.startswith('#') or time_base is None:
+            continue
+        fields = [f.strip() for f in line.split(',')]
+        flags = int(fields[6][2:], 16) if len(fields) > 6 and fields[6].startswith('F=') else 1
+        if flags & 1:
+            times.append(int(fields[2]) * time_base)
+    return sorted(times)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+课堂专注度检测系统 - 统计图表（matplotlib）
+导入较慢，由主窗口在首次显示结果时按需加载
+"""
+
+import platform
+
+import matplotlib
+matplotlib.use('QtAgg')
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+# 配置matplotlib中文字体
+if platform.system() == 'Darwin':  # macOS
+    matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'STHeiti', 'SimHei']
+elif platform.system() == 'Windows':
+    matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'KaiTi']
+else:  # Linux
+    matplotlib.rcParams['font.sans-serif'] = ['WenQuanYi Micro Hei', 'Droid Sans Fallback', 'SimHei']
+matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
+
+
+# ==================== 统计图表组件 ====================
+class StatisticsCanvas(FigureCanvas):
+    """统计图表画布"""
+    
+    def __init__(self, parent=None):
+        self.fig = Figure(figsize=(10, 4))
+        super().__init__(self.fig)
+        self.setParent(parent)
+    
+    def plot_statistics(self, summary):
+        """绘制统计图表"""
+        self.fig.clear()
+
+        if not summary:
+            ax = self.fig.add_subplot(111)
+            ax.text(0.5, 0.5, '暂无数据', ha='center', va='center', fontsize=16)
+            ax.axis('off')
+            self.draw()
+            return
+
+        # 创建两个子图
+        ax1 = self.fig.add_subplot(121)
+        ax2 = self.fig.add_subplot(122)
+
+        # 数据准备 - 确保学生ID是整数
+        student_ids = sorted(summary.keys())
+        student_id_labels = [f"学生{int(sid)}" for sid in student_ids]
+        event_counts = [summary[sid]['event_count'] for sid in student_ids]
+        durations = [summary[sid]['total_duration_sec'] for sid in student_ids]
+
+        # X轴位置
+        x_pos = range(len(student_ids))
+
+        # 图1: 不专注事件次数
+        bars1 = ax1.bar(x_pos, event_counts, color='#FF6B6B', alpha=0.7, width=0.6)
+        ax1.set_xlabel('学生ID', fontsize=10)
+        ax1.set_ylabel('不专注事件次数', fontsize=10)
+        ax1.set_title('学生不专注事件统计', fontsize=12, fontweight='bold')
+        ax1.set_xticks(x_pos)
+        ax1.set_xticklabels(student_id_labels, rotation=45, ha='right')
+        ax1.grid(axis='y', alpha=0.3)
+
+        # 在柱子上显示数值
+        for bar in bars1:
+            height = bar.get_height()
+            if height > 0:
+                ax1.text(bar.get_x() + bar.get_width()/2., height,
+                        f'{int(height)}',
+                        ha='center', va='bottom', fontsize=9)
+
+        # 图2: 总不专注时长
+        bars2 = ax2.bar(x_pos, durations, color='#4ECDC4', alpha=0.7, width=0.6)
+        ax2.set_xlabel('学生ID', fontsize=10)
+        ax2.set_ylabel('总不专注时长(秒)', fontsize=10)
+        ax2.set_title('学生不专注时长统计', fontsize=12, fontweight='bold')
+        ax2.set_xticks(x_pos)
+        ax2.set_xticklabels(student_id_labels, rotation=45, ha='right')
+        ax2.grid(axis='y', alpha=0.3)
+
+        # 在柱子上显示数值
+        for bar in bars2:
+            height = bar.get_height()
+            if height > 0:
+                ax2.text(bar.get_x() + bar.get_width()/2., height,
+                        f'{int(height)}秒',
+                        ha='center', va='bottom', fontsize=9)
+
+        self.fig.tight_layout()
+        self.draw()
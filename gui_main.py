@@ -5,62 +5,72 @@
 
 import sys
 import os
+import time
+STARTUP_T0 = time.perf_counter()  # 启动耗时测量起点（--startup-time）
+import json
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLabel, QFileDialog,
                              QProgressBar, QTextEdit, QGroupBox, QSpinBox,
-                             QSlider, QGridLayout, QTabWidget, QMessageBox, QComboBox)
+                             QDoubleSpinBox,
+                             QSlider, QGridLayout, QTabWidget, QMessageBox, QComboBox,
+                             QCheckBox, QSplitter)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt6.QtGui import QFont, QPixmap, QImage
 import cv2
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import matplotlib
-matplotlib.use('QtAgg')
-
-# 配置matplotlib中文字体
-import platform
-if platform.system() == 'Darwin':  # macOS
-    matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'STHeiti', 'SimHei']
-elif platform.system() == 'Windows':
-    matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei', 'KaiTi']
-else:  # Linux
-    matplotlib.rcParams['font.sans-serif'] = ['WenQuanYi Micro Hei', 'Droid Sans Fallback', 'SimHei']
-matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-
-# 导入核心检测模块
-from ca_gpu import ClassroomMonitor, Config
+
+# 导入核心检测模块（torch / pandas / matplotlib 均在首次使用时才导入）
+from gui_timeline import TimelineHeatmap, TimelinePyramid
+from event_index import EventIndex
+from clip_export import export_event_clips
+from ca_gpu import (ClassroomMonitor, Config, draw_annotations, export_annotated_video,
+                    records_from_detections, rescore_detections, summary_from_detections,
+                    select_device, build_pose_backend, pose_backend_key, warm_up_backend)
+
+IMPORT_DONE = time.perf_counter()
 
 
 # ==================== 视频处理线程 ====================
 class VideoProcessThread(QThread):
     """后台视频处理线程"""
     progress_update = pyqtSignal(int, str)  # 进度值, 状态消息
+    partial_results = pyqtSignal(object)    # 处理中的阶段性学生汇总
     finished = pyqtSignal(object, object)   # DataFrame, summary
+    detections_ready = pyqtSignal(object, float)  # 逐帧检测结果 {帧号: [检测, ...]}, 视频帧率
     error = pyqtSignal(str)                 # 错误消息
     
-    def __init__(self, video_path, config, max_frames=0):
+    def __init__(self, video_path, config, max_frames=0, warmup=None):
         super().__init__()
         self.video_path = video_path
         self.config = config
         self.max_frames = max_frames
-        self.is_running = True
+        self.warmup = warmup  # ModelWarmupThread，可复用其中已预热的模型
+        self.cancel_event = threading.Event()
+        self.cancelled = False
     
     def run(self):
         """执行视频处理"""
         try:
-            self.progress_update.emit(10, "正在加载YOLO模型...")
+            self.progress_update.emit(5, "正在加载YOLO模型...")
             
             # 创建监控器
             monitor = ClassroomMonitor(self.video_path, self.config)
+            if self.warmup is not None:
+                if self.warmup.isRunning():
+                    self.progress_update.emit(5, "等待模型预热完成...")
+                    self.warmup.wait()
+                monitor.backend = self.warmup.backend_for(self.config)
             
-            self.progress_update.emit(20, "开始处理视频...")
+            self.progress_update.emit(10, "开始处理视频...")
             
-            # 处理视频
-            df, summary = monitor.process(self.max_frames)
+            # 处理视频（帧级进度回调，可在帧之间取消）
+            df, summary = monitor.process(self.max_frames, self.on_progress, self.cancel_event)
+            self.cancelled = monitor.cancelled
             
-            self.progress_update.emit(100, "处理完成!")
+            self.progress_update.emit(100, "已停止（部分结果）" if self.cancelled else "处理完成!")
+            self.detections_ready.emit(monitor.frame_detections, monitor.fps)
             self.finished.emit(df, summary)
             
         except Exception as e:
@@ -68,19 +78,305 @@ class VideoProcessThread(QThread):
             error_msg = f"处理出错:\n{str(e)}\n\n{traceback.format_exc()}"
             self.error.emit(error_msg)
     
+    def on_progress(self, info):
+        """ClassroomMonitor进度回调（在处理线程中调用，通过信号转发到界面）"""
+        eta = info['eta']
+        eta_text = f"{int(eta // 60)}:{int(eta % 60):02d}" if eta is not None else "--:--"
+        message = (f"处理中 {info['frame']}/{info['total_frames']}帧 | "
+                   f"{info['fps']:.1f} fps ({info['speed']:.2f}x) | 剩余 {eta_text} | "
+                   f"检测到 {info['detected']}人, 不专注 {info['not_focused']}人")
+        self.progress_update.emit(10 + int(info['percent'] * 0.89), message)
+        if 'summary' in info:
+            self.partial_results.emit(info['summary'])
+    
     def stop(self):
-        """停止处理"""
-        self.is_running = False
+        """请求停止处理（当前帧处理完后生效，不阻塞调用方）"""
+        self.cancel_event.set()
+
+
+# ==================== 模型预热线程 ====================
+class ModelWarmupThread(QThread):
+    """窗口显示后在后台加载并预热姿态模型，检测时直接复用"""
+    status = pyqtSignal(str)
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.backend = None
+        self.key = None
+
+    def run(self):
+        start = time.perf_counter()
+        self.status.emit("模型: 正在后台加载...")
+        try:
+            select_device(self.config)
+            backend = build_pose_backend(self.config)
+            warm_up_backend(backend)
+            self.backend, self.key = backend, pose_backend_key(self.config)
+            self.status.emit(f"模型: 已就绪 ({time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            self.status.emit(f"模型: 预热失败，将在检测时加载 ({e})")
+
+    def backend_for(self, config):
+        """配置一致时返回已预热的后端，否则返回None"""
+        if self.backend is not None and self.key == pose_backend_key(config):
+            return self.backend
+        return None
+
+
+# ==================== 标注视频导出线程 ====================
+class ExportVideoThread(QThread):
+    """根据已保存的逐帧检测结果导出标注视频（不重新推理）"""
+    finished = pyqtSignal(str)  # 输出路径
+    error = pyqtSignal(str)
+
+    def __init__(self, video_path, frame_detections, output_path, config):
+        super().__init__()
+        self.video_path = video_path
+        self.frame_detections = frame_detections
+        self.output_path = output_path
+        self.config = config
+
+    def run(self):
+        try:
+            path = export_annotated_video(self.video_path, self.frame_detections,
+                                          self.output_path, self.config)
+            self.finished.emit(path)
+        except Exception as e:
+            self.error.emit(f"导出失败:\n{str(e)}")
+
+
+class ExportClipsThread(QThread):
+    """按不专注时间段并行导出事件片段（关键帧流复制 + 首尾重新编码）"""
+    finished = pyqtSignal(object)  # 片段信息列表
+    error = pyqtSignal(str)
+
+    def __init__(self, video_path, summary, output_dir, config, frame_detections):
+        super().__init__()
+        self.video_path = video_path
+        self.summary = summary
+        self.output_dir = output_dir
+        self.config = config
+        self.frame_detections = frame_detections
+
+    def run(self):
+        try:
+            clips = export_event_clips(self.video_path, self.summary, self.output_dir,
+                                       self.config, self.frame_detections)
+            self.finished.emit(clips)
+        except Exception as e:
+            self.error.emit(f"导出失败:\n{str(e)}")
+
+
+# ==================== 离线重新评分线程 ====================
+class RescoreThread(QThread):
+    """用上次运行保存的关键点在后台重新评分并合并不专注时间段（不重新推理）
+
+    replay=False 时只按新阈值重新筛选（分数不依赖阈值），否则按新规则参数重放状态追踪。
+    参数再次修改时 cancel() 使其尽快结束，结果随后被丢弃
+    """
+    finished = pyqtSignal(int, object, object)  # 序号, 逐帧检测结果, summary（已取消时均为None）
+    error = pyqtSignal(str)
+
+    def __init__(self, generation, frame_detections, config, fps, stride=1, replay=False):
+        super().__init__()
+        self.generation = generation
+        self.frame_detections = frame_detections
+        self.config = config
+        self.fps = fps
+        self.stride = stride
+        self.replay = replay
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            detections = self.frame_detections
+            if self.replay:
+                detections = rescore_detections(detections, self.config, self.fps, self.stride,
+                                                self.cancel_event)
+            if self.cancel_event.is_set():
+                self.finished.emit(self.generation, None, None)
+                return
+            summary = summary_from_detections(detections, self.config, self.fps)
+            self.finished.emit(self.generation, detections, summary)
+        except Exception as e:
+            self.error.emit(f"重新评分失败: {e}")
+
+    def cancel(self):
+        """请求提前结束（不阻塞调用方）"""
+        self.cancel_event.set()
+
+
+# ==================== 时间轴构建线程 ====================
+class TimelineBuildThread(QThread):
+    """在后台由逐帧检测结果构建时间轴热力图的多分辨率金字塔"""
+    finished = pyqtSignal(object)   # TimelinePyramid
+
+    def __init__(self, frame_detections):
+        super().__init__()
+        self.frame_detections = frame_detections
+
+    def run(self):
+        self.finished.emit(TimelinePyramid(self.frame_detections))
+
+
+# ==================== 实时标注叠加 ====================
+class DetectionOverlay:
+    """在原始视频帧上按逐帧检测结果实时绘制标注
+
+    跳帧处理时，未处理的帧沿用之前最近一个处理帧的结果
+    """
+
+    def __init__(self, frame_detections, config):
+        self.frame_detections = frame_detections
+        self.frames = sorted(frame_detections)
+        self.config = config
+        self.hold_frames = config.SKIP_FRAMES
+
+    def __call__(self, frame_number, frame):
+        i = bisect_right(self.frames, frame_number) - 1
+        if i < 0 or frame_number - self.frames[i] > self.hold_frames:
+            return frame
+        return draw_annotations(frame, self.frame_detections[self.frames[i]], self.config)
+
+
+# ==================== 后台解码线程 ====================
+class FrameDecoder(QThread):
+    """后台视频解码线程
+
+    播放时顺序读取并预读，转换缩放后的QImage放入LRU缓存；
+    只有向后跳转或向前跳得较远（拖动进度条）时才seek
+    """
+    frame_ready = pyqtSignal(int)   # 帧号
+
+    def __init__(self, video_path, total_frames, cache_size=120, readahead=24):
+        super().__init__()
+        self.video_path = video_path
+        self.total_frames = total_frames
+        self.cache_size = cache_size
+        self.readahead = readahead
+        self.seek_distance = readahead * 4  # 向前跳超过此帧数时seek，否则顺序grab
+
+        self.cache = OrderedDict()          # 帧号 -> 缩放后的QImage
+        self.cond = threading.Condition()
+        self.playhead = 0
+        self.step = 1
+        self.target_size = None
+        self.overlay = None                 # overlay(帧号, 帧) -> 帧，在缩放前绘制标注
+        self.running = True
+
+    def get(self, frame_number):
+        """读取缓存中的帧（命中时更新LRU顺序）"""
+        with self.cond:
+            image = self.cache.get(frame_number)
+            if image is not None:
+                self.cache.move_to_end(frame_number)
+            return image
+
+    def request(self, frame_number, step=None):
+        """移动播放头，解码线程从这里开始预读"""
+        with self.cond:
+            self.playhead = frame_number
+            if step:
+                self.step = step
+            self.cond.notify()
+
+    def set_target_size(self, width, height):
+        """设置显示尺寸（尺寸变化时清空缓存）"""
+        with self.cond:
+            if (width, height) != self.target_size:
+                self.target_size = (width, height)
+                self.cache.clear()
+                self.cond.notify()
+
+    def set_overlay(self, overlay):
+        """设置标注叠加（清空缓存以重新绘制）"""
+        with self.cond:
+            self.overlay = overlay
+            self.cache.clear()
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.wait()
+
+    def _next_missing(self):
+        """播放头及预读窗口内第一个未缓存的帧"""
+        if self.target_size is None:
+            return None
+        for k in range(self.readahead + 1):
+            frame_number = self.playhead + k * self.step
+            if frame_number >= self.total_frames:
+                break
+            if frame_number not in self.cache:
+                return frame_number
+        return None
+
+    def _to_image(self, frame, size):
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w = frame.shape[:2]
+        scale = min(size[0] / w, size[1] / h)
+        new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+        return QImage(frame.data, new_w, new_h, 3 * new_w, QImage.Format.Format_RGB888).copy()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        position = 0  # 下一次read()返回的帧号
+
+        while True:
+            with self.cond:
+                target = self._next_missing()
+                while self.running and target is None:
+                    self.cond.wait()
+                    target = self._next_missing()
+                if not self.running:
+                    break
+                size = self.target_size
+                overlay = self.overlay
+
+            # 向前的小间隔用grab()跳过（不解码像素），其他情况seek
+            if target < position or target - position > self.seek_distance:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+            while position < target:
+                cap.grab()
+                position += 1
+
+            ret, frame = cap.read()
+            position += 1
+            if not ret:
+                # 实际帧数少于元数据，截断后继续
+                with self.cond:
+                    self.total_frames = min(self.total_frames, target)
+                continue
+
+            if overlay is not None:
+                frame = overlay(target, frame)
+            image = self._to_image(frame, size)
+            with self.cond:
+                if size != self.target_size or overlay is not self.overlay:
+                    continue
+                self.cache[target] = image
+                self.cache.move_to_end(target)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            self.frame_ready.emit(target)
+
+        cap.release()
 
 
 # ==================== 视频播放器组件 ====================
 class VideoPlayerWidget(QWidget):
     """视频播放器组件"""
+    position_changed = pyqtSignal(int)  # 当前帧号
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.video_path = None
-        self.cap = None
+        self.decoder = None
         self.timer = QTimer()
         self.timer.timeout.connect(self.next_frame)
         self.is_playing = False
@@ -88,6 +384,8 @@ class VideoPlayerWidget(QWidget):
         self.total_frames = 0
         self.fps = 30
         self.frame_skip = 1  # 跳帧播放，提高流畅度
+        self.overlay = None
+        self.event_index = None  # EventIndex，播放时显示当前进行中的不专注事件
 
         self.init_ui()
 
@@ -103,6 +401,13 @@ class VideoPlayerWidget(QWidget):
         self.video_label.setText("暂无视频")
         layout.addWidget(self.video_label)
 
+        # 当前进行中的不专注事件
+        self.events_label = QLabel("")
+        self.events_label.setWordWrap(True)
+        self.events_label.setStyleSheet("QLabel { color: #d32f2f; font-weight: bold; }")
+        layout.addWidget(self.events_label)
+        self.position_changed.connect(self.update_active_events)
+
         # 控制面板
         control_layout = QHBoxLayout()
 
@@ -148,6 +453,7 @@ class VideoPlayerWidget(QWidget):
         self.progress_slider = QSlider(Qt.Orientation.Horizontal)
         self.progress_slider.setEnabled(False)
         self.progress_slider.sliderPressed.connect(self.slider_pressed)
+        self.progress_slider.sliderMoved.connect(self.slider_moved)
         self.progress_slider.sliderReleased.connect(self.slider_released)
         progress_layout.addWidget(self.progress_slider)
         layout.addLayout(progress_layout)
@@ -160,20 +466,26 @@ class VideoPlayerWidget(QWidget):
             return
 
         # 释放之前的视频
-        if self.cap:
-            self.cap.release()
-
-        self.video_path = video_path
-        self.cap = cv2.VideoCapture(video_path)
+        self.release_video()
 
-        if not self.cap.isOpened():
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
             QMessageBox.warning(self, "错误", "无法打开视频文件")
             return
 
         # 获取视频信息
-        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.video_path = video_path
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
         self.current_frame = 0
+        cap.release()
+
+        # 启动后台解码线程
+        self.decoder = FrameDecoder(video_path, self.total_frames)
+        self.decoder.frame_ready.connect(self.on_frame_ready)
+        self.decoder.set_overlay(self.overlay)
+        self.update_target_size()
+        self.decoder.start()
 
         # 设置进度条
         self.progress_slider.setMaximum(self.total_frames - 1)
@@ -190,38 +502,72 @@ class VideoPlayerWidget(QWidget):
         self.show_frame(0)
         self.update_time_label()
 
-    def show_frame(self, frame_number):
-        """显示指定帧"""
-        if not self.cap:
+    def set_overlay(self, overlay):
+        """设置实时标注叠加（None表示不叠加）"""
+        self.overlay = overlay
+        if self.decoder:
+            self.decoder.set_overlay(overlay)
+            self.show_frame(self.current_frame)
+
+    def set_event_index(self, event_index):
+        """设置不专注事件索引（None表示不显示）"""
+        self.event_index = event_index
+        self.update_active_events(self.current_frame)
+
+    def update_active_events(self, frame_number):
+        """按区间索引查询当前帧正在进行的不专注事件"""
+        if not self.event_index or not self.fps:
+            self.events_label.setText("")
             return
+        events = self.event_index.active_at(frame_number / self.fps)
+        self.events_label.setText(
+            "⚠️ 不专注中: " + "  |  ".join(f"学生{e['student_id']} {e['category']}" for e in events)
+            if events else ""
+        )
 
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-        ret, frame = self.cap.read()
+    def release_video(self):
+        """停止解码线程并释放视频"""
+        self.pause_video()
+        if self.decoder:
+            self.decoder.stop()
+            self.decoder = None
 
-        if ret:
-            # 转换颜色空间
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def update_target_size(self):
+        """按显示区域大小设置解码缩放尺寸"""
+        if self.decoder:
+            size = self.video_label.size()
+            self.decoder.set_target_size(size.width(), size.height())
 
-            # 调整大小以适应显示区域（使用更快的插值方法）
-            label_size = self.video_label.size()
-            h, w = frame.shape[:2]
+    def display_image(self, image):
+        self.video_label.setPixmap(QPixmap.fromImage(image))
 
-            # 计算缩放比例
-            scale = min(label_size.width() / w, label_size.height() / h)
-            new_w = int(w * scale)
-            new_h = int(h * scale)
+    def show_frame(self, frame_number):
+        """显示指定帧（未缓存时请求解码线程，解码完成后再显示）"""
+        if not self.decoder:
+            return
 
-            # 使用INTER_NEAREST进行快速缩放
-            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_NEAREST)
+        self.current_frame = frame_number
+        self.decoder.request(frame_number, self.frame_skip)
+        image = self.decoder.get(frame_number)
+        if image is not None:
+            self.display_image(image)
+        self.position_changed.emit(frame_number)
 
-            # 转换为QImage
-            h, w, ch = frame.shape
-            bytes_per_line = ch * w
-            q_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
+    def seek(self, frame_number):
+        """跳转到指定帧（例如点击时间轴）"""
+        if not self.decoder:
+            return
+        frame_number = max(0, min(frame_number, self.total_frames - 1))
+        self.show_frame(frame_number)
+        self.progress_slider.setValue(frame_number)
+        self.update_time_label()
 
-            # 显示
-            self.video_label.setPixmap(QPixmap.fromImage(q_image))
-            self.current_frame = frame_number
+    def on_frame_ready(self, frame_number):
+        """解码线程完成一帧"""
+        if frame_number == self.current_frame:
+            image = self.decoder.get(frame_number)
+            if image is not None:
+                self.display_image(image)
 
     def toggle_play(self):
         """切换播放/暂停"""
@@ -232,7 +578,7 @@ class VideoPlayerWidget(QWidget):
 
     def play_video(self):
         """播放视频"""
-        if not self.cap:
+        if not self.decoder:
             return
 
         self.is_playing = True
@@ -262,10 +608,17 @@ class VideoPlayerWidget(QWidget):
         self.update_time_label()
 
     def next_frame(self):
-        """播放下一帧"""
+        """播放下一帧（下一帧尚未解码时本次不前进，避免画面跳跃）"""
         if self.current_frame < self.total_frames - self.frame_skip:
-            self.current_frame += self.frame_skip
-            self.show_frame(self.current_frame)
+            target = self.current_frame + self.frame_skip
+            image = self.decoder.get(target)
+            if image is None:
+                self.decoder.request(target, self.frame_skip)
+                return
+            self.current_frame = target
+            self.decoder.request(target, self.frame_skip)
+            self.display_image(image)
+            self.position_changed.emit(target)
             self.progress_slider.setValue(self.current_frame)
             self.update_time_label()
         else:
@@ -277,6 +630,11 @@ class VideoPlayerWidget(QWidget):
         if self.is_playing:
             self.pause_video()
 
+    def slider_moved(self, frame_number):
+        """拖动进度条（只请求目标帧，解码在后台线程完成）"""
+        self.show_frame(frame_number)
+        self.update_time_label()
+
     def slider_released(self):
         """进度条释放"""
         frame_number = self.progress_slider.value()
@@ -285,7 +643,7 @@ class VideoPlayerWidget(QWidget):
 
     def update_time_label(self):
         """更新时间显示"""
-        if not self.cap:
+        if not self.decoder:
             return
 
         current_sec = int(self.current_frame / self.fps)
@@ -328,87 +686,30 @@ class VideoPlayerWidget(QWidget):
             interval = int(1000 / (self.fps * speed) * self.frame_skip)
             self.timer.start(interval)
 
+    def resizeEvent(self, event):
+        """窗口尺寸变化时按新尺寸重新缩放"""
+        super().resizeEvent(event)
+        self.update_target_size()
+        if self.decoder:
+            self.show_frame(self.current_frame)
+
     def closeEvent(self, event):
         """关闭事件"""
-        if self.cap:
-            self.cap.release()
+        self.release_video()
         event.accept()
 
 
-# ==================== 统计图表组件 ====================
-class StatisticsCanvas(FigureCanvas):
-    """统计图表画布"""
-    
-    def __init__(self, parent=None):
-        self.fig = Figure(figsize=(10, 4))
-        super().__init__(self.fig)
-        self.setParent(parent)
-    
-    def plot_statistics(self, summary):
-        """绘制统计图表"""
-        self.fig.clear()
-
-        if not summary:
-            ax = self.fig.add_subplot(111)
-            ax.text(0.5, 0.5, '暂无数据', ha='center', va='center', fontsize=16)
-            ax.axis('off')
-            self.draw()
-            return
-
-        # 创建两个子图
-        ax1 = self.fig.add_subplot(121)
-        ax2 = self.fig.add_subplot(122)
-
-        # 数据准备 - 确保学生ID是整数
-        student_ids = sorted(summary.keys())
-        student_id_labels = [f"学生{int(sid)}" for sid in student_ids]
-        event_counts = [summary[sid]['event_count'] for sid in student_ids]
-        durations = [summary[sid]['total_duration_sec'] for sid in student_ids]
-
-        # X轴位置
-        x_pos = range(len(student_ids))
-
-        # 图1: 不专注事件次数
-        bars1 = ax1.bar(x_pos, event_counts, color='#FF6B6B', alpha=0.7, width=0.6)
-        ax1.set_xlabel('学生ID', fontsize=10)
-        ax1.set_ylabel('不专注事件次数', fontsize=10)
-        ax1.set_title('学生不专注事件统计', fontsize=12, fontweight='bold')
-        ax1.set_xticks(x_pos)
-        ax1.set_xticklabels(student_id_labels, rotation=45, ha='right')
-        ax1.grid(axis='y', alpha=0.3)
-
-        # 在柱子上显示数值
-        for bar in bars1:
-            height = bar.get_height()
-            if height > 0:
-                ax1.text(bar.get_x() + bar.get_width()/2., height,
-                        f'{int(height)}',
-                        ha='center', va='bottom', fontsize=9)
-
-        # 图2: 总不专注时长
-        bars2 = ax2.bar(x_pos, durations, color='#4ECDC4', alpha=0.7, width=0.6)
-        ax2.set_xlabel('学生ID', fontsize=10)
-        ax2.set_ylabel('总不专注时长(秒)', fontsize=10)
-        ax2.set_title('学生不专注时长统计', fontsize=12, fontweight='bold')
-        ax2.set_xticks(x_pos)
-        ax2.set_xticklabels(student_id_labels, rotation=45, ha='right')
-        ax2.grid(axis='y', alpha=0.3)
-
-        # 在柱子上显示数值
-        for bar in bars2:
-            height = bar.get_height()
-            if height > 0:
-                ax2.text(bar.get_x() + bar.get_width()/2., height,
-                        f'{int(height)}秒',
-                        ha='center', va='bottom', fontsize=9)
-
-        self.fig.tight_layout()
-        self.draw()
-
-
 # ==================== 主窗口 ====================
 class MainWindow(QMainWindow):
     """主窗口类"""
+
+    # 可在界面上调整的规则参数: (配置项, 显示名, 最小值, 最大值, 步长)
+    RULE_PARAMS = [
+        ('HEAD_DOWN_DURATION', '长时间低头(秒):', 0.5, 30.0, 0.5),
+        ('EYE_CLOSED_DURATION', '闭眼(秒):', 0.5, 30.0, 0.5),
+        ('STILLNESS_DURATION', '发呆(秒):', 0.5, 60.0, 0.5),
+        ('SHOULDER_TILT_THRESHOLD', '侧身角度(°):', 5.0, 90.0, 1.0),
+    ]
     
     def __init__(self):
         super().__init__()
@@ -416,9 +717,34 @@ class MainWindow(QMainWindow):
         self.output_video_path = None
         self.df = None
         self.summary = None
+        self.event_index = None
+        self.frame_detections = None    # 当前参数下的逐帧结果
+        self.base_detections = None     # 检测运行得到的原始逐帧结果
+        self.fps = 0
+        self.run_config = None          # 检测运行时的配置
+        self.view_config = None         # 当前结果对应的配置
         self.process_thread = None
+        self.export_thread = None
+        self.warmup_thread = None
+        self.chart_canvas = None        # 统计图表，首次显示结果时创建
+        self.timeline_thread = None
+        self.timeline_source = None     # 当前时间轴金字塔对应的逐帧结果
+        self.timeline_pending = False
+
+        # 参数变化后延迟重新评分（合并连续的调整）
+        self.rescore_thread = None
+        self.rescore_generation = 0
+        self.rescore_pending = False
+        self.scored_key = None
+        self.rescore_timer = QTimer()
+        self.rescore_timer.setSingleShot(True)
+        self.rescore_timer.setInterval(300)
+        self.rescore_timer.timeout.connect(self.start_rescore)
         
         self.init_ui()
+
+        # 窗口显示后再在后台加载模型
+        QTimer.singleShot(0, self.start_warmup)
     
     def init_ui(self):
         """初始化UI"""
@@ -487,9 +813,33 @@ class MainWindow(QMainWindow):
         self.max_frames_spin.setSpecialValueText("全部")
         param_layout.addWidget(self.max_frames_spin, 2, 1)
 
+        # 标注视频改为可选导出，默认在原视频上实时叠加标注
+        self.save_video_check = QCheckBox("检测时同时生成标注视频")
+        self.save_video_check.setChecked(False)
+        param_layout.addWidget(self.save_video_check, 3, 0, 1, 2)
+
         param_group.setLayout(param_layout)
         layout.addWidget(param_group)
 
+        # 规则参数（检测完成后修改会在后台直接重新评分）
+        rule_group = QGroupBox("规则参数")
+        rule_layout = QGridLayout()
+        self.rule_spins = {}
+        for row, (name, label, low, high, step) in enumerate(self.RULE_PARAMS):
+            rule_layout.addWidget(QLabel(label), row, 0)
+            spin = QDoubleSpinBox()
+            spin.setRange(low, high)
+            spin.setSingleStep(step)
+            spin.setValue(getattr(Config, name))
+            spin.valueChanged.connect(self.schedule_rescore)
+            rule_layout.addWidget(spin, row, 1)
+            self.rule_spins[name] = spin
+        rule_group.setLayout(rule_layout)
+        layout.addWidget(rule_group)
+
+        self.threshold_spin.valueChanged.connect(self.schedule_rescore)
+        self.skip_frames_spin.valueChanged.connect(self.schedule_rescore)
+
         # 控制按钮
         btn_layout = QVBoxLayout()
 
@@ -519,6 +869,11 @@ class MainWindow(QMainWindow):
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         progress_layout.addWidget(self.status_label)
 
+        self.model_label = QLabel("模型: 未加载")
+        self.model_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.model_label.setWordWrap(True)
+        progress_layout.addWidget(self.model_label)
+
         progress_group.setLayout(progress_layout)
         layout.addWidget(progress_group)
 
@@ -531,6 +886,16 @@ class MainWindow(QMainWindow):
         self.export_csv_btn.clicked.connect(self.export_csv)
         export_layout.addWidget(self.export_csv_btn)
 
+        self.export_video_btn = QPushButton("🎞️ 导出标注视频")
+        self.export_video_btn.setEnabled(False)
+        self.export_video_btn.clicked.connect(self.export_video)
+        export_layout.addWidget(self.export_video_btn)
+
+        self.export_clips_btn = QPushButton("✂️ 导出事件片段")
+        self.export_clips_btn.setEnabled(False)
+        self.export_clips_btn.clicked.connect(self.export_clips)
+        export_layout.addWidget(self.export_clips_btn)
+
         self.open_video_btn = QPushButton("🎬 打开标注视频")
         self.open_video_btn.setEnabled(False)
         self.open_video_btn.clicked.connect(self.open_output_video)
@@ -554,17 +919,28 @@ class MainWindow(QMainWindow):
         # 标签页1: 视频预览
         video_tab = QWidget()
         video_layout = QVBoxLayout()
+        splitter = QSplitter(Qt.Orientation.Vertical)
         self.video_player = VideoPlayerWidget()
-        video_layout.addWidget(self.video_player)
+        splitter.addWidget(self.video_player)
+
+        # 学生专注度时间轴（单击跳转到对应帧）
+        self.timeline = TimelineHeatmap()
+        self.timeline.frame_selected.connect(self.video_player.seek)
+        self.video_player.position_changed.connect(self.timeline.set_playhead)
+        splitter.addWidget(self.timeline)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+        video_layout.addWidget(splitter)
         video_tab.setLayout(video_layout)
         self.tab_widget.addTab(video_tab, "🎬 视频预览")
 
         # 标签页2: 统计图表
         chart_tab = QWidget()
-        chart_layout = QVBoxLayout()
-        self.chart_canvas = StatisticsCanvas()
-        chart_layout.addWidget(self.chart_canvas)
-        chart_tab.setLayout(chart_layout)
+        self.chart_layout = QVBoxLayout()
+        self.chart_placeholder = QLabel("暂无数据")
+        self.chart_placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.chart_layout.addWidget(self.chart_placeholder)
+        chart_tab.setLayout(self.chart_layout)
         self.tab_widget.addTab(chart_tab, "📊 统计图表")
 
         # 标签页3: 详细报告
@@ -581,6 +957,21 @@ class MainWindow(QMainWindow):
         panel.setLayout(layout)
         return panel
 
+    def chart(self):
+        """统计图表（首次使用时才导入matplotlib）"""
+        if self.chart_canvas is None:
+            from gui_charts import StatisticsCanvas
+            self.chart_canvas = StatisticsCanvas()
+            self.chart_layout.replaceWidget(self.chart_placeholder, self.chart_canvas)
+            self.chart_placeholder.deleteLater()
+        return self.chart_canvas
+
+    def start_warmup(self):
+        """在后台加载并预热模型"""
+        self.warmup_thread = ModelWarmupThread(self.build_config())
+        self.warmup_thread.status.connect(self.model_label.setText)
+        self.warmup_thread.start()
+
     def select_video(self):
         """选择视频文件"""
         file_path, _ = QFileDialog.getOpenFileName(
@@ -600,37 +991,144 @@ class MainWindow(QMainWindow):
             return
 
         # 配置参数
-        config = Config()
-        config.ATTENTION_SCORE_THRESHOLD = self.threshold_spin.value()
-        config.SKIP_FRAMES = self.skip_frames_spin.value()
-        config.OUTPUT_VIDEO = True
+        config = self.build_config()
+        config.OUTPUT_VIDEO = self.save_video_check.isChecked()
         config.OUTPUT_VIDEO_PATH = "output_annotated.mp4"
+        config.KEEP_DETECTIONS = True
+        self.run_config = config
+        self.output_video_path = None
         config.SHOW_LABELS = True
 
         # 禁用控制按钮
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
         self.export_csv_btn.setEnabled(False)
+        self.export_video_btn.setEnabled(False)
+        self.export_clips_btn.setEnabled(False)
         self.open_video_btn.setEnabled(False)
 
         # 创建并启动处理线程
         self.process_thread = VideoProcessThread(
             self.video_path,
             config,
-            self.max_frames_spin.value()
+            self.max_frames_spin.value(),
+            self.warmup_thread
         )
         self.process_thread.progress_update.connect(self.update_progress)
+        self.process_thread.partial_results.connect(self.partial_results)
+        self.process_thread.detections_ready.connect(self.detections_ready)
         self.process_thread.finished.connect(self.processing_finished)
         self.process_thread.error.connect(self.processing_error)
         self.process_thread.start()
 
+    def build_config(self):
+        """按界面参数创建配置"""
+        config = Config()
+        config.ATTENTION_SCORE_THRESHOLD = self.threshold_spin.value()
+        config.SKIP_FRAMES = self.skip_frames_spin.value()
+        for name, spin in self.rule_spins.items():
+            setattr(config, name, spin.value())
+        return config
+
+    def rule_values(self, config):
+        return tuple(getattr(config, name) for name, *_ in self.RULE_PARAMS)
+
+    def schedule_rescore(self):
+        """参数变化: 已有检测结果时延迟重新评分"""
+        if self.base_detections is None:
+            return
+        if self.process_thread and self.process_thread.isRunning():
+            return
+        self.rescore_timer.start()
+
+    def start_rescore(self):
+        """在后台按当前参数重新评分"""
+        if self.rescore_thread and self.rescore_thread.isRunning():
+            # 进行中的计算已过时: 请求其提前结束，结束后按最新参数重新开始
+            self.rescore_thread.cancel()
+            self.rescore_pending = True
+            return
+
+        config = self.build_config()
+        run_stride = self.run_config.SKIP_FRAMES + 1
+        stride = config.SKIP_FRAMES + 1
+        if stride % run_stride != 0:
+            self.status_label.setText(
+                f"跳帧数需满足 (跳帧+1) 为 {run_stride} 的整数倍才能直接重新计算，否则请重新检测")
+            return
+
+        key = (self.rule_values(config), stride)
+        if key == self.scored_key:
+            # 只修改了阈值: 直接按新阈值筛选
+            source, replay = self.frame_detections, False
+        else:
+            source, replay = self.base_detections, True
+
+        self.rescore_generation += 1
+        self.rescore_thread = RescoreThread(
+            self.rescore_generation, source, config, self.fps, stride, replay
+        )
+        self.rescore_thread.key = key
+        self.rescore_thread.config = config
+        self.rescore_thread.started_at = time.perf_counter()
+        self.rescore_thread.finished.connect(self.rescore_finished)
+        self.rescore_thread.error.connect(self.status_label.setText)
+        self.rescore_thread.start()
+        self.status_label.setText("正在按新参数重新计算...")
+
+    def rescore_finished(self, generation, frame_detections, summary):
+        """重新评分完成，刷新图表、报告和视频标注（CSV记录表在导出时再生成）"""
+        thread = self.rescore_thread
+        if generation == self.rescore_generation and not self.rescore_pending and summary is not None:
+            self.frame_detections = frame_detections
+            self.scored_key = thread.key
+            self.view_config = thread.config
+            self.show_results(None, summary)
+            elapsed = time.perf_counter() - thread.started_at
+            self.status_label.setText(f"已按新参数重新计算 ({elapsed:.2f}s)")
+
+        if self.rescore_pending:
+            self.rescore_pending = False
+            self.start_rescore()
+
+    def show_results(self, df, summary):
+        """刷新统计图表、详细报告和视频叠加标注"""
+        self.df = df
+        self.summary = summary
+        self.event_index = EventIndex(summary)
+        self.video_player.set_event_index(self.event_index)
+        self.video_player.set_overlay(DetectionOverlay(self.frame_detections or {}, self.view_config))
+        self.chart().plot_statistics(summary)
+        self.report_text.setText(self.format_report(summary))
+        self.update_timeline()
+
+    def update_timeline(self):
+        """逐帧结果变化时在后台重建时间轴金字塔；只改阈值时仅重新着色"""
+        if self.frame_detections is self.timeline_source:
+            self.timeline.set_threshold(self.view_config.ATTENTION_SCORE_THRESHOLD)
+            return
+        if self.timeline_thread and self.timeline_thread.isRunning():
+            self.timeline_pending = True
+            return
+
+        self.timeline_source = self.frame_detections
+        self.timeline_thread = TimelineBuildThread(self.frame_detections or {})
+        self.timeline_thread.finished.connect(self.timeline_ready)
+        self.timeline_thread.start()
+
+    def timeline_ready(self, pyramid):
+        if self.timeline_pending:
+            self.timeline_pending = False
+            self.update_timeline()
+            return
+        self.timeline.set_data(pyramid, self.fps, self.view_config.ATTENTION_SCORE_THRESHOLD)
+
     def stop_processing(self):
         """停止处理"""
         if self.process_thread and self.process_thread.isRunning():
+            # 不等待线程结束: 处理线程在帧之间响应取消，随后通过 finished 返回部分结果
             self.process_thread.stop()
-            self.process_thread.wait()
-            self.status_label.setText("已停止")
-            self.start_btn.setEnabled(True)
+            self.status_label.setText("正在停止，保存已处理部分...")
             self.stop_btn.setEnabled(False)
 
     def update_progress(self, value, message):
@@ -638,33 +1136,46 @@ class MainWindow(QMainWindow):
         self.progress_bar.setValue(value)
         self.status_label.setText(message)
 
+    def partial_results(self, summary):
+        """处理过程中刷新阶段性的学生统计"""
+        self.chart().plot_statistics(summary)
+        self.report_text.setText("⏳ 处理中，以下为阶段性结果\n\n" + self.format_report(summary))
+
+    def detections_ready(self, frame_detections, fps):
+        """保存逐帧检测结果"""
+        self.frame_detections = frame_detections
+        self.base_detections = frame_detections
+        self.fps = fps
+        self.rescore_generation += 1  # 丢弃进行中的旧结果
+        if self.rescore_thread and self.rescore_thread.isRunning():
+            self.rescore_thread.cancel()
+        self.view_config = self.run_config
+        self.scored_key = (self.rule_values(self.run_config), self.run_config.SKIP_FRAMES + 1)
+
     def processing_finished(self, df, summary):
         """处理完成"""
-        self.df = df
-        self.summary = summary
-
         # 更新UI
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
         self.export_csv_btn.setEnabled(True)
-        self.open_video_btn.setEnabled(True)
-
-        # 加载标注视频到播放器
-        output_video = "output_annotated.mp4"
-        if os.path.exists(output_video):
-            self.video_player.load_video(output_video)
-            # 自动切换到视频预览标签页
-            self.tab_widget.setCurrentIndex(0)
+        self.export_video_btn.setEnabled(bool(self.frame_detections))
+        self.export_clips_btn.setEnabled(bool(summary))
 
-        # 显示统计图表
-        self.chart_canvas.plot_statistics(summary)
+        # 检测时生成了标注视频
+        if self.run_config.OUTPUT_VIDEO and os.path.exists(self.run_config.OUTPUT_VIDEO_PATH):
+            self.output_video_path = self.run_config.OUTPUT_VIDEO_PATH
+            self.open_video_btn.setEnabled(True)
 
-        # 显示详细报告
-        report_text = self.format_report(summary)
-        self.report_text.setText(report_text)
+        # 播放原视频，按逐帧检测结果实时叠加标注；刷新图表和报告
+        self.show_results(df, summary)
+        self.video_player.load_video(self.video_path)
+        self.tab_widget.setCurrentIndex(0)
 
         # 显示完成消息
-        QMessageBox.information(self, "完成", "视频处理完成！\n可在'视频预览'标签页查看标注结果。")
+        if self.process_thread.cancelled:
+            QMessageBox.information(self, "已停止", "处理已停止，已显示停止前的部分结果。")
+        else:
+            QMessageBox.information(self, "完成", "视频处理完成！\n可在'视频预览'标签页查看实时叠加的标注结果。")
 
     def processing_error(self, error_msg):
         """处理错误"""
@@ -695,6 +1206,14 @@ class MainWindow(QMainWindow):
 
             lines.append("")
 
+        longest = EventIndex(summary).longest(5)
+        lines.append("🏆 持续时间最长的不专注事件:")
+        for i, event in enumerate(longest, 1):
+            lines.append(f"   {i}. 学生{event['student_id']:02d} "
+                         f"{event['start']} ~ {event['end']} "
+                         f"(持续 {event['duration_sec']}秒, {event['reason']})")
+        lines.append("")
+
         lines.extend([
             "=" * 70,
             f"📈 总计不专注学生数: {len(summary)}人",
@@ -705,6 +1224,9 @@ class MainWindow(QMainWindow):
 
     def export_csv(self):
         """导出CSV报告"""
+        if self.df is None and self.frame_detections:
+            # 重新评分后只合并了时间段，记录表按当前参数在导出时生成
+            self.df = records_from_detections(self.frame_detections, self.view_config, self.fps)
         if self.df is None:
             QMessageBox.warning(self, "警告", "没有可导出的数据!")
             return
@@ -718,21 +1240,132 @@ class MainWindow(QMainWindow):
             self.df.to_csv(file_path, index=False, encoding='utf-8-sig')
             QMessageBox.information(self, "成功", f"CSV报告已保存至:\n{file_path}")
 
+    def closeEvent(self, event):
+        """关闭主窗口时停止后台线程"""
+        if self.process_thread and self.process_thread.isRunning():
+            self.process_thread.stop()
+            self.process_thread.wait()
+        for thread in (self.warmup_thread, self.timeline_thread):
+            if thread and thread.isRunning():
+                thread.wait()
+        self.video_player.release_video()
+        event.accept()
+
+    def export_video(self):
+        """按逐帧检测结果导出标注视频"""
+        if not self.frame_detections:
+            QMessageBox.warning(self, "警告", "没有可导出的检测结果!")
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出标注视频", "output_annotated.mp4",
+            "视频文件 (*.mp4 *.avi);;所有文件 (*.*)"
+        )
+        if not file_path:
+            return
+
+        self.export_video_btn.setEnabled(False)
+        self.status_label.setText("正在导出标注视频...")
+        self.export_thread = ExportVideoThread(
+            self.video_path, self.frame_detections, file_path, self.view_config
+        )
+        self.export_thread.finished.connect(self.export_finished)
+        self.export_thread.error.connect(self.export_error)
+        self.export_thread.start()
+
+    def export_finished(self, output_path):
+        """标注视频导出完成"""
+        self.output_video_path = output_path
+        self.export_video_btn.setEnabled(True)
+        self.open_video_btn.setEnabled(True)
+        self.status_label.setText("标注视频导出完成")
+        QMessageBox.information(self, "成功", f"标注视频已保存至:\n{output_path}")
+
+    def export_error(self, error_msg):
+        self.export_video_btn.setEnabled(True)
+        self.status_label.setText("导出失败")
+        QMessageBox.critical(self, "错误", error_msg)
+
+    def export_clips(self):
+        """把每个不专注事件剪成带标注的短片段"""
+        if not self.summary:
+            QMessageBox.warning(self, "警告", "没有不专注事件可导出!")
+            return
+
+        output_dir = QFileDialog.getExistingDirectory(self, "选择片段保存目录")
+        if not output_dir:
+            return
+
+        self.export_clips_btn.setEnabled(False)
+        self.status_label.setText("正在导出事件片段...")
+        self.clips_thread = ExportClipsThread(
+            self.video_path, self.summary, output_dir, self.view_config, self.frame_detections
+        )
+        self.clips_thread.finished.connect(lambda clips: self.clips_finished(clips, output_dir))
+        self.clips_thread.error.connect(self.clips_error)
+        self.clips_thread.start()
+
+    def clips_finished(self, clips, output_dir):
+        """事件片段导出完成"""
+        self.export_clips_btn.setEnabled(True)
+        copied = sum(c['copied_sec'] for c in clips)
+        self.status_label.setText(f"事件片段导出完成 ({len(clips)}个)")
+        QMessageBox.information(
+            self, "成功",
+            f"已导出 {len(clips)} 个事件片段（其中流复制 {copied:.1f} 秒）至:\n{output_dir}"
+        )
+
+    def clips_error(self, error_msg):
+        self.export_clips_btn.setEnabled(True)
+        self.status_label.setText("导出失败")
+        QMessageBox.critical(self, "错误", error_msg)
+
     def open_output_video(self):
         """打开输出视频"""
-        if os.path.exists("output_annotated.mp4"):
-            os.system(f'open "output_annotated.mp4"')  # macOS
+        if self.output_video_path and os.path.exists(self.output_video_path):
+            os.system(f'open "{self.output_video_path}"')  # macOS
         else:
             QMessageBox.warning(self, "警告", "标注视频文件不存在!")
 
 
 # ==================== 主函数 ====================
+def report_startup_time(app, window):
+    """启动耗时测量模式: 输出模块导入、窗口显示、模型预热完成的耗时后退出"""
+    timings = {'import_sec': round(IMPORT_DONE - STARTUP_T0, 3)}
+
+    def warmup_done():
+        if 'warmup_sec' in timings:
+            return
+        timings['warmup_sec'] = round(time.perf_counter() - STARTUP_T0, 3)
+        print(f"启动耗时: 模块导入 {timings['import_sec']}s | "
+              f"窗口显示 {timings['window_sec']}s | 模型预热完成 {timings['warmup_sec']}s "
+              f"({window.model_label.text()})")
+        print(json.dumps(timings))
+        app.quit()
+
+    def window_shown():
+        timings['window_sec'] = round(time.perf_counter() - STARTUP_T0, 3)
+        window.warmup_thread.finished.connect(warmup_done)
+        if window.warmup_thread.isFinished():
+            warmup_done()
+
+    # 排在 start_warmup 之后，首次事件循环时窗口已显示
+    QTimer.singleShot(0, window_shown)
+
+
 def main():
+    # --startup-time: 测量启动耗时（用于跟踪启动速度回退）
+    measure_startup = '--startup-time' in sys.argv
+    if measure_startup:
+        sys.argv.remove('--startup-time')
+
     app = QApplication(sys.argv)
     app.setStyle('Fusion')  # 使用Fusion风格
 
     window = MainWindow()
     window.show()
+    if measure_startup:
+        report_startup_time(app, window)
 
     sys.exit(app.exec())
 
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+课堂专注度检测系统 - 学生专注度时间轴热力图
+学生 x 时间 的分数矩阵预先逐级2倍合并成多分辨率金字塔（numpy分箱），
+绘制时按当前缩放选择层级，只渲染可见的图块并缓存
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from PyQt6.QtWidgets import QWidget, QToolTip
+from PyQt6.QtCore import Qt, QRectF, pyqtSignal
+from PyQt6.QtGui import QImage, QPainter, QColor, QPen
+
+from detection_store import DetectionStore
+
+
+TILE_COLUMNS = 256      # 每个图块包含的（当前层级）列数
+MISSING = 101           # 颜色表中“无检测”的下标
+
+
+# ==================== 多分辨率金字塔 ====================
+class TimelinePyramid:
+    """学生 x 处理帧 的专注度分数金字塔
+
+    第0层每列对应一个处理帧；第k层每列合并 2^k 个处理帧。
+    每层保存分数之和与检测次数，缺失的帧不计入均值。
+    出现帧数不足 min_fraction 的短轨迹（跟踪ID切换产生）不显示。
+    """
+
+    def __init__(self, frame_detections, min_fraction=0.01):
+        store = DetectionStore.from_detections(frame_detections)
+        self.frames = np.array(sorted(store), dtype=np.int64)
+        columns = store.columns()
+
+        num_cols = len(self.frames)
+        if not len(columns['ids']):
+            self.student_ids = []
+            self.levels = [(np.zeros((0, num_cols), np.float32), np.zeros((0, num_cols), np.int32))]
+            return
+
+        cols = np.searchsorted(self.frames, columns['frame'])
+        scores = columns['scores']
+        # 跟踪ID是连续分配的整数，用bincount代替排序去重
+        ids = columns['ids'].astype(np.int64)
+        offset = ids.min()
+        ids -= offset
+        presence = np.bincount(ids)
+        keep = presence >= max(1, min_fraction * num_cols)
+        remap = np.cumsum(keep) - 1
+
+        mask = keep[ids]
+        rows, cols = remap[ids[mask]], cols[mask]
+        self.student_ids = [int(sid) + int(offset) for sid in np.flatnonzero(keep)]
+
+        sums = np.zeros((len(self.student_ids), num_cols), np.float32)
+        counts = np.zeros((len(self.student_ids), num_cols), np.int32)
+        # 同一帧内跟踪ID唯一，直接赋值
+        sums[rows, cols] = scores[mask].astype(np.float32)
+        counts[rows, cols] = 1
+
+        # 逐级2倍合并，直到一个图块即可容纳整行
+        self.levels = [(sums, counts)]
+        while sums.shape[1] > TILE_COLUMNS:
+            if sums.shape[1] % 2:
+                sums = np.pad(sums, ((0, 0), (0, 1)))
+                counts = np.pad(counts, ((0, 0), (0, 1)))
+            sums = sums.reshape(len(sums), -1, 2).sum(axis=2)
+            counts = counts.reshape(len(counts), -1, 2).sum(axis=2)
+            self.levels.append((sums, counts))
+
+    @property
+    def num_columns(self):
+        return len(self.frames)
+
+    def level_for(self, columns_per_pixel):
+        """每个像素至少对应一列的最细层级"""
+        if columns_per_pixel <= 1:
+            return 0
+        return min(int(np.log2(columns_per_pixel)), len(self.levels) - 1)
+
+    def mean_scores(self, level, start, end):
+        """第level层 [start, end) 列的平均分数（无检测为NaN）"""
+        sums, counts = self.levels[level]
+        sums, counts = sums[:, start:end], counts[:, start:end]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def column_at_frame(self, frame_number):
+        """帧号所在（或之前最近）的处理帧列"""
+        return max(0, int(np.searchsorted(self.frames, frame_number, side='right')) - 1)
+
+
+def score_colors(threshold):
+    """分数 0~100 -> ARGB颜色表：低于阈值红->橙，高于阈值黄绿->绿；最后一项为无检测"""
+    def ramp(a, b, n):
+        return np.linspace(a, b, n)
+
+    threshold = int(np.clip(threshold, 1, 100))
+    low = ramp((200, 40, 40), (250, 160, 40), threshold)
+    high = ramp((190, 210, 80), (40, 160, 70), 101 - threshold)
+    rgb = np.vstack([low, high, [(55, 55, 55)]]).astype(np.uint32)
+    return (0xFF000000 | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]).astype(np.uint32)
+
+
+# ==================== 热力图组件 ====================
+class TimelineHeatmap(QWidget):
+    """学生专注度时间轴热力图
+
+    滚轮缩放（以光标为中心），拖动平移，双击恢复全览，单击跳转视频到对应帧
+    """
+    frame_selected = pyqtSignal(int)    # 帧号
+
+    LABEL_WIDTH = 56
+    AXIS_HEIGHT = 18
+    MIN_SPAN = 8                        # 最大放大时可见的处理帧数
+
+    def __init__(self, parent=None, tile_cache_size=256):
+        super().__init__(parent)
+        self.pyramid = None
+        self.fps = 30
+        self.colors = score_colors(50)
+        self.view_start = 0.0           # 可见范围（第0层列坐标）
+        self.view_span = 1.0
+        self.playhead = None
+        self.tiles = OrderedDict()      # (层级, 图块号) -> QImage
+        self.tile_cache_size = tile_cache_size
+        self.press_pos = None
+        self.press_start = 0.0
+
+        self.setMinimumHeight(120)
+        self.setMouseTracking(True)
+
+    # ---------- 数据 ----------
+    def set_data(self, pyramid, fps, threshold):
+        self.pyramid = pyramid
+        self.fps = fps or 30
+        self.colors = score_colors(threshold)
+        self.tiles.clear()
+        self.reset_view()
+
+    def set_threshold(self, threshold):
+        """只修改阈值时重新着色（金字塔不变）"""
+        self.colors = score_colors(threshold)
+        self.tiles.clear()
+        self.update()
+
+    def set_playhead(self, frame_number):
+        self.playhead = frame_number
+        self.update()
+
+    def reset_view(self):
+        self.view_start = 0.0
+        self.view_span = float(max(1, self.pyramid.num_columns if self.pyramid else 1))
+        self.update()
+
+    # ---------- 坐标换算 ----------
+    def plot_rect(self):
+        return QRectF(self.LABEL_WIDTH, 0, max(1, self.width() - self.LABEL_WIDTH),
+                      max(1, self.height() - self.AXIS_HEIGHT))
+
+    def columns_per_pixel(self):
+        return self.view_span / self.plot_rect().width()
+
+    def column_at(self, x):
+        return self.view_start + (x - self.LABEL_WIDTH) * self.columns_per_pixel()
+
+    def x_at(self, column):
+        return self.LABEL_WIDTH + (column - self.view_start) / self.columns_per_pixel()
+
+    def cell_at(self, pos):
+        """鼠标位置 -> (第0层列, 行)，不在绘图区内返回None"""
+        plot = self.plot_rect()
+        if self.pyramid is None or not self.pyramid.student_ids or not plot.contains(pos):
+            return None
+        column = int(self.column_at(pos.x()))
+        row = int((pos.y() - plot.top()) / plot.height() * len(self.pyramid.student_ids))
+        if not 0 <= column < self.pyramid.num_columns:
+            return None
+        return column, min(row, len(self.pyramid.student_ids) - 1)
+
+    def set_view(self, start, span):
+        total = self.pyramid.num_columns
+        span = float(np.clip(span, min(self.MIN_SPAN, total), total))
+        self.view_span = span
+        self.view_start = float(np.clip(start, 0, total - span))
+        self.update()
+
+    # ---------- 绘制 ----------
+    def tile(self, level, index):
+        """渲染（或从缓存读取）一个图块"""
+        key = (level, index)
+        image = self.tiles.get(key)
+        if image is not None:
+            self.tiles.move_to_end(key)
+            return image
+
+        scores = self.pyramid.mean_scores(level, index * TILE_COLUMNS, (index + 1) * TILE_COLUMNS)
+        if scores.shape[1] == 0:
+            return None
+        codes = np.where(np.isnan(scores), MISSING,
+                         np.clip(np.nan_to_num(scores), 0, 100)).astype(np.intp)
+        argb = np.ascontiguousarray(self.colors[codes])
+        h, w = argb.shape
+        image = QImage(argb.data, w, h, 4 * w, QImage.Format.Format_ARGB32).copy()
+
+        self.tiles[key] = image
+        while len(self.tiles) > self.tile_cache_size:
+            self.tiles.popitem(last=False)
+        return image
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(35, 35, 35))
+        painter.setPen(QColor(200, 200, 200))
+
+        if self.pyramid is None or not self.pyramid.student_ids:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "暂无时间轴数据")
+            return
+
+        plot = self.plot_rect()
+        cpp = self.columns_per_pixel()
+        level = self.pyramid.level_for(cpp)
+        scale = 1 << level
+        tile_span = TILE_COLUMNS * scale
+
+        # 只绘制可见图块
+        painter.save()
+        painter.setClipRect(plot)
+        first = int(self.view_start // tile_span)
+        last = int((self.view_start + self.view_span) // tile_span)
+        for index in range(first, last + 1):
+            image = self.tile(level, index)
+            if image is None:
+                continue
+            x = self.x_at(index * tile_span)
+            painter.drawImage(QRectF(x, plot.top(), image.width() * scale / cpp, plot.height()),
+                              image)
+
+        if self.playhead is not None:
+            x = self.x_at(self.pyramid.column_at_frame(self.playhead) + 0.5)
+            painter.setPen(QPen(QColor(255, 255, 255), 1))
+            painter.drawLine(int(x), int(plot.top()), int(x), int(plot.bottom()))
+        painter.restore()
+
+        self.draw_labels(painter, plot)
+        self.draw_axis(painter, plot)
+
+    def draw_labels(self, painter, plot):
+        """左侧学生ID（行太密时间隔显示）"""
+        ids = self.pyramid.student_ids
+        row_height = plot.height() / len(ids)
+        every = max(1, int(np.ceil(12 / row_height)))
+        painter.setPen(QColor(200, 200, 200))
+        for row in range(0, len(ids), every):
+            y = plot.top() + row * row_height
+            painter.drawText(QRectF(0, y, self.LABEL_WIDTH - 4, max(row_height, 12)),
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter,
+                             f"学生{ids[row]}")
+
+    def draw_axis(self, painter, plot):
+        """底部时间刻度（刻度间隔随缩放自动选择）"""
+        frames = self.pyramid.frames
+        start_sec = frames[int(self.view_start)] / self.fps
+        end_sec = frames[min(int(self.view_start + self.view_span), len(frames) - 1)] / self.fps
+        seconds_per_pixel = max(end_sec - start_sec, 1e-6) / plot.width()
+        step = next((s for s in (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+                     if s / seconds_per_pixel >= 80), 7200)
+
+        painter.setPen(QColor(200, 200, 200))
+        tick = np.ceil(start_sec / step) * step
+        while tick <= end_sec:
+            x = self.x_at(self.pyramid.column_at_frame(tick * self.fps))
+            painter.drawLine(int(x), int(plot.bottom()), int(x), int(plot.bottom()) + 4)
+            t = int(tick)
+            painter.drawText(int(x) + 2, self.height() - 3,
+                             f"{t // 3600}:{t % 3600 // 60:02d}:{t % 60:02d}")
+            tick += step
+
+    # ---------- 交互 ----------
+    def wheelEvent(self, event):
+        if self.pyramid is None or not self.pyramid.student_ids:
+            return
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        anchor = self.column_at(event.position().x())
+        span = self.view_span * factor
+        ratio = (anchor - self.view_start) / self.view_span
+        self.set_view(anchor - ratio * span, span)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.press_pos = event.position()
+            self.press_start = self.view_start
+
+    def mouseMoveEvent(self, event):
+        if self.pyramid is None or not self.pyramid.student_ids:
+            return
+        if self.press_pos is not None:
+            dx = event.position().x() - self.press_pos.x()
+            self.set_view(self.press_start - dx * self.columns_per_pixel(), self.view_span)
+            return
+
+        cell = self.cell_at(event.position())
+        if cell is None:
+            QToolTip.hideText()
+            return
+        column, row = cell
+        level = self.pyramid.level_for(self.columns_per_pixel())
+        level_col = column >> level
+        score = self.pyramid.mean_scores(level, level_col, level_col + 1)[row, 0]
+        t = int(self.pyramid.frames[column] / self.fps)
+        text = f"学生{self.pyramid.student_ids[row]}  {t // 3600}:{t % 3600 // 60:02d}:{t % 60:02d}  "
+        text += "无检测" if np.isnan(score) else f"平均分数 {score:.0f}"
+        QToolTip.showText(event.globalPosition().toPoint(), text, self)
+
+    def mouseReleaseEvent(self, event):
+        if self.press_pos is None:
+            return
+        moved = abs(event.position().x() - self.press_pos.x())
+        self.press_pos = None
+        if moved < 3:
+            cell = self.cell_at(event.position())
+            if cell is not None:
+                self.frame_selected.emit(int(self.pyramid.frames[cell[0]]))
+
+    def mouseDoubleClickEvent(self, event):
+        if self.pyramid is not None:
+            self.reset_view()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+实时视频源
+摄像头（设备号 / V4L2设备 /dev/videoN）、网络流（rtsp:// http:// 等）或命名管道没有固定帧数，
+处理速度跟不上时不能排队等待，否则延迟会越积越大:
+  - LatestFrameCapture: 采集线程持续读取，只保留最新一帧；处理端每次取最新帧，过时的帧直接丢弃
+  - ReplayCapture: 把视频文件按真实时间节奏回放，模拟实时源（测试用）
+  - RollingReports: 定期把新增的不专注记录追加写入事件文件，并按固定时长生成滚动窗口报告
+"""
+
+import os
+import json
+import stat
+import threading
+import time
+from datetime import datetime, timedelta
+
+import cv2
+
+
+# ==================== 视频源识别 ====================
+def is_live_source(source):
+    """设备号、/dev/videoN、流地址、命名管道 / 字符设备视为实时源"""
+    source = str(source)
+    if source.isdigit() or '://' in source:
+        return True
+    try:
+        mode = os.stat(source).st_mode
+    except OSError:
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISCHR(mode)
+
+
+def open_source(source):
+    """设备号按整数打开（OpenCV默认后端，Linux上为V4L2），其他按路径 / 地址打开"""
+    source = str(source)
+    return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+
+def nominal_fps(cap, default=25.0):
+    """部分摄像头 / 网络流报告的帧率为0或时间基（如90000），超出合理范围时使用默认值"""
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    return fps if 1.0 <= fps <= 120.0 else default
+
+
+# ==================== 文件回放（模拟实时源） ====================
+class ReplayCapture:
+    """按视频帧率以真实时间节奏输出帧的文件源，接口与 cv2.VideoCapture 一致"""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        self.fps = nominal_fps(self.cap)
+        self.start = None
+        self.index = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+        if self.start is None:
+            self.start = time.monotonic()
+        delay = self.start + self.index / self.fps - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        self.cap.release()
+
+
+# ==================== 最新帧采集 ====================
+class LatestFrameCapture:
+    """采集线程持续读取视频源，只保留最新一帧
+
+    read() 返回 (帧号, 采集时间, 帧)；帧号按采集时间换算（第几秒 x 帧率），
+    因此丢帧后记录的时间仍是真实时间
+    """
+
+    def __init__(self, source, replay=False):
+        self.cap = ReplayCapture(source) if replay else open_source(source)
+        if not self.cap.isOpened():
+            raise FileNotFoundError(f"无法打开视频源: {source}")
+        self.fps = nominal_fps(self.cap)
+        self.size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                     int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        self.condition = threading.Condition()
+        self.latest = None
+        self.captured = 0
+        self.delivered = 0
+        self.ended = False
+        self.stopped = False
+        self.start = time.monotonic()
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    def _read_loop(self):
+        while not self.stopped:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            now = time.monotonic()
+            frame_idx = int(round((now - self.start) * self.fps))
+            with self.condition:
+                self.latest = (frame_idx, now, frame)  # 覆盖未取走的旧帧
+                self.captured += 1
+                self.condition.notify()
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+
+    def read(self, timeout=0.5):
+        """取走最新帧；timeout 秒内没有新帧（或视频源已结束）时返回None"""
+        with self.condition:
+            if self.latest is None and not self.ended:
+                self.condition.wait(timeout)
+            item, self.latest = self.latest, None
+            if item is not None:
+                self.delivered += 1
+            return item
+
+    @property
+    def pending(self):
+        return int(self.latest is not None)
+
+    @property
+    def dropped(self):
+        """被更新的帧覆盖、没有处理的帧数"""
+        return self.captured - self.delivered - self.pending
+
+    def release(self):
+        self.stopped = True
+        self.reader.join(timeout=2)
+        self.cap.release()
+
+
+# ==================== 事件写入 / 滚动报告 ====================
+class RollingReports:
+    """实时模式的不专注事件写入和滚动窗口报告
+
+    每 flush_interval 秒把新增记录追加到 events_path（JSON Lines，附带真实时间）；
+    每 report_interval 秒结束一个窗口，由调用方生成报告后 close_window() 并清空内存中的记录
+    """
+
+    def __init__(self, events_path, report_dir, flush_interval=2.0, report_interval=60.0):
+        self.events_path = events_path
+        self.report_dir = report_dir
+        self.flush_interval = flush_interval
+        self.report_interval = report_interval
+        self.session_start = datetime.now()
+        self.window_start = self.session_start
+        self.last_flush = self.window_time = time.monotonic()
+        self.flushed = 0
+        self.windows = 0
+        if events_path:
+            os.makedirs(os.path.dirname(os.path.abspath(events_path)), exist_ok=True)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+
+    def update(self, records, now=None):
+        """每帧调用；到写入间隔时追加新记录，窗口结束时返回True"""
+        now = time.monotonic() if now is None else now
+        if now - self.last_flush >= self.flush_interval:
+            self.flush(records, now)
+        return now - self.window_time >= self.report_interval
+
+    def flush(self, records, now=None):
+        """把 records 中尚未写入的记录追加到事件文件"""
+        self.last_flush = time.monotonic() if now is None else now
+        new = records[self.flushed:]
+        self.flushed = len(records)
+        if not new or not self.events_path:
+            return
+        try:
+            with open(self.events_path, 'a', encoding='utf-8') as f:
+                for record in new:
+                    wall_time = self.session_start + timedelta(seconds=record['time_sec'])
+                    f.write(json.dumps({**record, 'wall_time': wall_time.isoformat(timespec='seconds')},
+                                       ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"⚠ 事件写入失败: {e}")
+
+    def close_window(self, records, df=None):
+        """写入剩余记录并保存窗口报告（df 为 build_report 的记录表），开始下一个窗口
+
+        返回 (窗口开始, 窗口结束, 报告路径或None)；调用方随后清空 records
+        """
+        self.flush(records)
+        start, end = self.window_start, datetime.now()
+        path = None
+        if df is not None and self.report_dir:
+            path = os.path.join(self.report_dir, f"report_{start:%Y%m%d_%H%M%S}-{end:%H%M%S}.csv")
+            df.to_csv(path, index=False, encoding='utf-8-sig')
+        self.windows += 1
+        self.window_start = end
+        self.window_time = time.monotonic()
+        self.flushed = 0
+        return start, end, path
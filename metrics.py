@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+处理流水线性能统计
+StageTimings 按阶段累计一次运行的耗时（每帧只增加几次 perf_counter 调用，始终开启）:
+  decode     读取/解码视频帧（含跳过的帧）
+  inference  模型推理（含前后处理；多副本模式下为等待副本结果的时间）
+  tracking   多目标跟踪
+  scoring    专注度计算与不专注事件记录
+  drawing    绘制标注
+  encoding   写入标注视频
+  report     生成报告
+
+Metrics 为长时间运行的服务提供逐帧指标（默认关闭，关闭时处理循环中只多一次 None 判断）:
+  - 各阶段逐帧耗时直方图、整帧耗时直方图
+  - 解码 / 跳过 / 推理的帧数，检测数
+  - 每帧检测数和活动轨迹数的直方图，各队列深度
+  按 METRICS_INTERVAL 周期导出: .prom / .txt 文件写为Prometheus文本格式（整文件替换），
+  其他扩展名按JSON Lines追加快照
+"""
+
+import os
+import json
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+
+
+STAGES = ('decode', 'inference', 'tracking', 'scoring', 'drawing', 'encoding', 'report')
+
+_END = object()
+
+
+# ==================== 阶段耗时 ====================
+class StageTimings:
+    """一次运行中各阶段的累计耗时（秒）"""
+
+    def __init__(self, metrics=None):
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        self.frames = 0         # 处理（推理）的帧数
+        self.wall = 0.0         # 整个处理循环的耗时
+        # 启用逐帧指标时另外累计当前帧的各阶段耗时，由 pop_frame() 取出
+        self.current = defaultdict(float) if metrics is not None else None
+
+    def add(self, stage, seconds):
+        self.totals[stage] += seconds
+        if self.current is not None:
+            self.current[stage] += seconds
+
+    def timed(self, stage, iterable):
+        """迭代 iterable，把每次取下一项的耗时计入 stage"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, _END)
+            self.add(stage, time.perf_counter() - start)
+            if item is _END:
+                return
+            yield item
+
+    def timed_excluding(self, stage, iterable, inner):
+        """同 timed，但扣除期间已计入 inner 阶段的耗时
+
+        用于推理流: 取下一个结果时会先从解码生成器读取帧，这部分已计入decode
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            inner_before = self.totals[inner]
+            item = next(iterator, _END)
+            self.add(stage, (time.perf_counter() - start) - (self.totals[inner] - inner_before))
+            if item is _END:
+                return
+            yield item
+
+    def move(self, source, target, seconds):
+        """把已计入 source 的一部分耗时改记到 target（如推理中的跟踪耗时）"""
+        seconds = min(seconds, self.totals[source])
+        self.add(source, -seconds)
+        self.add(target, seconds)
+
+    def pop_frame(self):
+        """取出并清空当前帧的各阶段耗时（仅启用逐帧指标时）"""
+        frame = dict(self.current)
+        self.current.clear()
+        return frame
+
+    def as_dict(self):
+        """{'frames', 'wall_sec', 'stages': {阶段: {'total_sec', 'per_frame_ms', 'share'}}}
+
+        share 为占整个处理循环耗时的比例；other 为未归入任何阶段的部分（进度输出、回调等）
+        """
+        totals = dict(self.totals)
+        totals['other'] = max(0.0, self.wall - sum(self.totals.values()))
+        frames = max(1, self.frames)
+        return {
+            'frames': self.frames,
+            'wall_sec': round(self.wall, 4),
+            'stages': {
+                stage: {
+                    'total_sec': round(seconds, 4),
+                    'per_frame_ms': round(seconds / frames * 1000, 3),
+                    'share': round(seconds / self.wall, 4) if self.wall > 0 else 0.0,
+                }
+                for stage, seconds in totals.items()
+            },
+        }
+
+    def format(self):
+        """控制台输出用的多行文本"""
+        data = self.as_dict()
+        lines = [f"各阶段耗时 ({data['frames']}帧, 共{data['wall_sec']:.2f}秒):"]
+        for stage, item in data['stages'].items():
+            lines.append(f"  {stage:<10} {item['total_sec']:>8.2f}s  "
+                         f"{item['per_frame_ms']:>8.2f} ms/帧  {item['share'] * 100:>5.1f}%")
+        return "\n".join(lines)
+
+
+# ==================== 逐帧指标 ====================
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 30, 50, 80, 120, 200)
+
+
+class Histogram:
+    """固定桶直方图（桶上界升序，最后一个桶为 +Inf）"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """近似分位数: 返回所在桶的上界（落在 +Inf 桶时返回最大值）"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 3) if self.count else 0.0,
+            'p50': round(self.quantile(0.5), 3),
+            'p95': round(self.quantile(0.95), 3),
+            'p99': round(self.quantile(0.99), 3),
+            'max': round(self.max, 3),
+        }
+
+    def prometheus(self, name, labels):
+        """Prometheus文本格式的 _bucket / _sum / _count 行（桶计数为累计值）"""
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {self.sum:.6f}')
+        lines.append(f'{name}_count{format_labels(labels)} {self.count}')
+        return lines
+
+
+def format_labels(labels, **extra):
+    items = {**labels, **extra}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items.items()) + '}'
+
+
+class Metrics:
+    """逐帧运行指标及周期导出
+
+    frame() 在每个推理帧结束时调用一次；close() 在处理结束时做最后一次导出
+    """
+
+    def __init__(self, path, interval=10.0, source='ca_gpu'):
+        self.path = path
+        self.interval = interval
+        self.source = source
+        self.prometheus = os.path.splitext(path)[1].lower() in ('.prom', '.txt')
+
+        self.stage_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS_MS))  # 毫秒
+        self.frame_latency = Histogram(LATENCY_BUCKETS_MS)
+        self.detections = Histogram(COUNT_BUCKETS)
+        self.active_tracks = Histogram(COUNT_BUCKETS)
+        self.counters = {'frames_decoded': 0, 'frames_skipped': 0, 'frames_inferred': 0,
+                         'detections': 0}
+        self.queues = {}
+
+        self.start = self.last_export = time.monotonic()
+        self.last_inferred = 0
+
+    def frame(self, frame_idx, stage_seconds, detections, active_tracks=None, queues=None):
+        """记录一个推理帧: 各阶段耗时(秒)、检测数、活动轨迹数、队列深度"""
+        total = 0.0
+        for stage, seconds in stage_seconds.items():
+            self.stage_latency[stage].observe(seconds * 1000)
+            total += seconds
+        self.frame_latency.observe(total * 1000)
+
+        counters = self.counters
+        counters['frames_inferred'] += 1
+        counters['frames_decoded'] = max(counters['frames_decoded'], frame_idx + 1)
+        counters['frames_skipped'] = counters['frames_decoded'] - counters['frames_inferred']
+        counters['detections'] += detections
+        self.detections.observe(detections)
+        self.active_tracks.observe(detections if active_tracks is None else active_tracks)
+        if queues:
+            self.queues.update(queues)
+
+        now = time.monotonic()
+        if now - self.last_export >= self.interval:
+            self.export(now)
+
+    def snapshot(self, now=None):
+        """当前累计指标（JSON Lines 的一行）"""
+        now = time.monotonic() if now is None else now
+        window = now - self.last_export
+        inferred = self.counters['frames_inferred']
+        return {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'source': self.source,
+            'uptime_sec': round(now - self.start, 3),
+            'interval_fps': round((inferred - self.last_inferred) / window, 2) if window > 0 else 0.0,
+            'counters': dict(self.counters),
+            'queues': dict(self.queues),
+            'frame_latency_ms': self.frame_latency.as_dict(),
+            'stage_latency_ms': {stage: h.as_dict() for stage, h in self.stage_latency.items()},
+            'detections_per_frame': self.detections.as_dict(),
+            'active_tracks_per_frame': self.active_tracks.as_dict(),
+        }
+
+    def to_prometheus(self):
+        labels = {'source': self.source}
+        lines = ['# TYPE classroom_frames_total counter']
+        for kind in ('decoded', 'skipped', 'inferred'):
+            lines.append(f'classroom_frames_total{format_labels(labels, kind=kind)} '
+                         f'{self.counters["frames_" + kind]}')
+        lines += ['# TYPE classroom_detections_total counter',
+                  f'classroom_detections_total{format_labels(labels)} {self.counters["detections"]}']
+        lines.append('# TYPE classroom_queue_depth gauge')
+        for queue, depth in self.queues.items():
+            lines.append(f'classroom_queue_depth{format_labels(labels, queue=queue)} {depth}')
+
+        lines.append('# TYPE classroom_frame_latency_ms histogram')
+        lines += self.frame_latency.prometheus('classroom_frame_latency_ms', labels)
+        lines.append('# TYPE classroom_stage_latency_ms histogram')
+        for stage, histogram in self.stage_latency.items():
+            lines += histogram.prometheus('classroom_stage_latency_ms', {**labels, 'stage': stage})
+        lines.append('# TYPE classroom_detections_per_frame histogram')
+        lines += self.detections.prometheus('classroom_detections_per_frame', labels)
+        lines.append('# TYPE classroom_active_tracks_per_frame histogram')
+        lines += self.active_tracks.prometheus('classroom_active_tracks_per_frame', labels)
+        return '\n'.join(lines) + '\n'
+
+    def export(self, now=None):
+        now = time.monotonic() if now is None else now
+        try:
+            if self.prometheus:
+                # 先写临时文件再替换，采集端不会读到写了一半的文件
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.to_prometheus())
+                os.replace(tmp_path, self.path)
+            else:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(self.snapshot(now), ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"⚠ 指标导出失败: {e}")
+        self.last_export = now
+        self.last_inferred = self.counters['frames_inferred']
+
+    def close(self):
+        self.export()
+
+
+def create_metrics(path, interval=10.0, source='ca_gpu'):
+    """path 为空时返回None（关闭指标）"""
+    if not path:
+        return None
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    return Metrics(path, interval, source)
+
+
+class FrameClock:
+    """逐帧分段计时: lap(stage) 把距上一次 lap 的耗时计入 stage"""
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] += now - self.last
+        self.last = now
+
+    def pop(self):
+        """取出当前帧的各阶段耗时并开始下一帧"""
+        stages = dict(self.stages)
+        self.stages.clear()
+        return stages
+
+
+class NullClock:
+    """关闭指标时使用，lap / pop 不做任何事"""
+
+    def lap(self, stage):
+        pass
+
+    def pop(self):
+        return {}
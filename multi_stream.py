@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+多路视频（多摄像头）并行处理
+大教室的两三个机位共用一个模型实例，而不是每路各加载一个 ClassroomMonitor 和模型:
+  - 每路一个后台线程按跳帧设置解码（高分辨率时同样由ffmpeg解码到推理尺寸），最多预读 STREAM_QUEUE_SIZE 帧
+  - 每轮从各路各取若干帧合成一个推理批次（共 max(BATCH_SIZE, 路数) 帧左右），用同一个后端 predict()
+  - 结果按来源路由回各路自己的 IoU 跟踪器和 StudentStateTracker（每路一个 ClassroomMonitor 负责评分和记录），
+    各路的学生ID互不影响
+  - 输出各路报告，以及带 camera 列的合并报告
+
+批量推理不能使用后端自带的单路跟踪（ByteTrack 在批次内按顺序跟踪，多路混合会串号），
+因此统一用 predict() + 每路 IouTracker。同一名学生出现在多个机位中时会分别计入各路报告
+"""
+
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from ca_gpu import (ClassroomMonitor, draw_annotations, open_video_writer, verify_output_video)
+from event_stream import AttentionEvents, create_event_sink
+from metrics import StageTimings
+from pose_backend import IouTracker
+from video_capture import open_ffmpeg_capture, upscale_frame
+
+
+STREAM_QUEUE_SIZE = 8       # 每路预读的帧数
+
+
+def stream_names(video_paths):
+    """各路名称: 文件名（不含扩展名），重名时加序号"""
+    names = []
+    for i, path in enumerate(video_paths, 1):
+        name = os.path.splitext(os.path.basename(str(path).rstrip('/')))[0] or f"camera{i}"
+        names.append(name if name not in names else f"{name}_{i}")
+    return names
+
+
+# ==================== 单路解码 ====================
+class StreamReader:
+    """后台线程读取一路视频，生成 (帧号, 帧)，读完放入None"""
+
+    def __init__(self, monitor, max_frames=0, queue_size=STREAM_QUEUE_SIZE):
+        self.monitor = monitor
+        video_path = os.path.abspath(monitor.video_path)
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise FileNotFoundError(f"无法打开视频: {video_path}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if max_frames > 0:
+            self.total_frames = min(self.total_frames, max_frames)
+        self.size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.decode_size = self.size
+
+        decoder = open_ffmpeg_capture(video_path, monitor.config, self.size)
+        if decoder is not None:
+            cap.release()
+            cap = decoder
+            self.decode_size = decoder.size
+        self.cap = cap
+        self.decoder = decoder
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.frames = monitor.read_frames(cap, max_frames)
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    def _read_loop(self):
+        try:
+            for item in self.frames:
+                if not self._put(item):
+                    return
+        finally:
+            self._put(None)
+
+    def _put(self, item):
+        """放入队列；release() 之后不再等待，返回False"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        return self.queue.get()
+
+    def release(self):
+        self.stopped.set()
+        self.reader.join(timeout=2)
+        self.cap.release()
+
+
+# ==================== 多路处理 ====================
+class MultiStreamRunner:
+    """多路视频共用一个推理后端
+
+    每路对应一个 ClassroomMonitor（评分、不专注记录、报告与单路处理一致），
+    monitors / names 与 video_paths 一一对应
+    """
+
+    def __init__(self, video_paths, config, backend=None):
+        self.config = config
+        self.names = stream_names(video_paths)
+        self.monitors = [ClassroomMonitor(path, config, backend) for path in video_paths]
+        self.timings = StageTimings()
+        self.cancelled = False
+
+    def process(self, max_frames=0, cancel_event=None):
+        """处理全部视频，返回 ({名称: (DataFrame, summary)}, (合并DataFrame, 合并汇总))"""
+        self.cancelled = False
+        config = self.config
+        count = len(self.monitors)
+        print("\n" + "="*60)
+        print(f"课堂专注度检测系统 v2.0 (多路: {count}个机位)".center(60))
+        print("="*60 + "\n")
+
+        print("步骤1: 加载YOLOv8-pose模型（各路共用）...")
+        if config.CPU_REPLICAS != 0 or config.REALTIME:
+            print("⚠ 多路模式各路合批推理，不使用CPU多副本 / 实时调度")
+        backend = self.monitors[0]._load_backend()
+        print(f"✓ 模型加载成功\n")
+
+        print("步骤2: 加载视频文件...")
+        readers, writers = [], []
+        try:
+            for name, monitor in zip(self.names, self.monitors):
+                reader = StreamReader(monitor, max_frames)
+                readers.append(reader)
+                monitor.fps = reader.fps
+                width, height = reader.size
+                decoded = "" if reader.decoder is None else \
+                    f", ffmpeg解码到 {reader.decode_size[0]}x{reader.decode_size[1]}"
+                print(f"✓ [{name}] {reader.total_frames}帧, {reader.fps:.2f}fps, {width}x{height}{decoded}")
+            print()
+            if config.OUTPUT_VIDEO:
+                stem, ext = os.path.splitext(config.OUTPUT_VIDEO_PATH)
+                for name, reader in zip(self.names, readers):
+                    writers.append(open_video_writer(f"{stem}_{name}{ext}",
+                                                     reader.fps / (config.SKIP_FRAMES + 1),
+                                                     reader.size, quiet=True))
+                    print(f"✓ [{name}] 视频输出: {os.path.abspath(writers[-1][1])}")
+                print()
+        except Exception:
+            for reader in readers:
+                reader.release()
+            raise
+
+        # 每路每轮取的帧数: 批次总帧数约为 max(BATCH_SIZE, 路数)
+        per_stream = max(1, round(config.BATCH_SIZE / count))
+        print(f"步骤3: 开始检测（每批 {per_stream * count}帧 = {count}路 x {per_stream}帧）...\n")
+
+        # 实时事件流: 各路共用一个输出，事件带 camera 字段
+        event_sink = create_event_sink(config)
+        if event_sink is not None:
+            for name, monitor, reader in zip(self.names, self.monitors, readers):
+                monitor.events = AttentionEvents(event_sink, config, reader.fps, monitor.video_path, name)
+                monitor.events.start(total_frames=reader.total_frames)
+        trackers = [IouTracker() for _ in self.monitors]
+        processed = [0] * count
+        active = list(range(count))
+        timings = self.timings = StageTimings()
+        batches = 0
+        loop_start = time.perf_counter()
+
+        try:
+            while active:
+                # 从各路取帧合成一个批次（等待较慢的一路，使各路进度保持一致）
+                start = time.perf_counter()
+                batch = []
+                for stream in list(active):
+                    for _ in range(per_stream):
+                        item = readers[stream].get()
+                        if item is None:
+                            active.remove(stream)
+                            break
+                        batch.append((stream, *item))
+                inferred = time.perf_counter()
+                timings.add('decode', inferred - start)
+                if not batch:
+                    break
+
+                results = backend.predict([frame for _, _, frame in batch])
+                scored = time.perf_counter()
+                timings.add('inference', scored - inferred)
+
+                for (stream, frame_idx, frame), result in zip(batch, results):
+                    monitor, reader = self.monitors[stream], readers[stream]
+                    start = time.perf_counter()
+                    result = trackers[stream].update(result)
+                    if reader.decoder is not None:
+                        width, height = reader.size
+                        result = result.scaled(width / reader.decode_size[0],
+                                               height / reader.decode_size[1])
+                    tracked = time.perf_counter()
+                    timings.add('tracking', tracked - start)
+
+                    detections = monitor._process_detections(result, frame_idx, reader.fps)
+                    scored = time.perf_counter()
+                    timings.add('scoring', scored - tracked)
+
+                    if writers:
+                        if reader.decoder is not None:
+                            frame = upscale_frame(frame, reader.size)
+                        draw_annotations(frame, detections, config)
+                        drawn = time.perf_counter()
+                        writers[stream][0].write(frame)
+                        timings.add('drawing', drawn - scored)
+                        timings.add('encoding', time.perf_counter() - drawn)
+                    processed[stream] += 1
+
+                batches += 1
+                timings.frames = sum(processed)
+                if batches % 50 == 1:
+                    print(self.format_progress(readers, processed, loop_start))
+
+                if cancel_event is not None and cancel_event.is_set():
+                    self.cancelled = True
+                    print("\n\n已取消，正在保存已处理部分...")
+                    break
+
+        except KeyboardInterrupt:
+            print("\n\n用户中断，正在保存...")
+
+        finally:
+            for reader in readers:
+                reader.release()
+            for writer, path in writers:
+                start = time.perf_counter()
+                writer.release()
+                timings.add('encoding', time.perf_counter() - start)
+                verify_output_video(path)
+            if event_sink is not None:
+                for monitor, frames in zip(self.monitors, processed):
+                    monitor.events.finish(processed_frames=frames)
+                    monitor.events = None
+                event_sink.close()
+                if not event_sink.failed:
+                    print(f"✓ 事件流: 共输出{event_sink.written}条事件 -> {event_sink.target}")
+            if config.DETECTIONS_PATH:
+                stem, ext = os.path.splitext(config.DETECTIONS_PATH)
+                for name, monitor in zip(self.names, self.monitors):
+                    monitor.save_detections(f"{stem}_{name}{ext}")
+
+        wall = time.perf_counter() - loop_start
+        total = sum(processed)
+        print(f"\n✓ 共处理{total}帧 ({', '.join(f'{n}: {p}' for n, p in zip(self.names, processed))}), "
+              f"{batches}批, 平均每批{total / max(1, batches):.1f}帧, {total / max(wall, 1e-9):.1f} fps")
+
+        start = time.perf_counter()
+        reports = {name: monitor.generate_report() for name, monitor in zip(self.names, self.monitors)}
+        combined = combine_reports(reports)
+        timings.add('report', time.perf_counter() - start)
+        timings.wall = time.perf_counter() - loop_start
+        return reports, combined
+
+    def format_progress(self, readers, processed, loop_start):
+        """控制台进度行: 各路进度 + 合计处理帧率"""
+        elapsed = time.perf_counter() - loop_start
+        parts = []
+        for name, reader, count in zip(self.names, readers, processed):
+            done = count * (self.config.SKIP_FRAMES + 1)
+            percent = min(100.0, done / reader.total_frames * 100) if reader.total_frames else 0.0
+            parts.append(f"{name} {percent:.1f}%")
+        fps = sum(processed) / elapsed if elapsed > 0 else 0.0
+        return f"  → 进度: {' | '.join(parts)} | 合计 {fps:.1f} fps"
+
+    def print_reports(self, reports, combined):
+        """各路报告（同 ClassroomMonitor.print_report）+ 合并汇总"""
+        for name, monitor in zip(self.names, self.monitors):
+            print(f"\n########## 机位: {name} ##########")
+            monitor.print_report(reports[name][1])
+
+        _, overview = combined
+        print("="*70)
+        print("多机位合并汇总".center(70))
+        print("="*70)
+        for name, item in overview['streams'].items():
+            print(f"  {name:<20} 不专注学生 {item['students']:>3}人  事件 {item['event_count']:>4}个  "
+                  f"总时长 {item['total_duration_sec']:>8.1f}秒")
+        print(f"  {'合计':<20} 不专注学生 {overview['students']:>3}人  事件 {overview['event_count']:>4}个  "
+              f"总时长 {overview['total_duration_sec']:>8.1f}秒")
+        print("="*70 + "\n")
+
+
+def combine_reports(reports):
+    """合并各路报告
+    返回: (带 camera 列的合并DataFrame 或None, 汇总 {'streams': {名称: 统计}, 'students', 'event_count',
+          'total_duration_sec'})；学生ID只在各路内唯一
+    """
+    import pandas as pd
+
+    frames = []
+    overview = {'streams': {}, 'students': 0, 'event_count': 0, 'total_duration_sec': 0.0}
+    for name, (df, summary) in reports.items():
+        item = {
+            'students': len(summary),
+            'event_count': sum(data['event_count'] for data in summary.values()),
+            'total_duration_sec': round(sum(data['total_duration_sec'] for data in summary.values()), 1),
+        }
+        overview['streams'][name] = item
+        overview['students'] += item['students']
+        overview['event_count'] += item['event_count']
+        overview['total_duration_sec'] = round(overview['total_duration_sec'] + item['total_duration_sec'], 1)
+        if df is not None:
+            frames.append(df.assign(camera=name)[['camera'] + list(df.columns)])
+    combined = pd.concat(frames, ignore_index=True) if frames else None
+    return combined, overview
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+姿态推理后端
+统一封装 ultralytics(PyTorch) 与 ONNX Runtime(CPU) 两种推理方式，
+输出与后端无关的检测结果（检测框 / 关键点 / 跟踪ID）
+"""
+
+import os
+import time
+import shutil
+import hashlib
+
+import cv2
+import numpy as np
+
+
+NUM_KEYPOINTS = 17
+
+
+# ==================== 检测结果 ====================
+class PoseResult:
+    """单帧姿态检测结果（与推理后端无关）
+
+    boxes:     (N, 4) xyxy，原图像素坐标
+    scores:    (N,)   检测置信度
+    keypoints: (N, 17, 3) 关键点 (x, y, conf)，原图像素坐标
+    track_ids: (N,)   跟踪ID，未跟踪时为0
+    """
+
+    __slots__ = ('boxes', 'scores', 'keypoints', 'track_ids', 'orig_img')
+
+    def __init__(self, boxes, scores, keypoints, track_ids=None, orig_img=None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, NUM_KEYPOINTS, 3)
+        if track_ids is None:
+            track_ids = np.zeros(len(self.boxes), dtype=np.int64)
+        self.track_ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        self.orig_img = orig_img
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def scaled(self, sx, sy):
+        """把坐标按 (sx, sy) 缩放（缩小解码的帧 -> 原始分辨率）"""
+        boxes = self.boxes * np.array([sx, sy, sx, sy], dtype=np.float32)
+        keypoints = self.keypoints.copy()
+        keypoints[..., 0] *= sx
+        keypoints[..., 1] *= sy
+        return PoseResult(boxes, self.scores, keypoints, self.track_ids, self.orig_img)
+
+    @classmethod
+    def empty(cls, orig_img=None):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros((0, NUM_KEYPOINTS, 3)),
+                   orig_img=orig_img)
+
+
+# ==================== 前后处理 ====================
+def letterbox(image, new_size=640, color=(114, 114, 114)):
+    """等比缩放并居中填充到 new_size x new_size
+
+    返回: (填充后的图像, 缩放比例, (左侧填充, 顶部填充))
+    """
+    h, w = image.shape[:2]
+    ratio = min(new_size / h, new_size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_w = (new_size - new_w) / 2
+    pad_h = (new_size - new_h) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right,
+                               cv2.BORDER_CONSTANT, value=color)
+    return image, ratio, (left, top)
+
+
+def preprocess(image, img_size):
+    """BGR图像 -> (1, 3, H, W) float32 输入张量"""
+    padded, ratio, pad = letterbox(image, img_size)
+    blob = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+    blob = np.ascontiguousarray(blob, dtype=np.float32)[None] / 255.0
+    return blob, ratio, pad
+
+
+def box_iou(boxes_a, boxes_b):
+    """两组xyxy框的IoU矩阵 (len(a), len(b))"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    lt = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    rb = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def nms(boxes, scores, iou_threshold):
+    """贪心非极大值抑制，返回保留下标（按置信度降序）"""
+    order = np.argsort(scores)[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = box_iou(boxes[i:i + 1], boxes[order[1:]])[0]
+        order = order[1:][ious <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode_pose_output(output, ratio, pad, orig_shape, conf_threshold,
+                       iou_threshold, max_det=300):
+    """解码YOLOv8-pose原始输出 (56, N) -> (boxes, scores, keypoints)
+
+    每列: cx, cy, w, h, person_conf, 17 x (x, y, visibility)
+    """
+    preds = output.T
+    scores = preds[:, 4]
+    mask = scores > conf_threshold
+    preds, scores = preds[mask], scores[mask]
+    if len(preds) == 0:
+        return np.zeros((0, 4)), np.zeros(0), np.zeros((0, NUM_KEYPOINTS, 3))
+
+    cx, cy, w, h = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    keep = nms(boxes, scores, iou_threshold)[:max_det]
+    boxes, scores = boxes[keep], scores[keep]
+    keypoints = preds[keep, 5:].reshape(-1, NUM_KEYPOINTS, 3).copy()
+
+    # 映射回原图坐标
+    pad_x, pad_y = pad
+    img_h, img_w = orig_shape[:2]
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / ratio).clip(0, img_w)
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / ratio).clip(0, img_h)
+    keypoints[..., 0] = ((keypoints[..., 0] - pad_x) / ratio).clip(0, img_w)
+    keypoints[..., 1] = ((keypoints[..., 1] - pad_y) / ratio).clip(0, img_h)
+    return boxes, scores, keypoints
+
+
+# ==================== 轻量跟踪器 ====================
+class IouTracker:
+    """基于IoU贪心匹配的轻量多目标跟踪器（用于不自带跟踪的后端）"""
+
+    def __init__(self, match_threshold=0.3, max_age=30):
+        self.match_threshold = match_threshold
+        self.max_age = max_age
+        self.tracks = {}        # track_id -> bbox
+        self.missed = {}        # track_id -> 连续未匹配帧数
+        self.next_id = 1
+        self.elapsed = 0.0      # 累计跟踪耗时(秒)
+
+    def update(self, result):
+        """为检测结果分配跟踪ID（原地写入 result.track_ids）"""
+        start = time.perf_counter()
+        n = len(result)
+        track_ids = np.zeros(n, dtype=np.int64)
+        matched = set()
+        unmatched = set(range(n))
+
+        if self.tracks and n > 0:
+            ids = list(self.tracks.keys())
+            ious = box_iou(np.array([self.tracks[t] for t in ids]), result.boxes)
+            # 按IoU从高到低贪心匹配
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                t, d = divmod(int(flat), n)
+                if ious[t, d] < self.match_threshold:
+                    break
+                if ids[t] in matched or d not in unmatched:
+                    continue
+                track_ids[d] = ids[t]
+                matched.add(ids[t])
+                unmatched.discard(d)
+
+        # 未匹配的检测开启新轨迹
+        for d in sorted(unmatched):
+            track_ids[d] = self.next_id
+            matched.add(self.next_id)
+            self.next_id += 1
+
+        for d, track_id in enumerate(track_ids):
+            self.tracks[int(track_id)] = result.boxes[d].copy()
+
+        # 清理长时间丢失的轨迹
+        for track_id in list(self.tracks.keys()):
+            if track_id in matched:
+                self.missed[track_id] = 0
+                continue
+            self.missed[track_id] = self.missed.get(track_id, 0) + 1
+            if self.missed[track_id] > self.max_age:
+                del self.tracks[track_id]
+                del self.missed[track_id]
+
+        result.track_ids = track_ids
+        self.elapsed += time.perf_counter() - start
+        return result
+
+    def reset(self):
+        self.tracks.clear()
+        self.missed.clear()
+        self.next_id = 1
+        self.elapsed = 0.0
+
+
+# ==================== ultralytics后端 ====================
+class UltralyticsPoseBackend:
+    """ultralytics / PyTorch 推理后端（自带ByteTrack跟踪）"""
+
+    name = "ultralytics"
+    dynamic_input = True    # 每次调用可使用不同的输入尺寸（修改 imgsz 即可，实时调度降级时使用）
+
+    def __init__(self, model_path, config, imgsz=None):
+        from ultralytics import YOLO
+
+        self.config = config
+        self.imgsz = imgsz or config.IMG_SIZE
+        self.model = YOLO(model_path)
+        self.model.to("cuda" if config.DEVICE == 0 else "cpu")
+        self.tracking_time = 0.0    # 累计跟踪耗时(秒) = 总耗时 - 前处理/推理/后处理耗时
+
+    def _convert(self, result):
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0 or result.keypoints is None:
+            return PoseResult.empty(result.orig_img)
+
+        track_ids = boxes.id.int().cpu().numpy() if boxes.id is not None else None
+        return PoseResult(
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            result.keypoints.data.cpu().numpy(),
+            track_ids,
+            result.orig_img
+        )
+
+    def track(self, frame):
+        """单帧推理 + ByteTrack跟踪"""
+        return self._track(frame)[0]
+
+    def track_batch(self, frames):
+        """批量推理 + 按顺序ByteTrack跟踪（非stream输入共用同一个跟踪器）"""
+        return self._track(list(frames))
+
+    def _track(self, source):
+        start = time.perf_counter()
+        results = self.model.track(
+            source,
+            classes=[0],
+            conf=self.config.CONFIDENCE_THRESHOLD,
+            iou=self.config.IOU_THRESHOLD,
+            imgsz=self.imgsz,
+            persist=True,
+            tracker="bytetrack.yaml",
+            device=self.config.DEVICE,
+            verbose=False
+        )
+        measured = sum(sum(r.speed.values()) for r in results) / 1000
+        self.tracking_time += max(0.0, time.perf_counter() - start - measured)
+        return [self._convert(r) for r in results]
+
+    def predict(self, frames):
+        """批量推理（不跟踪）"""
+        results = self.model.predict(
+            list(frames),
+            classes=[0],
+            conf=self.config.CONFIDENCE_THRESHOLD,
+            iou=self.config.IOU_THRESHOLD,
+            imgsz=self.imgsz,
+            device=self.config.DEVICE,
+            verbose=False
+        )
+        return [self._convert(r) for r in results]
+
+    @property
+    def active_tracks(self):
+        """ByteTrack中处于跟踪状态的轨迹数"""
+        trackers = getattr(self.model.predictor, 'trackers', None)
+        return len(trackers[0].tracked_stracks) if trackers else 0
+
+    def reset(self):
+        """清空ByteTrack跟踪状态（复用已加载的模型处理新视频时调用）"""
+        for tracker in getattr(self.model.predictor, 'trackers', None) or []:
+            tracker.reset()
+        self.tracking_time = 0.0
+
+
+# ==================== ONNX Runtime后端 ====================
+def file_hash(path, length=16):
+    """计算模型文件的SHA256摘要（用于导出缓存）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def export_onnx(model_path, imgsz=640, cache_dir="model_cache"):
+    """将 .pt 模型一次性导出为ONNX，按模型哈希缓存"""
+    if not os.path.exists(model_path):
+        # 本地不存在时由ultralytics自动下载
+        from ultralytics import YOLO
+        YOLO(model_path)
+
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    onnx_path = os.path.join(cache_dir, f"{stem}-{file_hash(model_path)}-{imgsz}.onnx")
+    if os.path.exists(onnx_path):
+        return onnx_path
+
+    print(f"  首次使用，正在导出ONNX模型: {model_path} -> {onnx_path}")
+    from ultralytics import YOLO
+    exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=False)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    shutil.move(str(exported), onnx_path)
+    print(f"✓ ONNX模型已缓存: {os.path.abspath(onnx_path)}")
+    return onnx_path
+
+
+class OnnxPoseBackend:
+    """ONNX Runtime CPU推理后端（原生前后处理，无需torch）"""
+
+    name = "onnx"
+
+    def __init__(self, model_path, config, imgsz=None):
+        import onnxruntime as ort
+
+        self.config = config
+        imgsz = imgsz or config.IMG_SIZE
+        if not model_path.endswith('.onnx'):
+            model_path = export_onnx(model_path, imgsz, config.ONNX_CACHE_DIR)
+        self.model_path = model_path
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.ONNX_THREADS > 0:
+            options.intra_op_num_threads = config.ONNX_THREADS
+        self.session = ort.InferenceSession(
+            model_path, options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+        # 静态导出的模型以输入尺寸为准
+        input_shape = self.session.get_inputs()[0].shape
+        self.imgsz = input_shape[2] if isinstance(input_shape[2], int) else imgsz
+        self.tracker = IouTracker()
+
+    def _infer(self, frame):
+        blob, ratio, pad = preprocess(frame, self.imgsz)
+        output = self.session.run(None, {self.input_name: blob})[0][0]
+        boxes, scores, keypoints = decode_pose_output(
+            output, ratio, pad, frame.shape,
+            self.config.CONFIDENCE_THRESHOLD, self.config.IOU_THRESHOLD
+        )
+        return PoseResult(boxes, scores, keypoints, orig_img=frame)
+
+    def track(self, frame):
+        """单帧推理 + IoU跟踪"""
+        return self.tracker.update(self._infer(frame))
+
+    def track_batch(self, frames):
+        """导出的模型输入为固定batch=1，逐帧推理"""
+        return [self.track(frame) for frame in frames]
+
+    @property
+    def tracking_time(self):
+        return self.tracker.elapsed
+
+    @property
+    def active_tracks(self):
+        return len(self.tracker.tracks)
+
+    def predict(self, frames):
+        """批量推理（不跟踪）"""
+        return [self._infer(frame) for frame in frames]
+
+    def reset(self):
+        """清空跟踪状态"""
+        self.tracker.reset()
+
+
+# ==================== 裁剪精细化 ====================
+def crop_region(box, frame_shape, pad_ratio=0.15):
+    """按比例外扩检测框并裁剪到图像范围内，返回整数 (x1, y1, x2, y2)"""
+    x1, y1, x2, y2 = box
+    pad_w, pad_h = (x2 - x1) * pad_ratio, (y2 - y1) * pad_ratio
+    img_h, img_w = frame_shape[:2]
+    return (int(max(0, x1 - pad_w)), int(max(0, y1 - pad_h)),
+            int(min(img_w, x2 + pad_w)), int(min(img_h, y2 + pad_h)))
+
+
+class CropRefinePoseBackend:
+    """两级推理: 主模型在全帧上检测并跟踪，仅对选中的检测在裁剪区域上
+    用精细模型重新估计关键点，再映射回原图坐标
+
+    select(result, i) 决定第i个检测是否需要精细化
+    """
+
+    def __init__(self, primary, refiner, select, pad_ratio=0.15):
+        self.primary = primary
+        self.refiner = refiner
+        self.select = select
+        self.pad_ratio = pad_ratio
+        self.total_count = 0
+        self.refined_count = 0
+
+    def refine(self, frame, result):
+        indices = [i for i in range(len(result)) if self.select(result, i)]
+        self.total_count += len(result)
+        if not indices:
+            return result
+
+        regions = [crop_region(result.boxes[i], frame.shape, self.pad_ratio) for i in indices]
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+        refined = self.refiner.predict(crops)
+
+        for i, (x1, y1, _, _), crop_result in zip(indices, regions, refined):
+            if len(crop_result) == 0:
+                continue
+            # 取裁剪图中与原检测框重合度最高的人
+            target = result.boxes[i] - np.array([x1, y1, x1, y1], dtype=np.float32)
+            ious = box_iou(target, crop_result.boxes)[0]
+            j = int(np.argmax(ious))
+            if ious[j] < 0.3:
+                continue
+            keypoints = crop_result.keypoints[j].copy()
+            keypoints[:, 0] += x1
+            keypoints[:, 1] += y1
+            result.keypoints[i] = keypoints
+            self.refined_count += 1
+        return result
+
+    def track(self, frame):
+        return self.refine(frame, self.primary.track(frame))
+
+    def track_batch(self, frames):
+        frames = list(frames)
+        return [self.refine(frame, result)
+                for frame, result in zip(frames, self.primary.track_batch(frames))]
+
+    @property
+    def tracking_time(self):
+        return self.primary.tracking_time
+
+    @property
+    def active_tracks(self):
+        return self.primary.active_tracks
+
+    def reset(self):
+        self.primary.reset()
+        self.total_count = self.refined_count = 0
+
+    def predict(self, frames):
+        frames = list(frames)
+        return [self.refine(frame, result)
+                for frame, result in zip(frames, self.primary.predict(frames))]
+
+
+def is_onnx_backend(config, model_path=None):
+    model_path = str(model_path or config.POSE_MODEL)
+    return config.BACKEND == "onnx" or model_path.endswith('.onnx')
+
+
+def create_backend(config, model_path=None, imgsz=None):
+    """根据配置创建推理后端"""
+    model_path = model_path or config.POSE_MODEL
+    if is_onnx_backend(config, model_path):
+        return OnnxPoseBackend(model_path, config, imgsz)
+    return UltralyticsPoseBackend(model_path, config, imgsz)
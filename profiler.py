@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+内置性能剖析（--profile）
+跳过开头的预热帧后，在一段有限的帧窗口内用 cProfile 做确定性剖析，窗口结束时输出:
+  - 折叠调用栈文件（每行 "调用栈 微秒"，可直接交给 flamegraph.pl / speedscope）
+  - 热点汇总 *_top.txt: 推理、专注度计算（状态更新 / 长期行为检测）、事件记录、标注绘制
+    （cv2.getTextSize / putText / rectangle）各自的耗时，以及按自身耗时排序的前N个函数，
+    项目代码与推理库 / 内置函数分开列出
+
+cProfile 会记录C函数调用，cv2.putText、list.append 等也能单独计时；但它只记录调用关系，
+折叠调用栈是按调用边的耗时比例从调用图展开的近似结果。剖析只覆盖主线程（ffmpeg预读线程、
+CPU副本进程中的耗时表现为等待），且会让纯Python代码变慢，适合比较相对比例和版本间的回归
+"""
+
+import os
+import re
+import time
+import cProfile
+import pstats
+from collections import defaultdict
+
+
+TOP_N = 25                  # 汇总中列出的函数数
+MAX_DEPTH = 64              # 折叠调用栈的最大深度
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ==================== 函数匹配 ====================
+def code(filename, *names):
+    """匹配项目代码中的函数（pstats 的键为 (文件路径, 行号, 函数名)）"""
+    return lambda key: key[2] in names and os.path.basename(key[0]) == filename
+
+
+def method(*names):
+    """按名称匹配任意Python函数（推理后端可能来自不同模块，如基准测试的合成后端）"""
+    return lambda key: key[0] != '~' and key[2] in names
+
+
+def builtin(*names):
+    """匹配C函数: cv2.putText 在 cProfile 中显示为 <putText> 或 <built-in method putText>"""
+    pattern = re.compile(r"\b(%s)\b" % '|'.join(map(re.escape, names)))
+    return lambda key: key[0] == '~' and pattern.search(key[2]) is not None
+
+
+def either(*matchers):
+    return lambda key: any(match(key) for match in matchers)
+
+
+# (标签, 被调函数, 调用方(None=除自身外的任意调用方), 缩进层级)
+HOT_PATH = (
+    ('视频解码 (read_frames)', either(code('ca_gpu.py', 'read_frames'),
+                                      code('video_capture.py', 'frames')), None, 0),
+    ('推理 (track / track_batch)', method('track', 'track_batch', 'track_stream'), None, 0),
+    ('专注度计算 calculate_attention_score', code('ca_gpu.py', 'calculate_attention_score'), None, 0),
+    ('StudentStateTracker.update', code('ca_gpu.py', 'update'),
+     code('ca_gpu.py', 'calculate_attention_score'), 1),
+    ('StudentStateTracker.check_long_term_behaviors',
+     code('ca_gpu.py', 'check_long_term_behaviors'), None, 1),
+    ('evaluate_posture_rules', code('ca_gpu.py', 'evaluate_posture_rules'), None, 1),
+    ('事件记录 make_attention_record', code('ca_gpu.py', 'make_attention_record'), None, 0),
+    ('list.append (_process_detections)', builtin('append'),
+     code('ca_gpu.py', '_process_detections'), 1),
+    ('标注绘制 draw_annotations', code('ca_gpu.py', 'draw_annotations'), None, 0),
+    ('cv2.getTextSize', builtin('getTextSize'), code('ca_gpu.py', 'draw_annotations'), 1),
+    ('cv2.putText', builtin('putText'), code('ca_gpu.py', 'draw_annotations'), 1),
+    ('cv2.rectangle', builtin('rectangle'), code('ca_gpu.py', 'draw_annotations'), 1),
+)
+
+
+def function_label(key):
+    filename, lineno, name = key
+    if filename == '~':
+        return name.strip('<>').replace(';', ',')
+    return f"{name} ({os.path.basename(filename)}:{lineno})".replace(';', ',')
+
+
+def is_profiler(key):
+    """剖析器自身的启停调用"""
+    return os.path.abspath(key[0]) == os.path.abspath(__file__) or '_lsprof' in key[2]
+
+
+def is_project_code(key):
+    path = os.path.abspath(key[0])
+    return (key[0] != '~' and path.startswith(PROJECT_DIR + os.sep)
+            and 'site-packages' not in path)
+
+
+# ==================== 统计 ====================
+def edge_time(stats, callee, caller=None):
+    """被调函数在指定调用方下的 (调用次数, 累计耗时秒)
+
+    caller 为 None 时统计除自身以外的全部调用（包括由剖析开始前已在执行的函数发起、
+    没有调用方记录的调用），嵌套 / 递归调用不重复计算
+    """
+    calls, seconds = 0, 0.0
+    for key, (_, nc, _, ct, callers) in stats.items():
+        if not callee(key):
+            continue
+        if caller is None:
+            calls += nc
+            seconds += ct
+            for parent, (_, parent_nc, _, parent_ct) in callers.items():
+                if callee(parent):
+                    calls -= parent_nc
+                    seconds -= parent_ct
+        else:
+            for parent, (_, parent_nc, _, parent_ct) in callers.items():
+                if caller(parent):
+                    calls += parent_nc
+                    seconds += parent_ct
+    return calls, seconds
+
+
+def collapsed_stacks(stats, min_us=1.0):
+    """按调用图展开为折叠调用栈 {栈: 微秒}
+
+    函数被多个调用方调用时，其子树按各调用边的累计耗时比例分摊到对应的栈上
+    """
+    children = defaultdict(list)
+    for key, (_, _, _, _, callers) in stats.items():
+        for parent, (_, _, _, ct) in callers.items():
+            children[parent].append((key, ct))
+
+    stacks = defaultdict(float)
+
+    def walk(key, path, keys, share):
+        _, _, tt, ct, _ = stats[key]
+        path = path + (function_label(key),)
+        stacks[';'.join(path)] += tt * share * 1e6
+        if len(path) >= MAX_DEPTH:
+            return
+        for child, edge_ct in children.get(key, ()):
+            child_ct = stats[child][3]
+            if child in keys or child_ct <= 0:
+                continue
+            child_share = share * min(1.0, edge_ct / child_ct)
+            if child_ct * child_share * 1e6 >= min_us:
+                walk(child, path, keys | {child}, child_share)
+
+    # 开始剖析时已在执行的函数（如 process 本身）不会出现，其调用的函数没有调用方，作为根
+    for key, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            walk(key, (), frozenset((key,)), 1.0)
+    return {stack: us for stack, us in stacks.items() if us >= min_us}
+
+
+# ==================== 帧窗口剖析 ====================
+class FrameProfiler:
+    """在第 warmup 帧之后剖析 frames 帧，结束时写出折叠调用栈和热点汇总
+
+    update(已处理帧数) 在处理循环开始前和每帧结束时调用
+    """
+
+    def __init__(self, path, frames=200, warmup=10):
+        self.path = path
+        self.summary_path = os.path.splitext(path)[0] + '_top.txt'
+        self.frames = max(1, frames)
+        self.warmup = max(0, warmup)
+        self.profile = cProfile.Profile()
+        self.active = False
+        self.finished = False
+        self.start_frame = 0
+        self.profiled = 0
+        self.start_time = 0.0
+        self.wall = 0.0
+
+    def update(self, processed):
+        if self.active:
+            if processed - self.start_frame >= self.frames:
+                self.stop(processed)
+        elif not self.finished and processed >= self.warmup:
+            self.start_frame = processed
+            self.active = True
+            self.start_time = time.perf_counter()
+            self.profile.enable()
+
+    def stop(self, processed):
+        self.profile.disable()
+        self.wall = time.perf_counter() - self.start_time
+        self.active = False
+        self.finished = True
+        self.profiled = processed - self.start_frame
+        self.write()
+
+    def close(self, processed):
+        """处理结束时调用: 窗口未结束则以已剖析的帧输出；一帧也未剖析时给出提示"""
+        if self.active:
+            self.stop(processed)
+        elif not self.finished:
+            print(f"⚠ 性能剖析未执行: 视频只处理了{processed}帧，少于预热帧数{self.warmup}")
+
+    def write(self):
+        if self.profiled == 0:
+            print("⚠ 性能剖析窗口内没有处理任何帧")
+            return
+        stats = {key: value for key, value in pstats.Stats(self.profile).stats.items()
+                 if not is_profiler(key)}
+        stacks = collapsed_stacks(stats)
+        summary = self.summary(stats)
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                for stack, us in sorted(stacks.items()):
+                    f.write(f"{stack} {int(round(us))}\n")
+            with open(self.summary_path, 'w', encoding='utf-8') as f:
+                f.write(summary + '\n')
+        except OSError as e:
+            print(f"⚠ 性能剖析结果保存失败: {e}")
+            return
+        print("\n" + summary)
+        print(f"✓ 折叠调用栈已保存: {os.path.abspath(self.path)}")
+        print(f"✓ 热点汇总已保存: {os.path.abspath(self.summary_path)}\n")
+
+    def summary(self, stats):
+        """热点路径耗时 + 项目代码 / 其他函数各自按自身耗时排序的前 TOP_N 个"""
+        frames = self.profiled
+        lines = [f"性能剖析 (第{self.start_frame}帧起 {frames}帧, 共{self.wall:.2f}秒, "
+                 f"{self.wall / frames * 1000:.2f} ms/帧)",
+                 "", "热点路径 (累计耗时):",
+                 f"  {'':<48} {'ms/帧':>9} {'占比':>7} {'调用/帧':>8}"]
+        for label, callee, caller, level in HOT_PATH:
+            calls, seconds = edge_time(stats, callee, caller)
+            share = seconds / self.wall * 100 if self.wall > 0 else 0.0
+            lines.append(f"  {'  ' * level + label:<48} {seconds / frames * 1000:>9.3f} "
+                         f"{share:>6.1f}% {calls / frames:>8.1f}")
+
+        ranked = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)
+        for title, keep in (("项目代码", is_project_code),
+                            ("推理库 / 第三方 / 内置函数", lambda key: not is_project_code(key))):
+            lines += ["", f"{title} (按自身耗时, 前{TOP_N}个):",
+                      f"  {'自身ms/帧':>10} {'累计ms/帧':>10} {'调用次数':>9}  函数"]
+            for key, (_, nc, tt, ct, _) in [item for item in ranked if keep(item[0])][:TOP_N]:
+                lines.append(f"  {tt / frames * 1000:>10.3f} {ct / frames * 1000:>10.3f} "
+                             f"{nc:>9}  {function_label(key)}")
+        return "\n".join(lines)
+
+
+def create_profiler(path, frames=200, warmup=10):
+    """path 为空时返回None（关闭剖析）"""
+    if not path:
+        return None
+    return FrameProfiler(path, frames, warmup)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+实时调度（截止时间调度）
+在 SKIP_FRAMES 固定采样之外，按每帧延迟预算决定处理哪些帧，使处理进度不落后于视频时间线:
+  - 每个采样帧有截止时间 = 该帧的视频时刻 + 延迟预算；按实测的每帧耗时（推理 + 评分 + 绘制）
+    预计来不及在截止时间前处理完的帧直接跳过（落后过多时每隔 MAX_GAP_SEC 仍强制处理一帧，保持跟踪连续）
+  - 最近一段时间跳过的帧过多时逐级降低画质: 先关闭标签文字（输出视频时），再减小推理输入尺寸；
+    较高画质的实测耗时重新满足预算时逐级恢复
+  - 每次降级 / 恢复都打印并记录（可选写入 JSON Lines 日志），结束时输出跳帧和降级统计
+
+视频时间线从第一个采样帧开始按真实时间推进；文件处理比实时快时不会跳帧，也不会等待
+"""
+
+import json
+import time
+from collections import deque
+
+
+WINDOW = 50                 # 统计跳帧比例的最近决策数
+WARMUP_FRAMES = 5           # 开头不计入耗时统计的处理帧（模型预热）
+EMA_ALPHA = 0.2             # 每帧耗时的指数滑动平均系数
+DEGRADE_SKIP_RATIO = 0.3    # 最近跳过比例超过该值时降级
+RESTORE_HEADROOM = 1.25     # 较高画质的耗时 x 该系数 <= 预算时恢复
+MAX_GAP_SEC = 1.0           # 连续跳过超过该视频时长时强制处理一帧
+
+
+# ==================== 画质等级 ====================
+def quality_levels(config, backend, min_size=320):
+    """从高到低的画质等级 [{'name', 'labels', 'imgsz'}]，每级在上一级基础上再降低一项"""
+    imgsz = getattr(backend, 'imgsz', None) or config.IMG_SIZE
+    levels = [{'name': f"正常 ({imgsz}px)", 'labels': config.SHOW_LABELS, 'imgsz': imgsz}]
+    if config.OUTPUT_VIDEO and config.SHOW_LABELS:
+        levels.append({'name': f"关闭标签文字 ({imgsz}px)", 'labels': False, 'imgsz': imgsz})
+    if getattr(backend, 'dynamic_input', False):
+        labels = levels[-1]['labels']
+        for size in (imgsz * 3 // 4 // 32 * 32, imgsz // 2 // 32 * 32):
+            if min_size <= size < levels[-1]['imgsz']:
+                suffix = "" if labels else ", 无标签"
+                levels.append({'name': f"输入尺寸 {size}px{suffix}", 'labels': labels, 'imgsz': size})
+    return levels
+
+
+# ==================== 截止时间调度 ====================
+class DeadlineScheduler:
+    """逐帧决定处理 / 跳过，并按实测耗时调整画质
+
+    文件处理: should_process(帧号) 为 True 时处理该帧，处理完（含绘制和写入）调用 finish()
+    实时视频源: 采集端已丢弃过时的帧，每帧调用 begin() / finish()，丢弃的帧数用 skip(n) 告知
+    """
+
+    def __init__(self, config, fps, backend=None, log_path=None):
+        self.config = config
+        self.backend = backend
+        self.fps = fps
+        self.period = (config.SKIP_FRAMES + 1) / fps    # 采样帧间隔 = 每帧可用的处理时间
+        self.budget = config.FRAME_BUDGET_MS / 1000 if config.FRAME_BUDGET_MS > 0 else self.period
+        self.cooldown = config.REALTIME_COOLDOWN
+        self.max_skips = max(1, int(MAX_GAP_SEC / self.period))
+        self.log_path = log_path
+
+        self.levels = quality_levels(config, backend, config.REALTIME_MIN_IMG_SIZE)
+        self.original = {'labels': config.SHOW_LABELS,
+                         'imgsz': getattr(backend, 'imgsz', None)}
+        self.level = 0
+        self.costs = {}             # 画质等级 -> 每帧耗时(秒)的滑动平均
+        self.window = deque(maxlen=WINDOW)
+
+        self.start = None
+        self.first_frame = 0
+        self.decided_at = None
+        self.last_change = None
+        self.consecutive = 0
+        self.processed = 0
+        self.skipped = 0
+        self.forced = 0
+        self.max_late = 0.0
+        self.events = []
+
+    # ---------- 逐帧决策 ----------
+    def should_process(self, frame_idx, now=None):
+        """按预计完成时间是否超过截止时间决定是否处理该采样帧"""
+        now = time.perf_counter() if now is None else now
+        if self.start is None:
+            self.start = self.last_change = now
+            self.first_frame = frame_idx
+        deadline = self.start + (frame_idx - self.first_frame) / self.fps + self.budget
+        late = now + self.costs.get(self.level, 0.0) - deadline
+        if late <= 0:
+            self.begin(now)
+            return True
+        if self.consecutive >= self.max_skips:
+            # 跳过也追不上（解码或绘制本身慢于实时），仍定期处理一帧以保持跟踪和计时连续
+            self.forced += 1
+            self.max_late = max(self.max_late, late)
+            self.begin(now)
+            return True
+        self.skip()
+        return False
+
+    def begin(self, now=None):
+        """开始处理一帧"""
+        self.decided_at = time.perf_counter() if now is None else now
+        if self.start is None:
+            self.start = self.last_change = self.decided_at
+        self.consecutive = 0
+        self.window.append(True)
+
+    def skip(self, count=1):
+        """记录跳过（或实时源丢弃）的帧"""
+        self.skipped += count
+        self.consecutive += count
+        self.window.extend([False] * min(count, WINDOW))
+
+    def finish(self, now=None):
+        """一帧处理完成: 更新当前画质的耗时并按需降级 / 恢复"""
+        now = time.perf_counter() if now is None else now
+        self.processed += 1
+        if self.processed > WARMUP_FRAMES:
+            cost = now - self.decided_at
+            previous = self.costs.get(self.level)
+            self.costs[self.level] = cost if previous is None else (
+                previous + EMA_ALPHA * (cost - previous))
+            self._adapt(now)
+
+    # ---------- 画质调整 ----------
+    @property
+    def skip_ratio(self):
+        return self.window.count(False) / len(self.window) if self.window else 0.0
+
+    def _adapt(self, now):
+        if now - self.last_change < self.cooldown or len(self.window) < WINDOW // 2:
+            return
+        limit = min(self.period, self.budget)
+        cost = self.costs[self.level]
+        if self.skip_ratio > DEGRADE_SKIP_RATIO and cost > limit:
+            if self.level + 1 < len(self.levels):
+                self._change(self.level + 1, now, "降级")
+        elif self.level > 0 and self.skip_ratio == 0.0:
+            higher = self.costs.get(self.level - 1)
+            # 较高画质的耗时是降级前测得的；长时间没有跳帧时也试探恢复（负载可能已经降低）
+            if (higher is not None and higher * RESTORE_HEADROOM <= limit) or \
+                    now - self.last_change >= 4 * self.cooldown:
+                self._change(self.level - 1, now, "恢复")
+
+    def _change(self, level, now, action):
+        previous = self.level
+        self.level = level
+        self.apply()
+        self.last_change = now
+        self.window.clear()
+        event = {
+            'action': action,
+            'video_sec': round(now - self.start, 2),
+            'from': self.levels[previous]['name'],
+            'to': self.levels[level]['name'],
+            'cost_ms': round(self.costs.get(previous, 0.0) * 1000, 1),
+            'budget_ms': round(min(self.period, self.budget) * 1000, 1),
+            'skipped': self.skipped,
+            'processed': self.processed,
+        }
+        self.events.append(event)
+        mark = "⚠" if action == "降级" else "✓"
+        print(f"  {mark} 实时调度{action}: {event['from']} -> {event['to']} "
+              f"(每帧 {event['cost_ms']:.1f} ms, 预算 {event['budget_ms']:.1f} ms, "
+              f"已跳过 {self.skipped}帧)")
+        self._log(event)
+
+    def apply(self):
+        """把当前画质等级写入配置 / 推理后端（标签文字在绘制时读取，输入尺寸在推理时读取）"""
+        level = self.levels[self.level]
+        self.config.SHOW_LABELS = level['labels']
+        if getattr(self.backend, 'dynamic_input', False):
+            self.backend.imgsz = level['imgsz']
+
+    def _log(self, event):
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"⚠ 调度日志写入失败: {e}")
+
+    # ---------- 结束 ----------
+    def summary(self):
+        total = self.processed + self.skipped
+        return {
+            'processed': self.processed,
+            'skipped': self.skipped,
+            'skip_ratio': round(self.skipped / total, 4) if total else 0.0,
+            'forced': self.forced,
+            'max_late_ms': round(self.max_late * 1000, 1),
+            'final_level': self.levels[self.level]['name'],
+            'frame_cost_ms': {self.levels[level]['name']: round(cost * 1000, 1)
+                              for level, cost in self.costs.items()},
+            'budget_ms': round(min(self.period, self.budget) * 1000, 1),
+            'events': self.events,
+        }
+
+    def close(self):
+        """恢复原始的标签 / 输入尺寸设置，打印统计并返回 summary()"""
+        self.config.SHOW_LABELS = self.original['labels']
+        if getattr(self.backend, 'dynamic_input', False):
+            self.backend.imgsz = self.original['imgsz']
+        info = self.summary()
+        degrades = sum(1 for event in self.events if event['action'] == "降级")
+        print(f"\n✓ 实时调度: 处理{info['processed']}帧, 跳过{info['skipped']}帧 "
+              f"({info['skip_ratio'] * 100:.1f}%), 降级{degrades}次, 最终画质: {info['final_level']}")
+        if self.forced:
+            print(f"⚠ 处理速度低于实时: 强制处理{self.forced}帧，最多落后截止时间 "
+                  f"{info['max_late_ms']:.0f} ms")
+        return info
+
+
+def create_scheduler(config, fps, backend=None):
+    """未启用 REALTIME 时返回None"""
+    if not config.REALTIME:
+        return None
+    return DeadlineScheduler(config, fps, backend, config.REALTIME_LOG_PATH)
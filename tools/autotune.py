@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+自动调参
+在实际输入视频的开头一段上做短时校准，为本机选择跳帧数、模型、输入尺寸和批大小，使:
+  - 速度: 处理耗时 <= 视频时长 x --target（如0.25: 60分钟的课在15分钟内处理完）
+  - 精度: 与高质量基准设置相比，不专注时间段的区间IoU >= --min-iou
+结果写入配置文件，之后用 python ca_gpu.py video.mp4 --config autotune.json 复用。
+
+步骤:
+  1. 基准: 最后一个模型 + 最大输入尺寸、不跳帧，在校准片段上运行，作为精度参照
+  2. 每个 (模型, 输入尺寸): 不跳帧短时计时各批大小，取吞吐量最高者，得到每个处理帧的耗时
+  3. 按耗时估算满足目标速度的最小跳帧数，在校准片段上实测速度和区间IoU（仍未达标则继续增大跳帧）
+  4. 在同时满足速度和精度的候选中选区间IoU最高者（相同则更快）；都不满足时给出最接近的设置并提示
+
+示例:
+  python tools/autotune.py lecture.mp4 --target 0.25 --min-iou 0.8
+  python tools/autotune.py lecture.mp4 --models yolov8n-pose.pt,yolov8s-pose.pt,yolov8m-pose.pt --imgsz 480,640
+  python tools/autotune.py --synthetic --latency-ms 40 --target 0.5     # 离线演示: 合成视频 + 模拟推理耗时
+"""
+
+import os
+import sys
+import argparse
+import itertools
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ca_gpu import Config, save_config_file
+from benchmark import SyntheticPoseBackend, environment, parse_list, synthetic_video
+from sweep import evaluate, load_backend, make_config, run_once, setting_label
+
+
+# ==================== 测量 ====================
+def run_setting(args, video, setting, batch_size, backend, max_frames=None):
+    """运行一次，返回 run_once 的结果"""
+    config = make_config(args, setting)
+    config.BATCH_SIZE = batch_size
+    if args.synthetic:
+        backend = SyntheticPoseBackend(video['classroom'], setting['skip_frames'] + 1, args.latency_ms)
+    return run_once(args, video, config, backend, max_frames)
+
+
+def time_per_frame(args, video, setting, batch_size, backend):
+    """不跳帧处理前 --timing-frames 帧，返回每个处理帧的耗时(秒)"""
+    wall, frames, _, _ = run_setting(args, video, {**setting, 'skip_frames': 0}, batch_size,
+                                     backend, args.timing_frames)
+    return wall / frames if frames else float('inf')
+
+
+def predicted_skip(cost, fps, target, skips):
+    """每个处理帧耗时 cost 时，处理耗时/视频时长 = cost x fps / (跳帧+1)，取满足目标的最小跳帧数"""
+    for skip in skips:
+        if cost * fps / (skip + 1) <= target:
+            return skip
+    return skips[-1]
+
+
+def measure(args, video, setting, batch_size, backend, baseline_results):
+    """在校准片段上实测一组设置，返回 evaluate 的结果（附批大小和耗时比例）"""
+    wall, frames, records, summary = run_setting(args, video, setting, batch_size, backend)
+    row = evaluate([video], setting, [{'wall': wall, 'frames': frames, 'records': records,
+                                       'summary': summary}], baseline_results)
+    row['batch_size'] = batch_size
+    row['time_ratio'] = round(wall / video['seconds'], 4) if video['seconds'] else 0.0
+    return row
+
+
+# ==================== 选择 ====================
+def choose(candidates, target, min_iou):
+    """返回 (最终设置, 说明)"""
+    fast = [c for c in candidates if c['time_ratio'] <= target]
+    good = [c for c in fast if c['interval_iou'] >= min_iou]
+    if good:
+        return max(good, key=lambda c: (c['interval_iou'], -c['time_ratio'])), None
+    if fast:
+        best = max(fast, key=lambda c: (c['interval_iou'], -c['time_ratio']))
+        return best, f"没有设置能在目标速度下达到区间IoU {min_iou}，已选择该速度下最准确的设置"
+    best = min(candidates, key=lambda c: c['time_ratio'])
+    return best, f"本机无法达到目标速度 {target}x 视频时长，已选择最快的设置"
+
+
+def profile_values(args, row):
+    """最终设置对应的 Config 参数"""
+    setting = row['settings']
+    values = {'SKIP_FRAMES': setting['skip_frames'], 'BATCH_SIZE': row['batch_size']}
+    if not args.synthetic:
+        config = make_config(args, setting)
+        values.update({'POSE_MODEL': config.POSE_MODEL, 'BACKEND': config.BACKEND,
+                       'IMG_SIZE': config.IMG_SIZE, 'CONFIDENCE_THRESHOLD': config.CONFIDENCE_THRESHOLD})
+    values['ATTENTION_SCORE_THRESHOLD'] = args.threshold
+    return values
+
+
+# ==================== 主流程 ====================
+def open_video(args):
+    if args.synthetic:
+        path, classroom = synthetic_video(args.cache_dir, (1280, 720), args.calib_seconds, 25.0,
+                                          args.people, args.seed)
+    else:
+        path, classroom = args.video, None
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"✗ 无法打开视频: {path}")
+        sys.exit(1)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    frames = min(total, int(round(args.calib_seconds * fps)))
+    return {'path': os.path.abspath(path), 'name': os.path.basename(path), 'fps': fps,
+            'frames': frames, 'seconds': frames / fps if fps else 0.0, 'classroom': classroom}
+
+
+def autotune(args):
+    video = open_video(args)
+    args.max_frames = video['frames']
+    if args.synthetic:
+        models, sizes = ['synthetic'], [Config.IMG_SIZE]
+    else:
+        models = [m for m in args.models.split(',') if m.strip()]
+        sizes = sorted(parse_list(args.imgsz))
+    skips = sorted(parse_list(args.skip_frames))
+    batches = sorted(parse_list(args.batch_size))
+
+    def setting_for(model, imgsz, skip=0):
+        return {'skip_frames': skip, 'model': model, 'imgsz': imgsz, 'crop_refine': False,
+                'conf': Config.CONFIDENCE_THRESHOLD}
+
+    print(f"校准片段: {video['name']} 前{video['seconds']:.1f}秒 ({video['frames']}帧)")
+    print(f"目标: 处理耗时 <= {args.target}x 视频时长, 区间IoU >= {args.min_iou}\n")
+
+    # 1. 基准
+    baseline = setting_for(models[-1], sizes[-1])
+    print(f"运行基准: {setting_label(baseline)}")
+    baseline_backend = load_backend(args, baseline)
+    wall, frames, records, summary = run_setting(args, video, baseline, 1, baseline_backend)
+    baseline_results = [{'wall': wall, 'frames': frames, 'records': records, 'summary': summary}]
+    print(f"✓ 基准: 耗时 {wall / video['seconds']:.2f}x 视频时长, "
+          f"{len(summary)}名学生有不专注时段\n")
+
+    # 2-3. 每个 (模型, 输入尺寸) 选批大小和跳帧数并实测
+    candidates = []
+    for model, imgsz in itertools.product(models, sizes):
+        setting = setting_for(model, imgsz)
+        backend = baseline_backend if setting == baseline else load_backend(args, setting)
+        costs = {batch: time_per_frame(args, video, setting, batch, backend) for batch in batches}
+        batch = min(costs, key=costs.get)
+        skip = predicted_skip(costs[batch], video['fps'], args.target, skips)
+        print(f"{os.path.basename(model)} {imgsz}px: 批大小{batch} {costs[batch] * 1000:.1f} ms/帧, "
+              f"预计跳帧{skip}")
+
+        for skip in skips[skips.index(skip):]:
+            row = measure(args, video, {**setting, 'skip_frames': skip}, batch, backend,
+                          baseline_results)
+            candidates.append(row)
+            status = "✓" if row['time_ratio'] <= args.target else "✗"
+            print(f"  {status} 跳帧{skip}: 耗时 {row['time_ratio']:.3f}x 视频时长, "
+                  f"区间IoU {row['interval_iou']:.3f}")
+            if row['time_ratio'] <= args.target:
+                break
+        backend = None  # 加载下一个模型前释放
+
+    # 4. 选择并写入配置文件
+    best, note = choose(candidates, args.target, args.min_iou)
+    values = profile_values(args, best)
+    print(f"\n选择: {setting_label(best['settings'])} 批大小{best['batch_size']}")
+    print(f"  校准片段耗时 {best['time_ratio']:.3f}x 视频时长 "
+          f"(预计处理{args.full_minutes:g}分钟视频约需{best['time_ratio'] * args.full_minutes:.1f}分钟), "
+          f"区间IoU {best['interval_iou']:.3f}")
+    if note:
+        print(f"⚠ {note}")
+
+    tuning = {
+        'video': video['name'],
+        'calibration_seconds': round(video['seconds'], 2),
+        'target_time_ratio': args.target,
+        'min_interval_iou': args.min_iou,
+        'time_ratio': best['time_ratio'],
+        'interval_iou': best['interval_iou'],
+        'meets_target': best['time_ratio'] <= args.target,
+        'meets_accuracy': best['interval_iou'] >= args.min_iou,
+        'baseline': baseline,
+        'candidates': [{'settings': c['settings'], 'batch_size': c['batch_size'],
+                        'time_ratio': c['time_ratio'], 'interval_iou': c['interval_iou'],
+                        'duration_error': c['duration_error']} for c in candidates],
+        'environment': environment(),
+    }
+    save_config_file(args.output, values, tuning=tuning)
+    print(f"\n✓ 配置文件已保存: {os.path.abspath(args.output)}")
+    print(f"  使用: python ca_gpu.py 视频.mp4 --config {args.output}")
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='自动调参: 按目标处理速度和精度预算选择设置')
+    parser.add_argument('video', nargs='?', help='用于校准的实际输入视频')
+    parser.add_argument('--target', type=float, default=0.25,
+                        help='目标处理耗时 / 视频时长(默认0.25)')
+    parser.add_argument('--min-iou', type=float, default=0.8,
+                        help='精度预算: 与基准相比的最小区间IoU(默认0.8)')
+    parser.add_argument('--calib-seconds', type=float, default=60.0, help='校准片段时长(秒)')
+    parser.add_argument('--timing-frames', type=int, default=48, help='计时各批大小时处理的帧数')
+    parser.add_argument('--models', default='yolov8n-pose.pt,yolov8s-pose.pt,yolov8m-pose.pt',
+                        help='候选模型，从小到大，最后一个作为精度基准')
+    parser.add_argument('--imgsz', default='480,640', help='候选输入尺寸')
+    parser.add_argument('--skip-frames', default='0,1,2,3,4,6,8,12', help='候选跳帧数')
+    parser.add_argument('--batch-size', default='1,2,4,8', help='候选批大小')
+    parser.add_argument('--backend', choices=['ultralytics', 'onnx'], default='ultralytics',
+                        help='推理后端')
+    parser.add_argument('--cpu', action='store_true', help='强制使用CPU')
+    parser.add_argument('--threshold', type=int, default=85, help='专注度阈值(与ca_gpu命令行默认值一致)')
+    parser.add_argument('--full-minutes', type=float, default=45.0,
+                        help='用于提示预计耗时的完整视频时长(分钟)')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='使用合成课堂视频（不加载模型，只调跳帧和批大小）')
+    parser.add_argument('--latency-ms', type=float, default=30.0, help='合成模式的模拟推理耗时(毫秒/帧)')
+    parser.add_argument('--people', type=int, default=20, help='合成视频人数')
+    parser.add_argument('--seed', type=int, default=0, help='合成视频随机种子')
+    parser.add_argument('--cache-dir', default='benchmark_videos', help='合成视频缓存目录')
+    parser.add_argument('--verbose', action='store_true', help='显示 ClassroomMonitor 的输出')
+    parser.add_argument('-o', '--output', default='autotune.json', help='输出的配置文件')
+
+    args = parser.parse_args()
+    if not args.video and not args.synthetic:
+        parser.error('请指定校准视频，或使用 --synthetic')
+    autotune(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+端到端性能基准
+生成确定性的合成课堂视频（分辨率 / 时长 / 人数可设），在指定配置下运行 ClassroomMonitor，
+记录各阶段耗时（解码 / 推理 / 跟踪 / 评分 / 绘制 / 编码 / 报告），结果保存为JSON，便于对比不同版本。
+只使用CPU，可离线运行。
+
+模型:
+  synthetic（默认）  不加载模型，直接返回合成视频的真值关键点（可用 --latency-ms 模拟推理耗时），
+                    用于测量推理以外的开销
+  xxx.onnx / xxx.pt 使用真实推理后端
+
+子命令:
+  run      生成（或复用）合成视频并运行基准
+  compare  对比两次基准结果
+
+示例:
+  python tools/benchmark.py run --resolutions 1280x720,1920x1080 --people 10,40 --seconds 20
+  python tools/benchmark.py run --model model_cache/yolov8n-pose.onnx --skip-frames 0,2 -o new.json
+  python tools/benchmark.py compare old.json new.json
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+import contextlib
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ca_gpu import (ClassroomMonitor, Config, build_pose_backend, open_video_writer,
+                    select_device, warm_up_backend)
+from pose_backend import IouTracker, PoseResult
+
+
+# ==================== 合成课堂 ====================
+# COCO 17个关键点相对头顶中心的位置（单位: 人物高度）
+POSE_TEMPLATE = np.array([
+    (0.00, 0.10),                   # 0 鼻子
+    (-0.03, 0.08), (0.03, 0.08),    # 1-2 眼睛
+    (-0.06, 0.09), (0.06, 0.09),    # 3-4 耳朵
+    (-0.14, 0.22), (0.14, 0.22),    # 5-6 肩膀
+    (-0.18, 0.40), (0.18, 0.40),    # 7-8 手肘
+    (-0.10, 0.50), (0.10, 0.50),    # 9-10 手腕
+    (-0.09, 0.58), (0.09, 0.58),    # 11-12 髋部
+    (-0.10, 0.78), (0.10, 0.78),    # 13-14 膝盖
+    (-0.10, 0.97), (0.10, 0.97),    # 15-16 脚踝
+], dtype=np.float32)
+
+SKELETON = [(5, 6), (5, 7), (7, 9), (6, 8), (8, 10), (5, 11), (6, 12), (11, 12),
+            (11, 13), (13, 15), (12, 14), (14, 16)]
+
+# 行为: 专注(轻微晃动) / 周期性低头 / 完全静止(发呆) / 侧身
+BEHAVIORS = ('attentive', 'head_down', 'still', 'turned')
+BEHAVIOR_WEIGHTS = (0.55, 0.2, 0.15, 0.1)
+
+
+class SyntheticClassroom:
+    """确定性的合成课堂: 座位网格（后排在画面上方、更小）+ 每个学生固定的行为模式"""
+
+    def __init__(self, num_people, size, fps, seed=0):
+        self.size = size
+        self.fps = fps
+        width, height = size
+        rng = np.random.default_rng(seed)
+
+        cols = max(1, int(np.ceil(np.sqrt(num_people * width / height))))
+        rows = max(1, int(np.ceil(num_people / cols)))
+        cell_w, cell_h = width / cols, height / rows
+
+        self.people = []
+        for i in range(num_people):
+            row, col = divmod(i, cols)
+            scale = 0.55 + 0.45 * (row + 1) / rows
+            self.people.append({
+                'cx': (col + 0.5 + rng.uniform(-0.1, 0.1)) * cell_w,
+                'top': (row + 0.05) * cell_h,
+                'height': cell_h * 0.9 * scale,
+                'behavior': BEHAVIORS[rng.choice(len(BEHAVIORS), p=BEHAVIOR_WEIGHTS)],
+                'phase': rng.uniform(0, 2 * np.pi),
+                'period': rng.uniform(6.0, 14.0),
+                'color': tuple(int(c) for c in rng.integers(60, 230, 3)),
+            })
+
+        # 带纹理的静态背景（墙面 + 每排课桌），避免编码器把画面压缩得过于理想
+        self.background = np.full((height, width, 3), (200, 205, 210), dtype=np.uint8)
+        self.background += rng.integers(0, 12, (height, width, 3), dtype=np.uint8)
+        for row in range(rows):
+            y = int((row + 0.62) * cell_h)
+            cv2.rectangle(self.background, (0, y), (width, y + max(2, int(cell_h * 0.12))),
+                          (60, 90, 130), -1)
+
+    def pose(self, frame_idx):
+        """第 frame_idx 帧的真值: boxes (N,4), keypoints (N,17,3)，原始分辨率像素坐标"""
+        t = frame_idx / self.fps
+        keypoints = np.zeros((len(self.people), 17, 3), dtype=np.float32)
+        for i, p in enumerate(self.people):
+            offsets = POSE_TEMPLATE.copy()
+            wave = np.sin(2 * np.pi * t / p['period'] + p['phase'])
+            if p['behavior'] != 'still':
+                # 头部每帧的小幅抖动，保证专注的学生不会被判为静止
+                jitter = 0.015 * np.sin(frame_idx * 1.7 + p['phase'])
+                offsets[:5, 0] += 0.02 * wave + jitter
+                offsets[:5, 1] += jitter
+            if p['behavior'] == 'head_down' and wave > 0:
+                offsets[:5, 1] += 0.16          # 鼻子低于肩膀
+            elif p['behavior'] == 'turned':
+                offsets[5, 1] += 0.08
+                offsets[6, 1] -= 0.08           # 肩膀倾斜约30°
+            keypoints[i, :, 0] = p['cx'] + offsets[:, 0] * p['height']
+            keypoints[i, :, 1] = p['top'] + offsets[:, 1] * p['height']
+        keypoints[..., 2] = 0.9
+
+        xy = keypoints[..., :2]
+        boxes = np.concatenate([xy.min(axis=1), xy.max(axis=1)], axis=1)
+        return boxes, keypoints
+
+    def render(self, frame_idx):
+        frame = self.background.copy()
+        _, keypoints = self.pose(frame_idx)
+        for p, kpts in zip(self.people, keypoints):
+            points = kpts[:, :2].astype(np.int32)
+            thickness = max(2, int(p['height'] * 0.03))
+            for a, b in SKELETON:
+                cv2.line(frame, tuple(points[a]), tuple(points[b]), p['color'], thickness)
+            cv2.circle(frame, tuple(points[0]), max(3, int(p['height'] * 0.07)), p['color'], -1)
+        return frame
+
+
+def synthetic_video(cache_dir, resolution, seconds, fps, people, seed=0):
+    """生成（或复用已缓存的）合成课堂视频，返回 (路径, SyntheticClassroom)"""
+    classroom = SyntheticClassroom(people, resolution, fps, seed)
+    width, height = resolution
+    path = os.path.join(cache_dir, f"classroom_{width}x{height}_{seconds:g}s_{fps:g}fps_"
+                                   f"{people}p_seed{seed}.mp4")
+    if os.path.exists(path):
+        return path, classroom
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print(f"生成合成视频: {os.path.basename(path)}")
+    writer, path = open_video_writer(path, fps, resolution, quiet=True)
+    if writer is None:
+        raise RuntimeError(f"无法创建合成视频: {path}")
+    try:
+        for frame_idx in range(int(round(seconds * fps))):
+            writer.write(classroom.render(frame_idx))
+    finally:
+        writer.release()
+    return path, classroom
+
+
+class SyntheticPoseBackend:
+    """按合成视频真值返回姿态的推理后端（不加载模型），跟踪使用 IouTracker
+
+    按调用顺序推算帧号（每次前进 step 帧），与 ClassroomMonitor 的跳帧设置一致
+    """
+
+    name = "synthetic"
+
+    def __init__(self, classroom, step=1, latency_ms=0.0):
+        self.classroom = classroom
+        self.step = step
+        self.latency = latency_ms / 1000
+        self.tracker = IouTracker()
+        self.next_frame = 0
+
+    def _infer(self, frame):
+        boxes, keypoints = self.classroom.pose(self.next_frame)
+        self.next_frame += self.step
+        # 解码端缩小分辨率时，按实际帧尺寸换算坐标
+        sx = frame.shape[1] / self.classroom.size[0]
+        sy = frame.shape[0] / self.classroom.size[1]
+        boxes = boxes * np.array([sx, sy, sx, sy], dtype=np.float32)
+        keypoints = keypoints.copy()
+        keypoints[..., 0] *= sx
+        keypoints[..., 1] *= sy
+        if self.latency > 0:
+            time.sleep(self.latency)
+        return PoseResult(boxes, np.full(len(boxes), 0.9), keypoints, orig_img=frame)
+
+    def track(self, frame):
+        return self.tracker.update(self._infer(frame))
+
+    def track_batch(self, frames):
+        return [self.track(frame) for frame in frames]
+
+    def predict(self, frames):
+        return [self._infer(frame) for frame in frames]
+
+    def reset(self):
+        self.tracker.reset()
+        self.next_frame = 0
+
+    @property
+    def tracking_time(self):
+        return self.tracker.elapsed
+
+
+# ==================== 运行 ====================
+def parse_list(text, cast=int):
+    return [cast(item) for item in str(text).split(',') if item.strip()]
+
+
+def parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def environment():
+    """运行环境信息（用于对比不同机器 / 版本的结果）"""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import onnxruntime
+        ort_version = onnxruntime.__version__
+    except ImportError:
+        ort_version = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'onnxruntime': ort_version,
+    }
+
+
+def make_config(args, skip_frames, batch_size, output_path):
+    config = Config()
+    config.DEVICE = 'cpu'
+    config.SKIP_FRAMES = skip_frames
+    config.BATCH_SIZE = batch_size
+    config.ATTENTION_SCORE_THRESHOLD = args.threshold
+    config.DECODER = args.decoder
+    config.OUTPUT_VIDEO = args.save_video
+    config.OUTPUT_VIDEO_PATH = output_path
+    if args.model != 'synthetic':
+        config.POSE_MODEL = args.model
+        config.BACKEND = 'onnx' if args.model.endswith('.onnx') else 'ultralytics'
+    return config
+
+
+def run_case(args, video_path, classroom, skip_frames, batch_size, backend=None):
+    """运行一次 ClassroomMonitor，返回结果字典"""
+    output_path = os.path.join(args.cache_dir, 'benchmark_annotated.mp4')
+    config = make_config(args, skip_frames, batch_size, output_path)
+    if args.model == 'synthetic':
+        backend = SyntheticPoseBackend(classroom, skip_frames + 1, args.latency_ms)
+
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        monitor = ClassroomMonitor(video_path, config, backend)
+        start = time.perf_counter()
+        _, summary = monitor.process(args.max_frames)
+        wall = time.perf_counter() - start
+
+    timings = monitor.timings.as_dict()
+    frames = timings['frames']
+    video_seconds = frames * (skip_frames + 1) / classroom.fps
+    return {
+        'video': {
+            'resolution': f"{classroom.size[0]}x{classroom.size[1]}",
+            'seconds': args.seconds,
+            'fps': classroom.fps,
+            'people': len(classroom.people),
+        },
+        'settings': {
+            'model': args.model,
+            'device': 'cpu',
+            'skip_frames': skip_frames,
+            'batch_size': batch_size,
+            'threshold': args.threshold,
+            'decoder': args.decoder,
+            'save_video': args.save_video,
+            'latency_ms': args.latency_ms if args.model == 'synthetic' else None,
+        },
+        'frames_processed': frames,
+        'wall_sec': round(wall, 4),
+        'processed_fps': round(frames / wall, 2) if wall > 0 else 0.0,
+        'realtime_factor': round(video_seconds / wall, 3) if wall > 0 else 0.0,
+        'records': len(monitor.attention_records),
+        'students': len(summary or {}),
+        'stages': timings['stages'],
+    }
+
+
+def run_benchmark(args):
+    resolutions = [parse_resolution(r) for r in args.resolutions.split(',')]
+    people_counts = parse_list(args.people)
+    skips = parse_list(args.skip_frames)
+    batch_sizes = parse_list(args.batch_size)
+
+    # 真实模型只加载一次，各用例之间由 process() 重置跟踪状态
+    backend = None
+    if args.model != 'synthetic':
+        config = make_config(args, 0, 1, None)
+        select_device(config)
+        backend = build_pose_backend(config)
+        warm_up_backend(backend, resolutions[0])
+
+    runs = []
+    cases = list(itertools.product(resolutions, people_counts, skips, batch_sizes))
+    for n, (resolution, people, skip, batch) in enumerate(cases, 1):
+        video_path, classroom = synthetic_video(args.cache_dir, resolution, args.seconds,
+                                                args.fps, people, args.seed)
+        repeats = [run_case(args, video_path, classroom, skip, batch, backend)
+                   for _ in range(args.repeat)]
+        result = sorted(repeats, key=lambda r: r['wall_sec'])[len(repeats) // 2]  # 取中位数
+        result['repeats'] = [r['wall_sec'] for r in repeats]
+        runs.append(result)
+        print(f"[{n}/{len(cases)}] {format_run(result)}")
+
+    report = {'environment': environment(), 'runs': runs}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ 基准结果已保存: {os.path.abspath(args.output)}")
+    return report
+
+
+def format_run(run):
+    top = sorted(run['stages'].items(), key=lambda item: -item[1]['total_sec'])[:3]
+    stages = ", ".join(f"{name} {item['per_frame_ms']:.2f}ms" for name, item in top)
+    return (f"{run['video']['resolution']} {run['video']['people']}人 "
+            f"跳帧{run['settings']['skip_frames']} batch{run['settings']['batch_size']}: "
+            f"{run['processed_fps']:.1f} 帧/秒, {run['realtime_factor']:.2f}x实时 | {stages}")
+
+
+# ==================== 对比 ====================
+def run_key(run):
+    video, settings = run['video'], run['settings']
+    return (video['resolution'], video['seconds'], video['people'], settings['model'],
+            settings['skip_frames'], settings['batch_size'], settings['decoder'],
+            settings['save_video'])
+
+
+def compare(old_path, new_path):
+    """按相同的视频和设置逐项对比吞吐量和各阶段每帧耗时"""
+    with open(old_path, encoding='utf-8') as f:
+        old = {run_key(r): r for r in json.load(f)['runs']}
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)['runs']
+
+    matched = 0
+    for run in new:
+        base = old.get(run_key(run))
+        if base is None:
+            continue
+        matched += 1
+        ratio = run['processed_fps'] / base['processed_fps'] if base['processed_fps'] else 0.0
+        print(f"\n{format_run(run)}")
+        print(f"  吞吐量: {base['processed_fps']:.1f} -> {run['processed_fps']:.1f} 帧/秒 "
+              f"({ratio:.2f}x)")
+        for stage, item in run['stages'].items():
+            before = base['stages'].get(stage, {}).get('per_frame_ms', 0.0)
+            after = item['per_frame_ms']
+            if before or after:
+                print(f"  {stage:<10} {before:>8.2f} -> {after:>8.2f} ms/帧")
+    if not matched:
+        print("⚠ 两份结果中没有相同设置的用例")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端性能基准(合成课堂视频, CPU)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help='运行基准')
+    p.add_argument('--resolutions', default='1280x720', help='视频分辨率列表，如 1280x720,1920x1080')
+    p.add_argument('--seconds', type=float, default=10.0, help='视频时长(秒)')
+    p.add_argument('--fps', type=float, default=25.0, help='视频帧率')
+    p.add_argument('--people', default='20', help='人数列表，如 10,40')
+    p.add_argument('--seed', type=int, default=0, help='合成视频随机种子')
+    p.add_argument('--skip-frames', default='2', help='跳帧数列表，如 0,2')
+    p.add_argument('--batch-size', default='1', help='推理批大小列表，如 1,4')
+    p.add_argument('--threshold', type=int, default=85, help='专注度阈值(与ca_gpu命令行默认值一致)')
+    p.add_argument('--model', default='synthetic', help='synthetic 或模型路径(.onnx/.pt)')
+    p.add_argument('--latency-ms', type=float, default=0.0, help='synthetic模型的模拟推理耗时(毫秒/帧)')
+    p.add_argument('--decoder', choices=['auto', 'ffmpeg', 'opencv'], default=Config.DECODER,
+                   help='视频解码方式')
+    p.add_argument('--save-video', action='store_true', help='同时输出标注视频(测量绘制和编码)')
+    p.add_argument('--max-frames', type=int, default=0, help='每个用例最多处理的帧数(0=全部)')
+    p.add_argument('--repeat', type=int, default=1, help='每个用例重复次数(取中位数)')
+    p.add_argument('--cache-dir', default='benchmark_videos', help='合成视频缓存目录')
+    p.add_argument('--verbose', action='store_true', help='显示 ClassroomMonitor 的输出')
+    p.add_argument('-o', '--output', default='benchmark_results.json', help='JSON结果文件')
+
+    p = sub.add_parser('compare', help='对比两次基准结果')
+    p.add_argument('old', help='基准结果(旧)')
+    p.add_argument('new', help='基准结果(新)')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_benchmark(args)
+    else:
+        compare(args.old, args.new)
+
+
+if __name__ == "__main__":
+    main()
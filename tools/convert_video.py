@@ -2,102 +2,223 @@
 """
 视频格式转换工具
 将无法播放的视频转换为兼容性更好的H.264格式
+
+有本地ffmpeg时:
+  - 源视频已是兼容的H.264: 直接流复制（换容器为mp4），不解码
+  - 否则: 按关键帧把视频切成若干段，在进程池中并行用ffmpeg转码，再无损拼接；
+    音频单独转为AAC后一起封装
+没有ffmpeg或ffmpeg转换失败时回退到OpenCV逐帧转换（不含音频）
 """
 
 import cv2
 import sys
 import os
+import shutil
+import argparse
+import tempfile
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def convert_video(input_path, output_path=None, codec='avc1'):
-    """
-    转换视频为兼容格式
-    
-    参数:
-        input_path: 输入视频路径
-        output_path: 输出视频路径（可选，默认添加_converted后缀）
-        codec: 编码器（'avc1'=H.264, 'mp4v'=MPEG-4, 'XVID'=Xvid）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ffmpeg_utils import find_ffmpeg, keyframe_times, probe_video, run_ffmpeg
+
+
+# OpenCV编码器 -> ffmpeg编码器参数
+FFMPEG_CODECS = {
+    'avc1': ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf', '20'],
+    'mp4v': ['-c:v', 'mpeg4', '-q:v', '3'],
+    'XVID': ['-c:v', 'mpeg4', '-vtag', 'xvid', '-q:v', '3'],
+}
+
+# 播放器普遍支持的H.264配置（10bit / 4:2:2 / 4:4:4 需要转码）
+COMPATIBLE_PROFILES = {'Baseline', 'Constrained Baseline', 'Main', 'High'}
+COMPATIBLE_PIX_FMTS = {'yuv420p', 'yuvj420p'}
+
+MIN_SEGMENT_SEC = 10.0   # 并行转码时每段的最短时长，过短的分段只会增加进程开销
+
+
+# ==================== 探测 ====================
+def is_compatible_h264(info):
+    """源视频能否不转码、直接流复制到mp4"""
+    return (info['codec'] == 'h264'
+            and info['pix_fmt'] in COMPATIBLE_PIX_FMTS
+            and (info['profile'] or 'High') in COMPATIBLE_PROFILES)
+
+
+def audio_args(info):
+    """AAC音频直接复制，其他音频转为AAC"""
+    if not info.get('audio_codec'):
+        return ['-an']
+    return ['-c:a', 'copy' if info['audio_codec'] == 'aac' else 'aac']
+
+
+# ==================== ffmpeg 转换 ====================
+def remux(input_path, output_path, info, ffmpeg):
+    """流复制视频（音频按需转AAC），只换容器"""
+    run_ffmpeg(['-i', input_path, '-map', '0:v:0', '-map', '0:a:0?', '-c:v', 'copy',
+                *audio_args(info), '-movflags', '+faststart', output_path], ffmpeg)
+
+
+def plan_segments(keyframes, duration, count):
+    """在关键帧处把 [0, duration] 切成约 count 段，返回 [(起点, 终点)]，最后一段终点为None
+
+    目标切点均匀分布，再对齐到最近的关键帧；每段都从关键帧开始，可独立解码
     """
-    print(f"\n{'='*60}")
-    print("视频格式转换工具".center(60))
-    print(f"{'='*60}\n")
-    
-    # 检查输入文件
-    if not os.path.exists(input_path):
-        print(f"✗ 错误: 文件不存在: {input_path}")
-        return False
-    
-    # 生成输出路径
-    if output_path is None:
-        input_file = Path(input_path)
-        output_path = str(input_file.parent / f"{input_file.stem}_converted.mp4")
-    
-    print(f"输入文件: {input_path}")
-    print(f"输出文件: {output_path}")
-    print(f"编码器: {codec}\n")
-    
-    # 打开输入视频
-    print("步骤1: 读取原始视频...")
+    count = max(1, min(count, int(duration // MIN_SEGMENT_SEC)))
+    cuts = set()
+    for i in range(1, count):
+        target = duration * i / count
+        j = bisect_left(keyframes, target)
+        nearest = min(keyframes[max(0, j - 1):j + 1], key=lambda t: abs(t - target), default=None)
+        if nearest is not None and nearest > 0:
+            cuts.add(nearest)
+    bounds = [0.0] + sorted(cuts)
+    return [(start, end) for start, end in zip(bounds, bounds[1:] + [None])]
+
+
+def transcode_segment(task):
+    """进程池任务: 转码一段视频（不含音频）"""
+    input_path, start, end, output_path, codec_args, preset, threads, ffmpeg = task
+    # 切点略早于关键帧1ms，使相邻两段以同一时刻为界，关键帧只落在后一段
+    args = []
+    if start > 0:
+        args += ['-ss', f'{start - 0.001:.6f}']
+    args += ['-i', input_path]
+    if end is not None:
+        args += ['-t', f'{end - start:.6f}']
+    args += ['-map', '0:v:0', '-an', *codec_args]
+    if codec_args[1] == 'libx264':
+        args += ['-preset', preset]
+    args += ['-threads', str(threads), output_path]
+    run_ffmpeg(args, ffmpeg)
+    return output_path
+
+
+def parallel_transcode(input_path, output_path, info, codec, ffmpeg, workers=0, preset='veryfast'):
+    """按关键帧切段 -> 进程池并行转码 -> concat无损拼接，音频单独转码后封装"""
+    cpus = os.cpu_count() or 1
+    workers = workers or max(1, min(8, cpus // 2))
+    keyframes = keyframe_times(input_path, info['start_time'])
+    segments = plan_segments(keyframes, info['duration'], workers * 2) if keyframes else [(0.0, None)]
+    threads = max(1, cpus // min(workers, len(segments)))
+    print(f"  分段: {len(segments)}段, 并行进程: {min(workers, len(segments))}, "
+          f"每进程线程: {threads}")
+
+    workdir = tempfile.mkdtemp(prefix='convert_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        tasks = [(input_path, start, end, os.path.join(workdir, f'seg{i:04d}.mp4'),
+                  FFMPEG_CODECS[codec], preset, threads, ffmpeg)
+                 for i, (start, end) in enumerate(segments)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            for done, path in enumerate(pool.map(transcode_segment, tasks), 1):
+                print(f"  进度: {done}/{len(tasks)} 段", end='\r')
+        print()
+
+        list_path = os.path.join(workdir, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for task in tasks:
+                f.write(f"file '{task[3]}'\n")
+
+        # 拼接视频的同时从原文件取音频
+        run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', list_path, '-i', input_path,
+                    '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy', *audio_args(info),
+                    '-movflags', '+faststart', output_path], ffmpeg)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ==================== OpenCV 转换 ====================
+def convert_with_opencv(input_path, output_path, codec):
+    """逐帧解码并用 cv2.VideoWriter 重新编码（不含音频）"""
     cap = cv2.VideoCapture(input_path)
-    
+
     if not cap.isOpened():
         print("✗ 无法打开输入视频")
         return False
-    
+
     # 获取视频属性
     fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
+
     print(f"✓ 视频信息: {width}x{height}, {fps:.2f}fps, {total_frames}帧\n")
-    
+
     # 创建输出视频
-    print("步骤2: 创建输出视频...")
+    print("创建输出视频...")
     fourcc = cv2.VideoWriter_fourcc(*codec)
     out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    
+
     if not out.isOpened():
         print(f"✗ 无法创建输出视频（编码器: {codec}）")
         cap.release()
         return False
-    
+
     print(f"✓ 输出视频创建成功\n")
-    
+
     # 逐帧转换
-    print("步骤3: 转换视频帧...")
+    print("转换视频帧...")
     frame_count = 0
-    
+
     try:
         while True:
             ret, frame = cap.read()
             if not ret:
                 break
-            
+
             out.write(frame)
             frame_count += 1
-            
+
             # 显示进度
             if frame_count % 30 == 0:
                 progress = (frame_count / total_frames) * 100
                 print(f"  进度: {progress:.1f}% [{frame_count}/{total_frames}]", end='\r')
-        
+
         print(f"\n✓ 转换完成: {frame_count}帧\n")
-        
+
     except Exception as e:
         print(f"\n✗ 转换出错: {e}")
         return False
-    
+
     finally:
         cap.release()
         out.release()
-    
-    # 验证输出文件
-    print("步骤4: 验证输出文件...")
+
+    return True
+
+
+def convert_with_ffmpeg(input_path, output_path, codec, ffmpeg, workers=0, preset='veryfast',
+                        force_transcode=False):
+    """用本地ffmpeg转换；无法探测源视频时返回False"""
+    info = probe_video(input_path)
+    if info is None:
+        print("⚠ 无法读取视频信息")
+        return False
+
+    print(f"✓ 视频信息: {info['width']}x{info['height']}, {info['fps']:.2f}fps, "
+          f"{info['duration']:.1f}秒, 编码 {info['codec']}"
+          f"{' (' + info['profile'] + ')' if info['profile'] else ''}, {info['pix_fmt']}, "
+          f"音频 {info['audio_codec'] or '无'}\n")
+
+    if codec == 'avc1' and is_compatible_h264(info) and not force_transcode:
+        print("源视频已是兼容的H.264，直接流复制（不重新编码）...")
+        remux(input_path, output_path, info, ffmpeg)
+    else:
+        print(f"按关键帧分段并行转码（{FFMPEG_CODECS[codec][1]}）...")
+        parallel_transcode(input_path, output_path, info, codec, ffmpeg, workers, preset)
+    print("✓ 转换完成\n")
+    return True
+
+
+def verify_output(output_path):
+    """用OpenCV打开输出文件验证"""
+    print("验证输出文件...")
     if os.path.exists(output_path):
         file_size = os.path.getsize(output_path) / (1024 * 1024)
         print(f"✓ 文件大小: {file_size:.2f} MB")
-        
+
         # 尝试打开验证
         test_cap = cv2.VideoCapture(output_path)
         if test_cap.isOpened():
@@ -120,26 +241,81 @@ def convert_video(input_path, output_path=None, codec='avc1'):
         return False
 
 
+def convert_video(input_path, output_path=None, codec='avc1', workers=0, preset='veryfast',
+                  force_transcode=False, use_opencv=False):
+    """
+    转换视频为兼容格式
+
+    参数:
+        input_path: 输入视频路径
+        output_path: 输出视频路径（可选，默认添加_converted后缀）
+        codec: 编码器（'avc1'=H.264, 'mp4v'=MPEG-4, 'XVID'=Xvid）
+        workers: ffmpeg并行转码进程数（0=自动）
+        preset: libx264编码速度预设
+        force_transcode: 即使源视频兼容也重新编码
+        use_opencv: 不使用ffmpeg，强制OpenCV逐帧转换
+    """
+    print(f"\n{'='*60}")
+    print("视频格式转换工具".center(60))
+    print(f"{'='*60}\n")
+
+    # 检查输入文件
+    if not os.path.exists(input_path):
+        print(f"✗ 错误: 文件不存在: {input_path}")
+        return False
+
+    # 生成输出路径
+    if output_path is None:
+        input_file = Path(input_path)
+        output_path = str(input_file.parent / f"{input_file.stem}_converted.mp4")
+
+    ffmpeg = None if use_opencv else find_ffmpeg()
+    print(f"输入文件: {input_path}")
+    print(f"输出文件: {output_path}")
+    print(f"编码器: {codec}")
+    print(f"转换方式: {'ffmpeg ' + ffmpeg if ffmpeg else 'OpenCV'}\n")
+
+    converted = False
+    if ffmpeg and codec in FFMPEG_CODECS:
+        try:
+            converted = convert_with_ffmpeg(input_path, output_path, codec, ffmpeg,
+                                            workers, preset, force_transcode)
+        except RuntimeError as e:
+            print(f"\n⚠ ffmpeg转换失败，回退到OpenCV: {e}\n")
+    if not converted:
+        if not convert_with_opencv(input_path, output_path, codec):
+            return False
+
+    return verify_output(output_path)
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("用法: python convert_video.py <输入视频> [输出视频] [编码器]")
-        print("\n编码器选项:")
-        print("  avc1  - H.264 (推荐，兼容性最好)")
-        print("  mp4v  - MPEG-4")
-        print("  XVID  - Xvid")
-        print("\n示例:")
-        print("  python convert_video.py output_annotated.mp4")
-        print("  python convert_video.py input.mp4 output.mp4 avc1")
-        sys.exit(1)
-    
-    input_path = sys.argv[1]
-    output_path = sys.argv[2] if len(sys.argv) > 2 else None
-    codec = sys.argv[3] if len(sys.argv) > 3 else 'avc1'
-    
-    success = convert_video(input_path, output_path, codec)
+    parser = argparse.ArgumentParser(
+        description='视频格式转换工具',
+        epilog="编码器选项:\n"
+               "  avc1  - H.264 (推荐，兼容性最好)\n"
+               "  mp4v  - MPEG-4\n"
+               "  XVID  - Xvid\n\n"
+               "示例:\n"
+               "  python convert_video.py output_annotated.mp4\n"
+               "  python convert_video.py input.mp4 output.mp4 avc1\n"
+               "  python convert_video.py phone.mov --workers 8",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('input_path', help='输入视频')
+    parser.add_argument('output_path', nargs='?', default=None, help='输出视频(默认添加_converted后缀)')
+    parser.add_argument('codec', nargs='?', default='avc1', choices=['avc1', 'mp4v', 'XVID'],
+                        help='编码器(默认avc1)')
+    parser.add_argument('--workers', type=int, default=0, help='ffmpeg并行转码进程数(0=自动)')
+    parser.add_argument('--preset', default='veryfast', help='libx264编码速度预设(默认veryfast)')
+    parser.add_argument('--force-transcode', action='store_true', help='即使源视频兼容也重新编码')
+    parser.add_argument('--opencv', action='store_true', help='不使用ffmpeg，用OpenCV逐帧转换')
+    args = parser.parse_args()
+
+    success = convert_video(args.input_path, args.output_path, args.codec, args.workers,
+                            args.preset, args.force_transcode, args.opencv)
     sys.exit(0 if success else 1)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+姿态模型INT8量化工具
+从课堂视频中采样校准帧，对ONNX模型做训练后静态量化(PTQ)，
+并输出与FP32模型的精度对比报告和CPU吞吐量对比
+
+子命令:
+  quantize   采样校准帧 -> 生成INT8模型 -> 精度报告 + 吞吐量对比
+  benchmark  在同一CPU上对比FP32与INT8模型的推理吞吐量
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import re
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ca_gpu import ClassroomMonitor, Config
+from pose_backend import OnnxPoseBackend, export_onnx, preprocess
+from evaluation import compare_keypoints, compare_attention_records
+
+
+# ==================== 校准数据 ====================
+def sample_frames(video_paths, num_frames, offset=0.0):
+    """从多个视频中均匀采样帧
+
+    offset: 采样位置在相邻采样间隔内的相对偏移(0~1)，用于区分校准集和评估集
+    """
+    per_video = max(1, num_frames // len(video_paths))
+    frames = []
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"⚠ 无法打开视频，已跳过: {path}")
+            continue
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, total // per_video)
+        for k in range(per_video):
+            idx = min(total - 1, int((k + offset) * step))
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+        cap.release()
+    return frames
+
+
+class FrameCalibrationReader:
+    """ONNX Runtime量化校准数据读取器（使用与推理相同的letterbox预处理）"""
+
+    def __init__(self, frames, input_name, img_size):
+        self.input_name = input_name
+        self.img_size = img_size
+        self._iter = iter(frames)
+
+    def get_next(self):
+        frame = next(self._iter, None)
+        if frame is None:
+            return None
+        blob, _, _ = preprocess(frame, self.img_size)
+        return {self.input_name: blob}
+
+    def rewind(self):
+        pass
+
+
+def head_nodes_to_exclude(onnx_path):
+    """返回检测头中的非卷积节点（框/关键点解码部分保持FP32精度）"""
+    import onnx
+
+    model = onnx.load(onnx_path)
+    indices = {}
+    for node in model.graph.node:
+        m = re.match(r'^/model\.(\d+)/', node.name)
+        if m:
+            indices[node.name] = int(m.group(1))
+    if not indices:
+        return []
+
+    head = max(indices.values())
+    return [node.name for node in model.graph.node
+            if indices.get(node.name) == head and node.op_type != 'Conv']
+
+
+# ==================== 量化 ====================
+def quantize_model(fp32_path, int8_path, calib_frames, img_size, per_channel=True,
+                   exclude_head=True):
+    """静态量化: 权重INT8(按通道) + 激活UINT8, QDQ格式"""
+    from onnxruntime.quantization import (CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(
+        fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    prepared_path = os.path.splitext(int8_path)[0] + "-prep.onnx"
+    quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+
+    excluded = head_nodes_to_exclude(prepared_path) if exclude_head else []
+    print(f"  校准帧: {len(calib_frames)} | 检测头保持FP32节点: {len(excluded)}")
+
+    quantize_static(
+        prepared_path,
+        int8_path,
+        FrameCalibrationReader(calib_frames, input_name, img_size),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=excluded
+    )
+    os.remove(prepared_path)
+    return int8_path
+
+
+# ==================== 精度 / 吞吐量 ====================
+def make_config(model_path, threads=0):
+    config = Config()
+    config.BACKEND = "onnx"
+    config.POSE_MODEL = model_path
+    config.ONNX_THREADS = threads
+    config.OUTPUT_VIDEO = False
+    return config
+
+
+def benchmark(model_paths, frames, threads=0, warmup=5):
+    """在同一批帧上测量各模型的单帧推理延迟"""
+    report = {}
+    for label, path in model_paths.items():
+        backend = OnnxPoseBackend(path, make_config(path, threads))
+        for frame in frames[:warmup]:
+            backend.predict([frame])
+
+        latencies = []
+        for frame in frames:
+            start = time.perf_counter()
+            backend.predict([frame])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        report[label] = {
+            'model': path,
+            'frames': len(frames),
+            'latency_ms_mean': round(float(np.mean(latencies)), 2),
+            'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+            'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2),
+            'fps': round(1000 / float(np.mean(latencies)), 2),
+        }
+        print(f"  {label}: {report[label]['latency_ms_mean']} ms/帧, "
+              f"{report[label]['fps']} fps")
+
+    if 'fp32' in report and 'int8' in report:
+        report['speedup'] = round(report['int8']['fps'] / report['fp32']['fps'], 3)
+        print(f"  INT8加速比: {report['speedup']}x")
+    return report
+
+
+def keypoint_report(fp32_path, int8_path, frames, threads=0):
+    """逐帧比较FP32与INT8的检测框与关键点"""
+    fp32 = OnnxPoseBackend(fp32_path, make_config(fp32_path, threads))
+    int8 = OnnxPoseBackend(int8_path, make_config(int8_path, threads))
+    return compare_keypoints(fp32.predict(frames), int8.predict(frames))
+
+
+def attention_report(fp32_path, int8_path, video_path, max_frames, threads=0):
+    """分别用FP32/INT8模型跑完整检测流程，比较 attention_records"""
+    records = {}
+    for label, path in (('fp32', fp32_path), ('int8', int8_path)):
+        print(f"\n  运行{label.upper()}模型完整流程: {video_path}")
+        monitor = ClassroomMonitor(video_path, make_config(path, threads))
+        monitor.process(max_frames)
+        records[label] = monitor.attention_records
+    return compare_attention_records(records['fp32'], records['int8'])
+
+
+# ==================== 子命令 ====================
+def cmd_quantize(args):
+    fp32_path = args.model
+    if not fp32_path.endswith('.onnx'):
+        print("步骤1: 导出FP32 ONNX模型...")
+        fp32_path = export_onnx(fp32_path, args.imgsz, Config.ONNX_CACHE_DIR)
+    int8_path = args.output or os.path.splitext(fp32_path)[0] + "-int8.onnx"
+
+    print("\n步骤2: 采样校准帧...")
+    calib_frames = sample_frames(args.videos, args.calib_frames)
+    if not calib_frames:
+        print("✗ 未采样到任何校准帧")
+        return 1
+
+    print("\n步骤3: INT8静态量化...")
+    quantize_model(fp32_path, int8_path, calib_frames, args.imgsz,
+                   per_channel=not args.per_tensor, exclude_head=not args.quantize_head)
+    print(f"✓ INT8模型已保存: {os.path.abspath(int8_path)}")
+
+    print("\n步骤4: 精度对比...")
+    eval_frames = sample_frames(args.videos, args.eval_frames, offset=0.5)
+    report = {
+        'fp32_model': fp32_path,
+        'int8_model': int8_path,
+        'calibration_frames': len(calib_frames),
+        'keypoints': keypoint_report(fp32_path, int8_path, eval_frames, args.threads),
+    }
+    if not args.skip_records:
+        report['attention_records'] = attention_report(
+            fp32_path, int8_path, args.videos[0], args.max_frames, args.threads)
+
+    print("\n步骤5: 吞吐量对比...")
+    report['benchmark'] = benchmark({'fp32': fp32_path, 'int8': int8_path},
+                                    eval_frames, args.threads)
+
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    kp = report['keypoints']
+    print(f"\n✓ 关键点平均误差: {kp['keypoint_error_px_mean']}px "
+          f"(归一化 {kp['keypoint_error_norm_mean']}) | 检测召回率: {kp['detection_recall']}")
+    if 'attention_records' in report:
+        print(f"✓ 不专注事件F1: {report['attention_records']['event_f1']}")
+    print(f"✓ 精度报告已保存: {os.path.abspath(args.report)}")
+    print(f"\n使用INT8模型: python ca_gpu.py video.mp4 --model {int8_path}")
+    return 0
+
+
+def cmd_benchmark(args):
+    frames = sample_frames(args.videos, args.frames)
+    if not frames:
+        print("✗ 未采样到任何测试帧")
+        return 1
+    report = benchmark({'fp32': args.fp32, 'int8': args.int8}, frames, args.threads)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✓ 吞吐量报告已保存: {os.path.abspath(args.report)}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='姿态模型INT8量化工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+示例:
+  # 用两段课堂视频校准并量化
+  python tools/quantize_model.py quantize class1.mp4 class2.mp4
+
+  # 对比FP32/INT8吞吐量
+  python tools/quantize_model.py benchmark class1.mp4 --fp32 a.onnx --int8 a-int8.onnx
+        '''
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    q = sub.add_parser('quantize', help='采样校准帧并生成INT8模型')
+    q.add_argument('videos', nargs='+', help='校准用课堂视频')
+    q.add_argument('--model', default=Config.POSE_MODEL, help='FP32模型(.pt或.onnx)')
+    q.add_argument('-o', '--output', default=None, help='INT8模型输出路径')
+    q.add_argument('--imgsz', type=int, default=Config.IMG_SIZE, help='模型输入尺寸')
+    q.add_argument('--calib-frames', type=int, default=200, help='校准帧数(默认200)')
+    q.add_argument('--eval-frames', type=int, default=100, help='精度评估帧数(默认100)')
+    q.add_argument('--max-frames', type=int, default=1500,
+                   help='attention_records对比时处理的最大帧数(默认1500)')
+    q.add_argument('--skip-records', action='store_true', help='跳过完整流程对比')
+    q.add_argument('--per-tensor', action='store_true', help='按张量量化权重(默认按通道)')
+    q.add_argument('--quantize-head', action='store_true', help='检测头解码部分也量化')
+    q.add_argument('--threads', type=int, default=0, help='ONNX Runtime线程数(0=自动)')
+    q.add_argument('--report', default='quantization_report.json', help='精度报告路径')
+    q.set_defaults(func=cmd_quantize)
+
+    b = sub.add_parser('benchmark', help='对比FP32与INT8吞吐量')
+    b.add_argument('videos', nargs='+', help='测试视频')
+    b.add_argument('--fp32', required=True, help='FP32 ONNX模型')
+    b.add_argument('--int8', required=True, help='INT8 ONNX模型')
+    b.add_argument('--frames', type=int, default=100, help='测试帧数(默认100)')
+    b.add_argument('--threads', type=int, default=0, help='ONNX Runtime线程数(0=自动)')
+    b.add_argument('--report', default=None, help='吞吐量报告路径(JSON)')
+    b.set_defaults(func=cmd_benchmark)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
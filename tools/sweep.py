@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+精度-速度参数扫描
+在参考视频集上按参数网格运行完整流程，网格维度:
+  跳帧数 / 姿态模型 / 模型输入尺寸 / 双分辨率裁剪(开/关) / 检测置信度阈值
+每组参数记录吞吐量，并与高质量基准运行（默认不跳帧、最后一个模型、最大输入尺寸）对比:
+  - 区间IoU: 每个学生不专注时间段（time_ranges）与基准的重叠时长 / 并集时长
+  - 时长误差: 总不专注时长的相对误差，以及每个学生总时长的平均绝对误差
+最后输出帕累托前沿（不存在另一组参数同时更快且更准）表格，完整结果保存为JSON。
+
+"分块检测"在本项目中对应双分辨率模式(--crop-refine): 低分辨率检测全帧，
+远处小目标在原图高分辨率裁剪上估计姿态；开启时输入尺寸维度作用于全帧检测。
+
+示例:
+  python tools/sweep.py videos/*.mp4 --models yolov8n-pose.pt,yolov8s-pose.pt,yolov8m-pose.pt
+  python tools/sweep.py videos/*.mp4 --backend onnx --imgsz 480,640 --conf 0.25,0.5 --crop-refine off,on
+  python tools/sweep.py --synthetic --skip-frames 0,1,2,4,8      # 合成视频 + 真值姿态，只扫描跳帧
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import itertools
+import contextlib
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ca_gpu import ClassroomMonitor, Config, build_pose_backend, select_device, warm_up_backend
+from evaluation import compare_time_ranges, match_students
+from benchmark import SyntheticPoseBackend, environment, parse_list, synthetic_video
+
+
+AXES = ('skip_frames', 'model', 'imgsz', 'crop_refine', 'conf')
+
+
+# ==================== 参数网格 ====================
+def parse_switch(text):
+    values = {'off': False, 'on': True, '0': False, '1': True}
+    return [values[item.strip().lower()] for item in text.split(',') if item.strip()]
+
+
+def build_grid(args):
+    """返回 (基准设置, [设置, ...])，设置为 AXES 各维度取值的字典"""
+    if args.synthetic:
+        # 合成后端直接返回真值姿态，模型相关维度没有意义
+        models, sizes, crops = ['synthetic'], [Config.IMG_SIZE], [False]
+        confs = [Config.CONFIDENCE_THRESHOLD]
+    else:
+        models = [m for m in args.models.split(',') if m.strip()]
+        sizes = parse_list(args.imgsz)
+        crops = parse_switch(args.crop_refine)
+        confs = parse_list(args.conf, float)
+
+    grid = [dict(zip(AXES, values)) for values in
+            itertools.product(parse_list(args.skip_frames), models, sizes, crops, confs)]
+    baseline = {
+        'skip_frames': 0,
+        'model': args.baseline_model or models[-1],
+        'imgsz': args.baseline_imgsz or max(sizes),
+        'crop_refine': False,
+        'conf': args.baseline_conf if args.baseline_conf is not None else min(confs),
+    }
+    return baseline, grid
+
+
+def setting_label(setting):
+    crop = "裁剪" if setting['crop_refine'] else "-"
+    return (f"跳帧{setting['skip_frames']} {os.path.basename(setting['model'])} "
+            f"{setting['imgsz']}px {crop} conf{setting['conf']:g}")
+
+
+def make_config(args, setting):
+    config = Config()
+    if args.cpu or args.synthetic:
+        config.DEVICE = 'cpu'
+    config.OUTPUT_VIDEO = False
+    config.ATTENTION_SCORE_THRESHOLD = args.threshold
+    config.SKIP_FRAMES = setting['skip_frames']
+    config.IMG_SIZE = setting['imgsz']
+    config.CROP_REFINE = setting['crop_refine']
+    config.CROP_DETECT_IMG_SIZE = setting['imgsz']
+    config.CONFIDENCE_THRESHOLD = setting['conf']
+    if not args.synthetic:
+        config.POSE_MODEL = setting['model']
+        config.BACKEND = 'onnx' if args.backend == 'onnx' or setting['model'].endswith('.onnx') \
+            else 'ultralytics'
+    return config
+
+
+def backend_group(setting):
+    """除跳帧外的维度相同即可复用同一个已加载的推理后端"""
+    return tuple(setting[axis] for axis in AXES if axis != 'skip_frames')
+
+
+# ==================== 运行 ====================
+def video_duration(video_path, max_frames=0):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if max_frames > 0:
+        frames = min(frames, max_frames)
+    return frames / fps if fps else 0.0
+
+
+def run_once(args, video, config, backend, max_frames=None):
+    """运行一次完整流程，返回 (耗时, 处理帧数, 不专注记录, summary)"""
+    max_frames = args.max_frames if max_frames is None else max_frames
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    with quiet:
+        monitor = ClassroomMonitor(video['path'], config, backend)
+        start = time.perf_counter()
+        _, summary = monitor.process(max_frames)
+        wall = time.perf_counter() - start
+    return wall, monitor.timings.frames, monitor.attention_records, summary or {}
+
+
+def run_setting(args, videos, setting, backend=None):
+    """在全部参考视频上运行一组设置，返回每个视频的原始结果"""
+    config = make_config(args, setting)
+    results = []
+    for video in videos:
+        if args.synthetic:
+            backend = SyntheticPoseBackend(video['classroom'], setting['skip_frames'] + 1)
+        wall, frames, records, summary = run_once(args, video, config, backend)
+        results.append({'wall': wall, 'frames': frames, 'records': records, 'summary': summary})
+    return results
+
+
+def load_backend(args, setting):
+    if args.synthetic:
+        return None
+    config = make_config(args, setting)
+    with contextlib.redirect_stdout(io.StringIO()):
+        select_device(config)
+        backend = build_pose_backend(config)
+        warm_up_backend(backend)
+    return backend
+
+
+def evaluate(videos, setting, results, baseline_results):
+    """汇总一组设置在全部视频上的吞吐量和与基准的一致性"""
+    wall = sum(r['wall'] for r in results)
+    frames = sum(r['frames'] for r in results)
+    seconds = sum(video['seconds'] for video in videos)
+
+    overlap = union = ref_total = test_total = mae_sum = 0.0
+    students = 0
+    per_video = []
+    for video, result, base in zip(videos, results, baseline_results):
+        id_map = match_students(base['records'], result['records'])
+        agreement = compare_time_ranges(base['summary'], result['summary'], id_map)
+        overlap += agreement['overlap_sec']
+        union += agreement['union_sec']
+        ref_total += agreement['ref_duration_sec']
+        test_total += agreement['test_duration_sec']
+        count = len(base['summary'].keys() | result['summary'].keys())
+        mae_sum += agreement['duration_mae_sec'] * count
+        students += count
+        per_video.append({'video': video['name'], 'wall_sec': round(result['wall'], 3), **agreement})
+
+    return {
+        'settings': setting,
+        'frames_processed': frames,
+        'wall_sec': round(wall, 3),
+        'processed_fps': round(frames / wall, 2) if wall > 0 else 0.0,
+        'realtime_factor': round(seconds / wall, 3) if wall > 0 else 0.0,
+        'interval_iou': round(overlap / union, 4) if union else 1.0,
+        'duration_error': round(abs(test_total - ref_total) / ref_total, 4) if ref_total
+                          else (0.0 if test_total == 0 else 1.0),
+        'duration_mae_sec': round(mae_sum / students, 2) if students else 0.0,
+        'videos': per_video,
+    }
+
+
+def pareto_front(rows, speed='realtime_factor', quality='interval_iou'):
+    """标记帕累托最优的设置: 没有其他设置在速度和一致性上都不差且至少一项更好"""
+    for row in rows:
+        row['pareto'] = not any(
+            other[speed] >= row[speed] and other[quality] >= row[quality]
+            and (other[speed] > row[speed] or other[quality] > row[quality])
+            for other in rows
+        )
+    return [row for row in rows if row['pareto']]
+
+
+def format_table(rows):
+    lines = [f"  {'':<2}{'设置':<46} {'实时倍数':>8} {'帧/秒':>8} {'区间IoU':>8} "
+             f"{'时长误差':>8} {'时长MAE':>8}"]
+    for row in rows:
+        mark = "★" if row.get('pareto') else ""
+        lines.append(f"  {mark:<2}{setting_label(row['settings']):<46} {row['realtime_factor']:>7.2f}x "
+                     f"{row['processed_fps']:>8.1f} {row['interval_iou']:>8.3f} "
+                     f"{row['duration_error'] * 100:>7.1f}% {row['duration_mae_sec']:>7.1f}s")
+    return "\n".join(lines)
+
+
+def load_videos(args):
+    if args.synthetic:
+        path, classroom = synthetic_video(args.cache_dir, (1280, 720), args.seconds, 25.0,
+                                          args.people, args.seed)
+        paths = [(path, classroom)]
+    else:
+        paths = [(path, None) for path in args.videos]
+
+    videos = []
+    for path, classroom in paths:
+        seconds = video_duration(path, args.max_frames)
+        if seconds <= 0:
+            print(f"⚠ 无法读取视频，已跳过: {path}")
+            continue
+        videos.append({'path': os.path.abspath(path), 'name': os.path.basename(path),
+                       'seconds': seconds, 'classroom': classroom})
+    return videos
+
+
+def run_sweep(args):
+    videos = load_videos(args)
+    if not videos:
+        print("✗ 没有可用的参考视频")
+        sys.exit(1)
+    baseline, grid = build_grid(args)
+    print(f"参考视频: {len(videos)}个, 共{sum(v['seconds'] for v in videos):.1f}秒")
+    print(f"基准设置: {setting_label(baseline)}")
+    print(f"参数组合: {len(grid)}组\n")
+
+    # 按推理后端分组，每个模型配置只加载一次
+    print("运行基准...")
+    baseline_backend = load_backend(args, baseline)
+    baseline_results = run_setting(args, videos, baseline, baseline_backend)
+    baseline_row = evaluate(videos, baseline, baseline_results, baseline_results)
+    print(f"✓ 基准: {baseline_row['realtime_factor']:.2f}x实时, "
+          f"不专注总时长 {sum(v['ref_duration_sec'] for v in baseline_row['videos']):.1f}秒\n")
+
+    rows = []
+    n = 0
+    grid.sort(key=lambda setting: (backend_group(setting), setting['skip_frames']))
+    for group, settings in itertools.groupby(grid, key=backend_group):
+        settings = list(settings)
+        backend = (baseline_backend if group == backend_group(baseline)
+                   else load_backend(args, settings[0]))
+        for setting in settings:
+            n += 1
+            if setting == baseline:
+                row = baseline_row
+            else:
+                row = evaluate(videos, setting, run_setting(args, videos, setting, backend),
+                               baseline_results)
+            rows.append(row)
+            print(f"[{n}/{len(grid)}] {setting_label(setting)}: {row['realtime_factor']:.2f}x实时, "
+                  f"区间IoU {row['interval_iou']:.3f}")
+
+    front = pareto_front(rows)
+    rows.sort(key=lambda row: -row['realtime_factor'])
+    front.sort(key=lambda row: -row['realtime_factor'])
+    print("\n全部设置 (★=帕累托前沿):")
+    print(format_table(rows))
+    print(f"\n帕累托前沿 ({len(front)}组, 按速度排序; 区间IoU越高越接近基准):")
+    print(format_table(front))
+
+    if args.output:
+        report = {'environment': environment(), 'baseline': baseline, 'videos': [v['name'] for v in videos],
+                  'runs': rows, 'pareto': [row['settings'] for row in front]}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ 扫描结果已保存: {os.path.abspath(args.output)}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='精度-速度参数扫描(帕累托前沿)')
+    parser.add_argument('videos', nargs='*', help='参考视频')
+    parser.add_argument('--skip-frames', default='0,1,2,4', help='跳帧数列表')
+    parser.add_argument('--models', default=Config.POSE_MODEL, help='姿态模型列表(.pt/.onnx)')
+    parser.add_argument('--imgsz', default=str(Config.IMG_SIZE), help='模型输入尺寸列表，如 480,640')
+    parser.add_argument('--crop-refine', default='off', help='双分辨率裁剪: off / on / off,on')
+    parser.add_argument('--conf', default=str(Config.CONFIDENCE_THRESHOLD), help='检测置信度阈值列表')
+    parser.add_argument('--baseline-model', default=None, help='基准模型(默认--models中的最后一个)')
+    parser.add_argument('--baseline-imgsz', type=int, default=None, help='基准输入尺寸(默认最大值)')
+    parser.add_argument('--baseline-conf', type=float, default=None, help='基准置信度阈值(默认最小值)')
+    parser.add_argument('--backend', choices=['ultralytics', 'onnx'], default='ultralytics',
+                        help='推理后端')
+    parser.add_argument('--cpu', action='store_true', help='强制使用CPU')
+    parser.add_argument('--threshold', type=int, default=85, help='专注度阈值(与ca_gpu命令行默认值一致)')
+    parser.add_argument('--max-frames', type=int, default=0, help='每个视频最多处理的帧数(0=全部)')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='使用合成课堂视频和真值姿态（不加载模型，只扫描跳帧）')
+    parser.add_argument('--seconds', type=float, default=60.0, help='合成视频时长(秒)')
+    parser.add_argument('--people', type=int, default=20, help='合成视频人数')
+    parser.add_argument('--seed', type=int, default=0, help='合成视频随机种子')
+    parser.add_argument('--cache-dir', default='benchmark_videos', help='合成视频缓存目录')
+    parser.add_argument('--verbose', action='store_true', help='显示 ClassroomMonitor 的输出')
+    parser.add_argument('-o', '--output', default='sweep_results.json', help='JSON结果文件')
+
+    args = parser.parse_args()
+    if not args.videos and not args.synthetic:
+        parser.error('请指定参考视频，或使用 --synthetic')
+    run_sweep(args)
+
+
+if __name__ == "__main__":
+    main()
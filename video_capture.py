@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+视频解码
+FfmpegCapture 通过本地ffmpeg管道解码: 跳帧、缩放到模型输入尺寸附近、转为BGR都在ffmpeg内部
+（多线程）完成，Python侧只接收缩小后的帧，并由后台线程预读，与推理重叠。
+4K视频用OpenCV全分辨率解码时，解码和缩放的耗时会超过推理本身。
+
+检测结果仍按原始分辨率记录: 推理结果用 PoseResult.scaled 映射回原图坐标，
+输出标注视频时再把帧放大回原始尺寸
+"""
+
+import queue
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+from ffmpeg_utils import find_ffmpeg
+
+
+# ==================== 解码分辨率 ====================
+def model_input_size(config):
+    """推理实际使用的最大输入尺寸；级联/双分辨率模式需要原图裁剪，返回0表示不缩小"""
+    if config.CASCADE or config.CROP_REFINE:
+        return 0
+    return config.IMG_SIZE
+
+
+def decode_size(width, height, config):
+    """按 DECODE_SIZE（0=按模型输入尺寸自动）选择解码分辨率，只缩小不放大，宽高取偶数"""
+    target = config.DECODE_SIZE if config.DECODE_SIZE != 0 else model_input_size(config)
+    if target <= 0 or max(width, height) <= target:
+        return width, height
+    scale = target / max(width, height)
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+# ==================== ffmpeg 管道解码 ====================
+class FfmpegCapture:
+    """ffmpeg管道解码器: 按 step 跳帧，输出 size 尺寸的BGR帧
+
+    frames() 生成 (原视频帧号, 帧)，帧号与 cv2.VideoCapture 逐帧读取的计数一致
+    """
+
+    def __init__(self, video_path, size, step=1, threads=0, ffmpeg=None, queue_size=4):
+        self.size = size
+        self.step = max(1, step)
+        width, height = size
+        self.frame_bytes = width * height * 3
+
+        filters = []
+        if self.step > 1:
+            filters.append(f'select=not(mod(n\\,{self.step}))')
+        filters.append(f'scale={width}:{height}:flags=bilinear')
+        cmd = [ffmpeg or find_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-nostdin',
+               '-threads', str(threads), '-i', video_path, '-map', '0:v:0', '-an', '-sn',
+               '-vf', ','.join(filters), '-vsync', 'passthrough',
+               '-pix_fmt', 'bgr24', '-f', 'rawvideo', '-']
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     bufsize=self.frame_bytes)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    def _read_loop(self):
+        """后台读取管道（读取时释放GIL），满队列时阻塞，使ffmpeg最多领先 queue_size 帧"""
+        width, height = self.size
+        stdout = self.proc.stdout
+        while not self.stopped.is_set():
+            buffer = bytearray(self.frame_bytes)
+            view = memoryview(buffer)
+            filled = 0
+            while filled < self.frame_bytes:
+                n = stdout.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+            if filled < self.frame_bytes:
+                break
+            self._put(np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3))
+        self._put(None)
+
+    def _put(self, item):
+        """放入队列；release() 之后不再等待"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def frames(self, max_frames=0):
+        """生成 (帧号, 帧)；max_frames>0 时只读取前 max_frames 帧范围内的帧"""
+        frame_idx = 0
+        while True:
+            if max_frames > 0 and frame_idx >= max_frames:
+                break
+            frame = self.queue.get()
+            if frame is None:
+                break
+            yield frame_idx, frame
+            frame_idx += self.step
+
+    def release(self):
+        self.stopped.set()
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.reader.join(timeout=2)
+        self.proc.wait()
+        self.proc.stdout.close()
+
+
+def open_ffmpeg_capture(video_path, config, size):
+    """按 DECODER 配置决定是否改用ffmpeg管道解码，返回 FfmpegCapture 或 None（使用OpenCV）
+
+    auto: 有ffmpeg且需要缩小时使用；ffmpeg: 总是使用；opencv: 不使用
+    """
+    if config.DECODER == 'opencv':
+        return None
+    target = decode_size(*size, config)
+    if config.DECODER == 'auto' and target == tuple(size):
+        return None
+
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        if config.DECODER == 'ffmpeg':
+            print("⚠ 未找到ffmpeg，改用OpenCV解码")
+        return None
+    return FfmpegCapture(video_path, target, config.SKIP_FRAMES + 1, config.DECODE_THREADS, ffmpeg)
+
+
+def upscale_frame(frame, size):
+    """把缩小解码的帧放大回原始分辨率（仅输出标注视频时需要）"""
+    if (frame.shape[1], frame.shape[0]) == tuple(size):
+        return frame
+    return cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)